@@ -71,6 +71,9 @@ def config():
 @click.option("--do-sys-plots", is_flag=True, help="Produce red/blue plots.")
 @click.option("--do-val-plots", is_flag=True, help="Produce validation region plots.")
 @click.option("--is-preselection", is_flag=True, help="use preselection plotting definitions")
+@click.option("--val-plots-meta", type=str, help="Validation plot metadata (URL or local YAML file).")
+@click.option("--offline", is_flag=True, help="Only use cached or local validation plot metadata.")
+@click.option("--val-plots-vars", type=str, help="Comma separated validation plot variables (default all).")
 @click.option("--only-1516", is_flag=True, help="Fit only 15/16.")
 @click.option("--only-17", is_flag=True, help="Fit only 17.")
 @click.option("--only-18", is_flag=True, help="Fit only 18.")
@@ -79,6 +82,9 @@ def config():
 @click.option("--drop-2j2b", is_flag=True, help="Drop the 2j2b region.")
 @click.option("--fit-data", is_flag=True, help="Fit to data")
 @click.option("--asimov-fit", is_flag=True, help="deprecated option (Asimov is default, use --fit-data for fit to data)")
+@click.option("--yield-cache/--no-yield-cache", default=True, help="Reuse shower norm yields from previous runs.", show_default=True)
+@click.option("--shower-backend", type=click.Choice(["rdf", "uproot"]), help="Shower norm event loop backend.")
+@click.option("--shower-workers", type=int, help="Processes for shower norm yields (one task per ntuple file).")
 def gen(
     outname,
     pre_exec,
@@ -99,6 +105,9 @@ def gen(
     do_sys_plots,
     do_val_plots,
     is_preselection,
+    val_plots_meta,
+    offline,
+    val_plots_vars,
     only_1516,
     only_17,
     only_18,
@@ -107,9 +116,21 @@ def gen(
     drop_2j2b,
     fit_data,
     asimov_fit,
+    yield_cache,
+    shower_backend,
+    shower_workers,
 ):
     """Generate a config with user defined binning, save to OUTNAME."""
 
+    import rexpy.shower as rpsh
+
+    if yield_cache:
+        rpsh.enable_yield_cache()
+    if shower_backend is not None:
+        rpsh.set_backend(shower_backend)
+    if shower_workers is not None:
+        rpsh.set_workers(shower_workers)
+
     if pre_exec is not None:
         exec(PosixPath(pre_exec).read_text())
 
@@ -138,7 +159,6 @@ def gen(
     if ntup_dir is None:
         ntup_dir = rpsc.ntuple_directory()
     log.info("Using ntuple directory: %s" % ntup_dir)
-    from rexpy.valplot import fix_systematics
     if drop_1j1b:
         sel_1j1b = None
         log.info("Excluding 1j1b")
@@ -170,35 +190,43 @@ def gen(
         systplots="TRUE" if do_sys_plots else "FALSE",
         fitblind="FALSE" if fit_data else "TRUE",
     )
-    with open(outname, "w") as f:
-        print(preamble, file=f)
-        if do_val_plots:
-            print(rpv.default_vrp_blocks(sel_1j1b, sel_2j1b, sel_2j2b, is_preselection=is_preselection), file=f)
-        print(rpblocks.sample_blocks(), file=f)
-        print(rpblocks.norm_factor_blocks(), file=f)
-        print(rpblocks.sys_modeling_blocks(ntup_dir, sel_1j1b, sel_2j1b, sel_2j2b, herwig), file=f)
-        print(rpblocks.sys_minor_blocks(), file=f)
-        print(rpblocks.sys_sf_weight_blocks(), file=f)
-        print(rpblocks.sys_pdf_weight_blocks(), file=f)
-        print(rpblocks.sys_twosided_tree_blocks(), file=f)
-        print(rpblocks.sys_onesided_tree_blocks(), file=f)
 
+    def chunks():
+        yield preamble
+        if do_val_plots:
+            meta = rpv.load_meta(val_plots_meta, offline=offline or None)
+            variables = val_plots_vars.split(",") if val_plots_vars else None
+            yield rpv.default_vrp_blocks(
+                sel_1j1b, sel_2j1b, sel_2j2b, is_preselection=is_preselection, meta=meta, variables=variables
+            )
+        yield rpblocks.sample_blocks()
+        yield rpblocks.norm_factor_blocks()
+        yield rpblocks.sys_modeling_blocks(ntup_dir, sel_1j1b, sel_2j1b, sel_2j2b, herwig)
+        yield rpblocks.sys_minor_blocks()
+        yield rpblocks.sys_sf_weight_blocks()
+        yield rpblocks.sys_pdf_weight_blocks()
+        yield rpblocks.sys_twosided_tree_blocks()
+        yield rpblocks.sys_onesided_tree_blocks()
+
+    # generation, VRP patching and drops are lazy filters over a
+    # single block stream; the file is written exactly once.
+    blocks = rpc.iter_blocks(chunks())
     if do_val_plots:
-        fix_systematics(outname)
-
-    blocks = rpc.all_blocks(outname)
-    if drop_1j1b:
-        blocks = rpc.drop_region(blocks, "1j1b")
-    if drop_2j1b:
-        blocks = rpc.drop_region(blocks, "2j1b")
-    if drop_2j2b:
-        blocks = rpc.drop_region(blocks, "2j2b")
-    if drop_sys is not None:
-        blocks = rpc.drop_systematics(blocks, [drop_sys])
-
-    final_conf = "\n\n".join(blocks)
-    with open(outname, "w") as outf:
-        print(final_conf, file=outf)
+        blocks = rpv.patch_systematic_regions(blocks)
+    drop_regions = [
+        f"*{r}*" for r, d in (("1j1b", drop_1j1b), ("2j1b", drop_2j1b), ("2j2b", drop_2j2b)) if d
+    ]
+    diff = rpc.RemovalDiff()
+    if drop_regions or drop_sys is not None:
+        blocks = rpc.iter_remove_blocks(
+            blocks,
+            systematics=[drop_sys] if drop_sys is not None else None,
+            regions=drop_regions,
+            diff=diff,
+        )
+    rpc.write_blocks(blocks, outname)
+    for line in diff.lines():
+        log.debug(line)
 
     return 0
 
@@ -209,9 +237,9 @@ def gen(
 @click.option("-n", "--new-file", type=str)
 def rm_region(config, region, new_file):
     """Remove regions from a config file."""
-    blocks = rpc.all_blocks(config)
-    for r in region:
-        blocks = rpc.drop_region(blocks, r)
+    blocks, diff = rpc.remove_blocks(rpc.all_blocks(config), regions=[f"*{r}*" for r in region])
+    for line in diff.lines():
+        log.info(line)
 
     outf = config if new_file is None else new_file
     with open(outf, "w") as f:
@@ -224,7 +252,10 @@ def rm_region(config, region, new_file):
 @click.option("-n", "--new-file", type=str)
 def rm_sys(config, sys, new_file):
     """Remove systematics from a config file."""
-    new_conf = "\n\n".join(rpc.drop_systematics(rpc.all_blocks(config), sys))
+    blocks, diff = rpc.remove_blocks(rpc.all_blocks(config), systematics=sys)
+    for line in diff.lines():
+        log.info(line)
+    new_conf = "\n\n".join(blocks)
     outf = config if new_file is None else new_file
     with open(outf, "w") as f:
         print(new_conf, file=f)
@@ -243,10 +274,17 @@ def run():
 @click.option("-n", "--n-parallel", type=int, default=None, help="Max parallel jobs (default is CPU count)")
 @click.option("-d", "--force-data", is_flag=True, help="Force config to fit to data.")
 @click.option("-s", "--steps", type=str, default="nwfdpri", help="TRExFitter steps to run", show_default=True)
-def local(config, suffix, copy_hists, n_parallel, force_data, steps):
+@click.option("--pool", type=click.Choice(rpbatch.StepExecutor.KINDS), default="thread", help="Worker pool type.", show_default=True)
+@click.option("--fail-fast/--keep-going", default=False, help="Stop at the first failed task.", show_default=True)
+@click.option("--retry", type=int, default=0, help="Retries for failed tasks.", show_default=True)
+@click.option("--granular-ntup", is_flag=True, help="Split n step by region and systematic.")
+@click.option("--incremental-ntup", is_flag=True, help="Only redo n step for changed regions/systematics.")
+@click.option("--cache/--no-cache", default=False, help="Reuse outputs of unchanged steps.", show_default=True)
+def local(config, suffix, copy_hists, n_parallel, force_data, steps, pool, fail_fast, retry, granular_ntup, incremental_ntup, cache):
     """Run TRExFitter steps locally."""
 
     from rexpy.helpers import RexStep
+    from rexpy.stepcache import StepCache
 
     if force_data and suffix is not None:
         suffix = f"{suffix}.force-data"
@@ -265,20 +303,38 @@ def local(config, suffix, copy_hists, n_parallel, force_data, steps):
     os.chdir(workspace)
 
     steps = rph.parse_steps(steps)
-    print(f"Running steps {steps}")
+    graph_steps = []
     if RexStep.N in steps and copy_hists is None:
-        rpbatch.parallel_n_step(f, processes=n_parallel)
+        graph_steps.append("n")
     if RexStep.WF in steps:
-        rpbatch.wf_step(f)
+        graph_steps.append("wf")
     if RexStep.DP in steps:
-        rpbatch.dp_step(f)
+        graph_steps.append("dp")
     if RexStep.R in steps:
-        rpbatch.parallel_r_step(f, processes=n_parallel)
-        rpbatch.r_draw_step(f)
+        graph_steps += ["r", "rplot"]
     if RexStep.I in steps:
-        rpbatch.parallel_i_step(f, processes=n_parallel)
-        rpbatch.i_combine_step(f)
-    os.chdir(curdir)
+        graph_steps += ["i", "icombine"]
+    try:
+        with rpbatch.StepExecutor(n_parallel, kind=pool) as executor:
+            results = rpbatch.run_steps_local(
+                f,
+                graph_steps,
+                executor=executor,
+                granular_ntup=granular_ntup,
+                incremental_ntup=incremental_ntup,
+                cache=StepCache() if cache else None,
+                fail_fast=fail_fast,
+                retry=retry,
+            )
+    except rpbatch.TaskFailedError as err:
+        log.error("Stopping: %s" % err)
+        results = err.results
+    finally:
+        os.chdir(curdir)
+
+    rpbatch.summarize_results(results)
+    if any(r.returncode != 0 for r in results.values()):
+        raise SystemExit(1)
 
 
 @run.command("condor")
@@ -289,7 +345,10 @@ def local(config, suffix, copy_hists, n_parallel, force_data, steps):
 @click.option("-d", "--force-data", is_flag=True, help="Force config to fit to data.")
 @click.option("--steps", type=str, default="nwfdpri", help="TRExFitter steps to run", show_default=True)
 @click.option("--submit/--no-submit", default=False, help="Submit the jobs")
-def condor(config, sys, suffix, copy_hists, force_data, steps, submit):
+@click.option("--itemdata", is_flag=True, help="Queue n, r and i step arguments as one cluster per step.")
+@click.option("--pack-minutes", type=float, help="Pack r and i step arguments into jobs of about this long.")
+@click.option("--pack-parallel", type=int, default=1, help="Packed arguments to run at once per job.", show_default=True)
+def condor(config, sys, suffix, copy_hists, force_data, steps, submit, itemdata, pack_minutes, pack_parallel):
     """Run TRExFitter steps with HTCondor."""
 
     ntup_only = steps == "n"
@@ -299,6 +358,9 @@ def condor(config, sys, suffix, copy_hists, force_data, steps, submit):
     elif force_data:
         suffix = "force-data"
 
+    # parsed configs are reused across invocations on unchanged files
+    rpc.enable_disk_cache()
+
     # create workspace and the condo dagman
     workspace, f = rpbatch.create_workspace(config, suffix)
     dagman = pycondor.Dagman("REXPY-DAG", submit=str(workspace / "sub"))
@@ -309,6 +371,11 @@ def condor(config, sys, suffix, copy_hists, force_data, steps, submit):
     cwd = PosixPath.cwd()
     os.chdir(workspace)
 
+    # runtimes measured by packed jobs of a previous submission
+    rpbatch.update_runtimes(rpbatch.read_pack_times(workspace), workspace / "fit.conf")
+    pack_target = None if pack_minutes is None else 60 * pack_minutes
+    pack = dict(pack_target=pack_target, pack_parallel=pack_parallel)
+
     # check for specific systematics
     sys = sys.split(",") if sys is not None else None
 
@@ -325,7 +392,7 @@ def condor(config, sys, suffix, copy_hists, force_data, steps, submit):
     )
 
     if copy_hists is None and "n" in steps:
-        n = rpbatch.condor_n_step(workspace, dag=dagman, sys=sys)
+        n = rpbatch.condor_n_step(workspace, dag=dagman, sys=sys, itemdata=itemdata)
         log.info("Running n step")
 
     if not ntup_only:
@@ -336,11 +403,11 @@ def condor(config, sys, suffix, copy_hists, force_data, steps, submit):
             dp = rpbatch.condor_dp_step(workspace, dag=dagman, sys=sys)
             log.info("Running dp steps")
         if "r" in steps:
-            r = rpbatch.condor_r_step(workspace, dag=dagman, sys=sys)
+            r = rpbatch.condor_r_step(workspace, dag=dagman, sys=sys, itemdata=itemdata, **pack)
             rplot = rpbatch.condor_rplot_step(workspace, dag=dagman)
             log.info("Running r steps")
         if "i" in steps and sys is None:
-            i = rpbatch.condor_i_step(workspace, dag=dagman)
+            i = rpbatch.condor_i_step(workspace, dag=dagman, itemdata=itemdata, **pack)
             icombine = rpbatch.condor_icombine_step(workspace, dag=dagman)
             log.info("Running i steps")
 
@@ -348,28 +415,9 @@ def condor(config, sys, suffix, copy_hists, force_data, steps, submit):
     ## setup job dependencies
     #########################
 
-    if wf is not None and n is not None:
-        wf.add_parent(n)
-        log.info("n step now parent to wf step")
-
-    # none of these steps are done if ntup only
-    if not ntup_only:
-        if dp is not None:
-            if wf is not None:
-                dp.add_parent(wf)
-                log.info("wf steps now parent to dp steps")
-        if r is not None:
-            if wf is not None:
-                r.add_parent(wf)
-                log.info("wf steps now parent to r steps")
-            rplot.add_parent(r)
-            log.info("r steps now parent to r plotting step")
-        if i is not None:
-            if wf is not None:
-                i.add_parent(wf)
-                log.info("wf steps now parent to i steps")
-            icombine.add_parent(i)
-            log.info("i steps now parent to i combination step")
+    rpbatch.link_steps(
+        dict(n=n, wf=wf, dp=dp, r=r, rplot=rplot, i=i, icombine=icombine)
+    )
 
     ###########################
     ## build (and maybe submit)
@@ -416,12 +464,15 @@ def sysholdout(workspace, systematics, condor, n_parallel, submit):
         else:
             dagman.build()
     else:
-        rpbatch.parallel_run(
+        results = rpbatch.parallel_run(
             [f"{rpbatch.TREX_EXE} {com}" for com in coms],
             processes=n_parallel,
         )
+        rpbatch.summarize_results({r.name: r for r in results})
 
     os.chdir(curdir)
+    if not condor and any(r.returncode != 0 for r in results):
+        raise SystemExit(1)
 
 
 if __name__ == "__main__":
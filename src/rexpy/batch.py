@@ -1,24 +1,76 @@
 """Module for handling batch steps."""
 
 # stdlib
-import multiprocessing
+import json
+import logging
 import subprocess
 import os
 import shutil
+import statistics
+import time
+from collections import namedtuple
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
 from functools import wraps
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 # rexpy
 import rexpy.pycondor as pycondor
 from rexpy.confparse import (
+    parse,
     regions_from,
     systematics_from,
     sub_block_values,
 )
+from rexpy.helpers import cache_directory
+from rexpy.stepcache import FIT_BLOCK_TYPES, StepCache, cached_steps
 
 
 TREX_EXE = shutil.which("trex-fitter")
+HUPDATE_EXE = shutil.which("hupdate.exe")
+NTUPLE_MANIFEST = "rexpy-ntuple-blocks.json"
+RUNTIMES_FILE = "runtimes.json"
+
+log = logging.getLogger(__name__)
+
+#: Dependencies between TRExFitter steps (shared by the local and
+#: condor paths): step -> steps that must finish first.
+STEP_GRAPH = {
+    "n": (),
+    "wf": ("n",),
+    "dp": ("wf",),
+    "r": ("wf",),
+    "rplot": ("r",),
+    "i": ("wf",),
+    "icombine": ("i",),
+}
+
+Task = namedtuple("Task", ["name", "command", "parents", "retry"])
+Task.__new__.__defaults__ = (None,)
+
+TaskResult = namedtuple(
+    "TaskResult", ["name", "command", "returncode", "wall_time", "max_rss", "attempts"]
+)
+
+
+class TaskFailedError(RuntimeError):
+    """Raised when a task fails in fail-fast mode.
+
+    Attributes
+    ----------
+    results : dict(str, TaskResult)
+        Results of every task that finished before stopping.
+
+    """
+
+    def __init__(self, message, results):
+        super().__init__(message)
+        self.results = results
 
 
 def rank_arguments(config: str, specific_sys: Optional[List[str]] = None) -> List[str]:
@@ -108,9 +160,10 @@ def fit_argument(
     str
         the fit step argument
     """
+    parsed = parse(config)
     region_arg = ""
     if dont_fit_vr:
-        regions = regions_from(config)
+        regions = regions_from(parsed)
         regions = [r for r in regions if not r.startswith("VR")]
         region_arg = " Regions={}".format(",".join(regions))
 
@@ -118,13 +171,45 @@ def fit_argument(
     arg = arg.strip()
 
     if specific_sys is not None:
-        systematics = systematics_from(config, specific_sys=specific_sys)
+        systematics = systematics_from(parsed, specific_sys=specific_sys)
         systematics = ",".join(systematics)
         arg = f"{arg}:Systematics={systematics}"
 
     return arg
 
 
+def _applies_to(systematic: str, region: str) -> bool:
+    """Check if a systematic is relevant for a region."""
+    for tag in ("1j1b", "2j1b", "2j2b"):
+        if tag in systematic and tag not in region:
+            return False
+    return True
+
+
+def _systematic_plan(
+    config: str, region: str, systematics: Iterable[str], fitname: str
+) -> Tuple[List[str], List[str]]:
+    """Get the per systematic n step arguments and outputs of a region."""
+    args, files = [], []
+    for s in systematics:
+        if not _applies_to(s, region):
+            continue
+        args.append(f"n {config} Regions={region}:Systematics={s}:SaveSuffix=_{s}")
+        files.append(f"{fitname}/Histograms/{fitname}_{region}_histos_{s}.root")
+    return args, files
+
+
+def _granular_ntuple_plan(
+    config: str, fitname: str = "tW"
+) -> Dict[str, Tuple[List[str], List[str]]]:
+    """Map each region to its granular n step arguments and outputs."""
+    parsed = parse(config)
+    systematics = systematics_from(parsed)
+    return {
+        r: _systematic_plan(config, r, systematics, fitname) for r in regions_from(parsed)
+    }
+
+
 def ntuple_arguments_granular(config: str, fitname: str = "tW") -> Tuple[List[str], List[str]]:
     """Get the set of granular trex-fitter ntupling instructions
 
@@ -143,24 +228,10 @@ def ntuple_arguments_granular(config: str, fitname: str = "tW") -> Tuple[List[st
         hupdate.exe execution instructions.
 
     """
-    regions = regions_from(config)
-    systematics = systematics_from(config)
-    region_hupdate_files = {r: [] for r in regions}
     args = []
-    for r in regions:
-        for s in systematics:
-            if "1j1b" in s and "1j1b" not in r:
-                continue
-            if "2j1b" in s and "2j1b" not in r:
-                continue
-            if "2j2b" in s and "2j2b" not in r:
-                continue
-            args.append(f"n {config} Regions={r}:Systematics={s}:SaveSuffix=_{s}")
-            region_hupdate_files[r].append(
-                f"{fitname}/Histograms/{fitname}_{r}_histos_{s}.root"
-            )
     updates = []
-    for k, v in region_hupdate_files.items():
+    for k, (a, v) in _granular_ntuple_plan(config, fitname).items():
+        args += a
         a1 = f"{fitname}/Histograms/{fitname}_{k}_histos.root"
         a2 = " ".join(v)
         updates.append(f"{a1} {a2}")
@@ -184,14 +255,15 @@ def ntuple_arguments(config: str, specific_sys: Optional[List[str]] = None) -> L
         The list of trex-fitter arguments
 
     """
-    regions = regions_from(config)
+    parsed = parse(config)
+    regions = regions_from(parsed)
 
     # first no specific systematics
     if specific_sys is None:
         return ["n {} Regions={}".format(config, r) for r in regions]
 
     # otherwise, construct for specific systematics
-    systematics = systematics_from(config, specific_sys=specific_sys)
+    systematics = systematics_from(parsed, specific_sys=specific_sys)
     systematics = ",".join(systematics)
     return [
         "n {} Regions={}:Systematics={}".format(config, r, systematics) for r in regions
@@ -263,14 +335,178 @@ def create_workspace(config: str, suffix: Optional[str] = None) -> Tuple[Path, P
     return workspace.absolute(), (workspace / "fit.conf").absolute()
 
 
-def run_and_wait(command: str) -> int:
-    p = subprocess.Popen(command, shell=True)
+def run_and_wait(command: str, cwd: Optional[str] = None) -> int:
+    p = subprocess.Popen(command, shell=True, cwd=cwd)
     return p.wait()
 
 
-def parallel_run(commands: str, processes: Optional[int] = None) -> None:
-    pool = multiprocessing.Pool(processes=processes)
-    pool.map(run_and_wait, commands)
+def _exit_code(status: int) -> int:
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def run_and_measure(command: str, cwd: Optional[str] = None) -> Tuple[int, float, int]:
+    """Run a shell command and measure its resource usage.
+
+    Parameters
+    ----------
+    command : str
+        Command to execute.
+    cwd : str, optional
+        Directory to execute the command from.
+
+    Returns
+    -------
+    int
+        Exit code (negative signal number if killed by a signal).
+    float
+        Wall time in seconds.
+    int
+        Peak resident set size of the command (and its waited for
+        children) as reported by ``wait4`` (kilobytes on Linux). The
+        value is bounded below by the footprint of the forking Python
+        process, which is negligible next to ``trex-fitter``.
+    """
+    start = time.monotonic()
+    p = subprocess.Popen(command, shell=True, cwd=cwd)
+    _, status, usage = os.wait4(p.pid, 0)
+    p.returncode = _exit_code(status)
+    return p.returncode, time.monotonic() - start, usage.ru_maxrss
+
+
+def _run_task(name, command, cwd, retry, backoff):
+    attempts = 0
+    while True:
+        attempts += 1
+        code, wall, rss = run_and_measure(command, cwd)
+        if code == 0 or attempts > retry:
+            return TaskResult(name, command, code, wall, rss, attempts)
+        delay = backoff * 2 ** (attempts - 1)
+        log.warning(f"{name} exited with {code}, retrying in {delay:.1f}s")
+        time.sleep(delay)
+
+
+class StepExecutor:
+    """Worker pool owned by one run and shared by all of its stages.
+
+    The local TRExFitter steps spend their time waiting on
+    ``trex-fitter`` subprocesses, so a thread pool is the default; a
+    process pool can be requested instead. Use it as a context
+    manager: the pool is created once, reused by every stage handed
+    the executor, and shut down (waiting for running workers and
+    cancelling anything still queued after an error) on exit.
+
+    Parameters
+    ----------
+    processes : int, optional
+        Max number of workers (default is CPU count).
+    kind : str
+        Either "thread" or "process".
+
+    Examples
+    --------
+    >>> with StepExecutor(processes=8) as executor:
+    ...     parallel_n_step(config, executor=executor)
+    ...     parallel_r_step(config, executor=executor)
+
+    """
+
+    KINDS = ("thread", "process")
+
+    def __init__(self, processes: Optional[int] = None, kind: str = "thread"):
+        if kind not in self.KINDS:
+            raise ValueError(f"kind must be one of {self.KINDS}, got {kind}")
+        self.processes = processes if processes is not None else os.cpu_count()
+        self.kind = kind
+        self._pool = None
+
+    def __repr__(self):
+        return f"StepExecutor(processes={self.processes}, kind={self.kind})"
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown(cancel=exc_type is not None)
+        return False
+
+    def start(self) -> "StepExecutor":
+        """Create the underlying pool (a no-op if already started)."""
+        if self._pool is None:
+            pool_type = ThreadPoolExecutor if self.kind == "thread" else ProcessPoolExecutor
+            self._pool = pool_type(max_workers=self.processes)
+        return self
+
+    def shutdown(self, cancel: bool = False) -> None:
+        """Shut down the pool, waiting for running workers.
+
+        Parameters
+        ----------
+        cancel : bool
+            Cancel queued work that has not started yet.
+        """
+        if self._pool is None:
+            return
+        if cancel:
+            # cancel_futures is only available for Python >= 3.9
+            try:
+                self._pool.shutdown(wait=True, cancel_futures=True)
+            except TypeError:
+                self._pool.shutdown(wait=True)
+        else:
+            self._pool.shutdown(wait=True)
+        self._pool = None
+
+    def submit(self, fn, *args, **kwargs):
+        """Submit a callable to the pool, see :py:meth:`concurrent.futures.Executor.submit`."""
+        if self._pool is None:
+            raise RuntimeError("StepExecutor must be started (or entered) before use")
+        return self._pool.submit(fn, *args, **kwargs)
+
+    def map(self, fn, iterable) -> List[Any]:
+        """Apply `fn` to every item in parallel and collect the results in order."""
+        futures = [self.submit(fn, item) for item in iterable]
+        return [f.result() for f in futures]
+
+
+def _map_steps(fn, args, processes, executor):
+    if executor is not None:
+        return executor.map(fn, args)
+    with StepExecutor(processes) as ex:
+        return ex.map(fn, args)
+
+
+def parallel_run(
+    commands: List[str],
+    processes: Optional[int] = None,
+    executor: Optional[StepExecutor] = None,
+    **kwargs,
+) -> List[TaskResult]:
+    """Run independent shell commands in parallel.
+
+    Parameters
+    ----------
+    commands : list(str)
+        Commands to execute.
+    processes : int, optional
+        Max number of processes to run in parallel (ignored if
+        `executor` is given).
+    executor : StepExecutor, optional
+        Shared executor to use; a temporary one is created if None.
+    kwargs : dict
+        Passed to :py:func:`run_task_graph` (`fail_fast`, `retry`,
+        `backoff`).
+
+    Returns
+    -------
+    list(TaskResult)
+        Result of each executed command (in the original order).
+    """
+    tasks = [Task(f"cmd_{i}", c, ()) for i, c in enumerate(commands)]
+    results = run_task_graph(tasks, processes=processes, executor=executor, **kwargs)
+    return [results[t.name] for t in tasks if t.name in results]
 
 
 def _run_n_step(args) -> int:
@@ -337,8 +573,8 @@ def restore_cwd(func):
 
 
 @restore_cwd
-def parallel_n_step(config, regions=None, processes=None):
-    """Parallelize the ntuple step via multiprocessing.
+def parallel_n_step(config, regions=None, processes=None, executor=None):
+    """Parallelize the ntuple step.
 
     Parameters
     ----------
@@ -348,14 +584,20 @@ def parallel_n_step(config, regions=None, processes=None):
         Manually define regions.
     processes : int, optional
         Max number of processes to run in parallel
+    executor : StepExecutor, optional
+        Shared executor to use; a temporary one is created if None.
+
+    Returns
+    -------
+    list(int)
+        Exit code of each job.
 
     """
     os.chdir(Path(config).resolve().parent)
     if regions is None:
         regions = regions_from(config)
     args = [(TREX_EXE, config, region) for region in regions]
-    pool = multiprocessing.Pool(processes=processes)
-    pool.map(_run_n_step, args)
+    return _map_steps(_run_n_step, args, processes, executor)
 
 
 @restore_cwd
@@ -402,8 +644,8 @@ def dp_step(config):
 
 
 @restore_cwd
-def parallel_r_step(config, systematics=None, processes=None):
-    """Parallelize the impart ranking step via multiprocessing.
+def parallel_r_step(config, systematics=None, processes=None, executor=None):
+    """Parallelize the impact ranking step.
 
     Parameters
     ----------
@@ -413,14 +655,20 @@ def parallel_r_step(config, systematics=None, processes=None):
         Manually define the systematics.
     processes : int, optional
         Max number of processes to run in parallel
+    executor : StepExecutor, optional
+        Shared executor to use; a temporary one is created if None.
+
+    Returns
+    -------
+    list(int)
+        Exit code of each job.
 
     """
     os.chdir(Path(config).resolve().parent)
     if systematics is None:
         systematics = systematics_from(config)
     args = [(TREX_EXE, config, sys) for sys in systematics]
-    pool = multiprocessing.Pool(processes=processes)
-    pool.map(_run_r_step, args)
+    return _map_steps(_run_r_step, args, processes, executor)
 
 
 @restore_cwd
@@ -438,8 +686,8 @@ def r_draw_step(config):
 
 
 @restore_cwd
-def parallel_i_step(config, processes=None):
-    """Parallelize the grouped impact step via multiprocessing.
+def parallel_i_step(config, processes=None, executor=None):
+    """Parallelize the grouped impact step.
 
     Parameters
     ----------
@@ -447,14 +695,20 @@ def parallel_i_step(config, processes=None):
         Path of the config file.
     processes : int, optional
         Max number of processes to run in parallel
+    executor : StepExecutor, optional
+        Shared executor to use; a temporary one is created if None.
+
+    Returns
+    -------
+    list(int)
+        Exit code of each job.
 
     """
     os.chdir(Path(config).resolve().parent)
     args = grouped_impact_arguments(config)
     groups = [a.split()[-1].split("=")[-1] for a in args]
     args = [(TREX_EXE, config, g) for g in groups]
-    pool = multiprocessing.Pool(processes=processes)
-    pool.map(_run_i_step, args)
+    return _map_steps(_run_i_step, args, processes, executor)
 
 
 @restore_cwd
@@ -471,7 +725,7 @@ def i_combine_step(config):
     _run_i_combine_step((TREX_EXE, config))
 
 
-def condor_n_step(wkspace, sys=None, job_name="ntuple", dag=None):
+def condor_n_step(wkspace, sys=None, job_name="ntuple", dag=None, itemdata=False):
     """Generate a condor job for running the ntuple step.
 
     Parameters
@@ -484,6 +738,9 @@ def condor_n_step(wkspace, sys=None, job_name="ntuple", dag=None):
         Name for the condor job.
     dag : pycondor.Dagman, optional
         Dagman to assign the job to.
+    itemdata : bool
+        Queue every argument from an item-data file as a single
+        cluster (one DAG node) instead of one DAG node per argument.
 
     Returns
     -------
@@ -494,7 +751,7 @@ def condor_n_step(wkspace, sys=None, job_name="ntuple", dag=None):
     jp = job_params(wkspace, TREX_EXE)
     config = wkspace / "fit.conf"
     ntup_args = ntuple_arguments(config, specific_sys=sys)
-    j = pycondor.Job(name=job_name, dag=dag, **jp)
+    j = pycondor.Job(name=job_name, dag=dag, itemdata=itemdata, **jp)
     j.add_args(ntup_args)
     return j
 
@@ -554,7 +811,10 @@ def condor_wf_step(wkspace, sys=None, job_name="wf", dag=None):
     return j
 
 
-def condor_r_step(wkspace, sys=None, job_name="rank", dag=None):
+def condor_r_step(
+    wkspace, sys=None, job_name="rank", dag=None, itemdata=False,
+    pack_target=None, pack_parallel=1
+):
     """Generate a condor job for running the ranking steps.
 
     Parameters
@@ -567,6 +827,15 @@ def condor_r_step(wkspace, sys=None, job_name="rank", dag=None):
         Name for the condor job.
     dag : pycondor.Dagman, optional
         Dagman to assign the job to.
+    itemdata : bool
+        Queue every argument from an item-data file as a single
+        cluster (one DAG node) instead of one DAG node per argument.
+    pack_target : float, optional
+        Pack the arguments into wrapper jobs of about this many
+        seconds (see :py:func:`condor_pack_step`) instead of running
+        one argument per job.
+    pack_parallel : int
+        Number of packed arguments to run at once in each job.
 
     Returns
     -------
@@ -577,7 +846,11 @@ def condor_r_step(wkspace, sys=None, job_name="rank", dag=None):
     jp = job_params(wkspace, TREX_EXE)
     config = wkspace / "fit.conf"
     rank_args = rank_arguments(config, specific_sys=sys)
-    j = pycondor.Job(name=job_name, dag=dag, **jp)
+    if pack_target is not None:
+        return condor_pack_step(
+            wkspace, rank_args, job_name, dag, pack_target, pack_parallel, itemdata
+        )
+    j = pycondor.Job(name=job_name, dag=dag, itemdata=itemdata, **jp)
     j.add_args(rank_args)
     return j
 
@@ -608,7 +881,10 @@ def condor_rplot_step(wkspace, job_name="rplot", dag=None):
     return j
 
 
-def condor_i_step(wkspace, job_name="impact", dag=None):
+def condor_i_step(
+    wkspace, job_name="impact", dag=None, itemdata=False,
+    pack_target=None, pack_parallel=1
+):
     """Generate a condor job for running the ranking steps.
 
     Parameters
@@ -619,6 +895,15 @@ def condor_i_step(wkspace, job_name="impact", dag=None):
         Name for the condor job.
     dag : pycondor.Dagman, optional
         Dagman to assign the job to.
+    itemdata : bool
+        Queue every argument from an item-data file as a single
+        cluster (one DAG node) instead of one DAG node per argument.
+    pack_target : float, optional
+        Pack the arguments into wrapper jobs of about this many
+        seconds (see :py:func:`condor_pack_step`) instead of running
+        one argument per job.
+    pack_parallel : int
+        Number of packed arguments to run at once in each job.
 
     Returns
     -------
@@ -629,7 +914,11 @@ def condor_i_step(wkspace, job_name="impact", dag=None):
     jp = job_params(wkspace, TREX_EXE)
     config = wkspace / "fit.conf"
     impact_args = grouped_impact_arguments(config)
-    j = pycondor.Job(name=job_name, dag=dag, **jp)
+    if pack_target is not None:
+        return condor_pack_step(
+            wkspace, impact_args, job_name, dag, pack_target, pack_parallel, itemdata
+        )
+    j = pycondor.Job(name=job_name, dag=dag, itemdata=itemdata, **jp)
     j.add_args(impact_args)
     return j
 
@@ -640,3 +929,747 @@ def condor_icombine_step(wkspace, job_name="impactcomb", dag=None):
     j = pycondor.Job(name=job_name, dag=dag, **jp)
     j.add_arg(f"i {config} GroupedImpact=combine")
     return j
+
+
+#: Wrapper running the trex-fitter arguments listed in a pack file (one
+#: per line), N at a time; ``milliseconds exit-code argument`` is
+#: appended to ``{pack file}.times`` for each.
+PACK_SCRIPT = """#!/bin/bash
+# usage: trex-pack.sh N_PARALLEL PACK_FILE TREX_FITTER
+export n_parallel=$1 pack=$2 exe=$3
+run_one() {
+    local start=$(date +%s%N)
+    $exe $1
+    local code=$?
+    echo "$(( ($(date +%s%N) - start) / 1000000 )) $code $1" >> "$pack.times"
+    return $code
+}
+export -f run_one
+xargs -d '\\n' -n 1 -P "$n_parallel" bash -c 'run_one "$1"' _ < "$pack"
+"""
+
+
+def _runtime_key(argument: str, config) -> str:
+    return argument.replace(str(config), "{config}")
+
+
+def load_runtimes(path: Optional[str] = None) -> Dict[str, float]:
+    """Load the trex-fitter runtime history.
+
+    Parameters
+    ----------
+    path : str, optional
+        History file (default is :py:data:`RUNTIMES_FILE` in the
+        ``batch`` subdirectory of
+        :py:func:`rexpy.helpers.cache_directory`).
+
+    Returns
+    -------
+    dict(str, float)
+        Last wall time (seconds) of each trex-fitter argument, with
+        the config path replaced by ``{config}``.
+    """
+    path = path or cache_directory("batch") / RUNTIMES_FILE
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def update_runtimes(
+    runtimes: Dict[str, float], config: str, path: Optional[str] = None
+) -> None:
+    """Add measured wall times to the runtime history.
+
+    Parameters
+    ----------
+    runtimes : dict(str, float)
+        Wall time (seconds) of each trex-fitter argument.
+    config : str
+        Path of the config file used in the arguments.
+    path : str, optional
+        History file (see :py:func:`load_runtimes`).
+    """
+    if not runtimes:
+        return
+    path = Path(path or cache_directory("batch") / RUNTIMES_FILE)
+    history = load_runtimes(path)
+    history.update((_runtime_key(a, config), t) for a, t in runtimes.items())
+    tmp = path.with_suffix(f".tmp{os.getpid()}")
+    with open(tmp, "w") as f:
+        json.dump(history, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+    log.debug(f"Recorded {len(runtimes)} runtimes in {path}")
+
+
+def runtimes_from_results(results: Dict[str, TaskResult]) -> Dict[str, float]:
+    """Get the wall time of each successful trex-fitter task.
+
+    Parameters
+    ----------
+    results : dict(str, TaskResult)
+        Results from :py:func:`run_task_graph`.
+
+    Returns
+    -------
+    dict(str, float)
+        Wall time (seconds) keyed by trex-fitter argument.
+    """
+    prefix = f"{TREX_EXE} "
+    return {
+        r.command[len(prefix):]: r.wall_time
+        for r in results.values()
+        if r.returncode == 0 and r.command.startswith(prefix)
+    }
+
+
+def read_pack_times(wkspace) -> Dict[str, float]:
+    """Get the wall times recorded by packed condor jobs.
+
+    Parameters
+    ----------
+    wkspace : pathlib.Path
+        Condor workspace.
+
+    Returns
+    -------
+    dict(str, float)
+        Wall time (seconds) of each successful trex-fitter argument
+        run by :py:data:`PACK_SCRIPT` in the workspace.
+    """
+    runtimes = {}
+    for times_file in sorted((Path(wkspace) / "packs").glob("*.times")):
+        with open(times_file) as f:
+            for line in f:
+                fields = line.rstrip("\n").split(" ", 2)
+                if len(fields) == 3 and fields[1] == "0":
+                    runtimes[fields[2]] = int(fields[0]) / 1000
+    return runtimes
+
+
+def pack_arguments(
+    arguments: List[str],
+    config: str,
+    target: float = 600.0,
+    parallel: int = 1,
+    runtimes: Optional[Dict[str, float]] = None,
+    default: float = 60.0,
+) -> List[List[str]]:
+    """Group trex-fitter arguments into packs of about a target duration.
+
+    Each argument's duration is estimated from the runtime history;
+    arguments without history get the median of the ones with history
+    (or `default` if none has any). Packs are filled first fit
+    decreasing with ``target * parallel`` seconds of work each, so
+    longer arguments are spread out and start first; an argument longer
+    than that gets a pack of its own.
+
+    Parameters
+    ----------
+    arguments : list(str)
+        trex-fitter arguments.
+    config : str
+        Path of the config file used in the arguments.
+    target : float
+        Target wall time (seconds) of a pack.
+    parallel : int
+        Number of arguments a pack runs at once.
+    runtimes : dict(str, float), optional
+        Runtime history (default is :py:func:`load_runtimes`).
+    default : float
+        Estimated wall time (seconds) without any history.
+
+    Returns
+    -------
+    list(list(str))
+        The packs.
+    """
+    if runtimes is None:
+        runtimes = load_runtimes()
+    keys = {a: _runtime_key(a, config) for a in arguments}
+    known = {a: runtimes[k] for a, k in keys.items() if k in runtimes}
+    fallback = statistics.median(known.values()) if known else default
+    estimates = {a: known.get(a, fallback) for a in arguments}
+    capacity = target * parallel
+    packs, loads = [], []
+    for arg in sorted(arguments, key=lambda a: -estimates[a]):
+        for i, load in enumerate(loads):
+            if load + estimates[arg] <= capacity:
+                packs[i].append(arg)
+                loads[i] += estimates[arg]
+                break
+        else:
+            packs.append([arg])
+            loads.append(estimates[arg])
+    log.info(
+        f"Packed {len(arguments)} arguments ({len(known)} with history) into {len(packs)} jobs"
+    )
+    return packs
+
+
+def condor_pack_step(
+    wkspace, arguments, job_name, dag=None, target=600.0, parallel=1, itemdata=False
+):
+    """Generate a condor job running packs of trex-fitter arguments.
+
+    Short trex-fitter invocations (e.g. ranking or grouped impact) are
+    dominated by scheduling and ROOT startup, so they are grouped with
+    :py:func:`pack_arguments` and every pack runs as one job through
+    :py:data:`PACK_SCRIPT`, which also records the wall time of each
+    argument for the next :py:func:`read_pack_times`.
+
+    Parameters
+    ----------
+    wkspace : pathlib.Path
+        Condor workspace.
+    arguments : list(str)
+        trex-fitter arguments.
+    job_name : str
+        Name for the condor job.
+    dag : pycondor.Dagman, optional
+        Dagman to assign the job to.
+    target : float
+        Target wall time (seconds) of a pack.
+    parallel : int
+        Number of arguments to run at once in each job (and number of
+        CPUs requested).
+    itemdata : bool
+        Queue the packs from an item-data file (see
+        :py:class:`rexpy.pycondor.Job`).
+
+    Returns
+    -------
+    pycondor.Job
+        Condor job with one argument per pack.
+
+    """
+    config = wkspace / "fit.conf"
+    packs = pack_arguments(arguments, config, target=target, parallel=parallel)
+    pack_dir = wkspace / "packs"
+    pack_dir.mkdir(exist_ok=True)
+    script = pack_dir / "trex-pack.sh"
+    script.write_text(PACK_SCRIPT)
+    script.chmod(0o755)
+    jp = job_params(wkspace, str(script))
+    request_cpus = parallel if parallel > 1 else None
+    j = pycondor.Job(name=job_name, dag=dag, itemdata=itemdata, request_cpus=request_cpus, **jp)
+    for i, pack in enumerate(packs):
+        pack_file = pack_dir / f"{job_name}_{i}.txt"
+        pack_file.write_text("".join(f"{arg}\n" for arg in pack))
+        times_file = pack_dir / f"{pack_file.name}.times"
+        if times_file.exists():
+            times_file.unlink()
+        j.add_arg(f"{parallel} {pack_file} {TREX_EXE}")
+    return j
+
+
+def link_steps(jobs: Dict[str, Any]) -> None:
+    """Connect condor jobs according to :py:data:`STEP_GRAPH`.
+
+    Parameters
+    ----------
+    jobs : dict(str, pycondor.Job)
+        Jobs keyed by step name; steps that are not being run can be
+        missing or None.
+
+    """
+    for step, parents in STEP_GRAPH.items():
+        child = jobs.get(step)
+        if child is None:
+            continue
+        for parent_step in parents:
+            parent = jobs.get(parent_step)
+            if parent is not None:
+                child.add_parent(parent)
+                log.info(f"{parent_step} step now parent to {step} step")
+
+
+def local_step_arguments(config: str, step: str) -> List[str]:
+    """Get the trex-fitter arguments for a step when running locally.
+
+    Parameters
+    ----------
+    config : str
+        Path of the config file.
+    step : str
+        Step name (a key of :py:data:`STEP_GRAPH`).
+
+    Returns
+    -------
+    list(str)
+        The list of trex-fitter arguments.
+    """
+    if step == "n":
+        return ntuple_arguments(config)
+    elif step == "wf":
+        return [f"wf {config}"]
+    elif step == "dp":
+        return [f"dp {config}"]
+    elif step == "r":
+        return rank_arguments(config)
+    elif step == "rplot":
+        return [f"r {config} Ranking=plot"]
+    elif step == "i":
+        return grouped_impact_arguments(config)
+    elif step == "icombine":
+        return [f"i {config} GroupedImpact=combine"]
+    raise ValueError(f"Unknown step {step}")
+
+
+def step_tasks(
+    step_arguments: Dict[str, List[str]], expanded: Optional[Dict[str, List[str]]] = None
+) -> List[Task]:
+    """Expand step level arguments into a task graph.
+
+    Every argument becomes a task; a task depends on all tasks of the
+    parent steps (per :py:data:`STEP_GRAPH`) that are being run.
+
+    Parameters
+    ----------
+    step_arguments : dict(str, list(str))
+        trex-fitter arguments keyed by step name.
+    expanded : dict(str, list(str)), optional
+        Steps whose tasks were built separately (e.g. by
+        :py:func:`granular_ntuple_tasks`), mapped to the names of the
+        tasks that children of the step should wait on.
+
+    Returns
+    -------
+    list(Task)
+        Tasks in a valid execution order.
+    """
+    names = dict(expanded or {})
+    tasks = []
+    for step in STEP_GRAPH:
+        if step not in step_arguments or step in names:
+            continue
+        parents = tuple(n for p in STEP_GRAPH[step] for n in names.get(p, []))
+        args = step_arguments[step]
+        names[step] = [f"{step}_{i}" for i in range(len(args))]
+        for name, arg in zip(names[step], args):
+            tasks.append(Task(name, f"{TREX_EXE} {arg}", parents))
+    return tasks
+
+
+def granular_ntuple_tasks(config: str, fitname: str = "tW") -> Tuple[List[Task], List[str]]:
+    """Build the granular (region × systematic) n step task graph.
+
+    Every region gets one n task per systematic (see
+    :py:func:`ntuple_arguments_granular`) and an ``hupdate.exe``
+    task merging them, which depends only on that region's n tasks;
+    merges therefore start as soon as a region's inputs exist instead
+    of waiting for the whole step. Regions without systematics get a
+    single plain n task.
+
+    Parameters
+    ----------
+    config : str
+        Path of the config file.
+    fitname : str
+        Name of the fit.
+
+    Returns
+    -------
+    list(Task)
+        n and merge tasks.
+    list(str)
+        Names of the tasks that finish each region (what the ``wf``
+        step should depend on).
+    """
+    return _ntuple_plan_tasks(config, _granular_ntuple_plan(config, fitname), fitname)
+
+
+def _ntuple_plan_tasks(
+    config: str, plan: Dict[str, Tuple[List[str], List[str]]], fitname: str
+) -> Tuple[List[Task], List[str]]:
+    """Turn a region -> (n arguments, files to merge) plan into tasks."""
+    tasks = []
+    finals = []
+    for r, (args, files) in plan.items():
+        if not args:
+            name = f"n_{r}"
+            tasks.append(Task(name, f"{TREX_EXE} n {config} Regions={r}", ()))
+            finals.append(name)
+            continue
+        names = [f"n_{r}_{i}" for i in range(len(args))]
+        for name, arg in zip(names, args):
+            tasks.append(Task(name, f"{TREX_EXE} {arg}", ()))
+        if not files:
+            finals += names
+            continue
+        merged = f"{fitname}/Histograms/{fitname}_{r}_histos.root"
+        command = "{} {} {}".format(HUPDATE_EXE, merged, " ".join(files))
+        tasks.append(Task(f"merge_{r}", command, tuple(names)))
+        finals.append(f"merge_{r}")
+    return tasks, finals
+
+
+def ntuple_manifest(config: str) -> Dict[str, Any]:
+    """Get the block hashes the n step histograms depend on.
+
+    Parameters
+    ----------
+    config : str
+        Path of the config file.
+
+    Returns
+    -------
+    dict
+        ``"common"``: hash of every block that is not a Region,
+        Systematic or fit-only block; ``"Region"`` and
+        ``"Systematic"``: hash of each block by title.
+    """
+    parsed = parse(config)
+    return {
+        "common": parsed.digest(exclude=("Region", "Systematic") + FIT_BLOCK_TYPES),
+        "Region": parsed.block_digests("Region"),
+        "Systematic": parsed.block_digests("Systematic"),
+    }
+
+
+def _manifest_file(config: str, fitname: str) -> Path:
+    return Path(config).resolve().parent / fitname / "Histograms" / NTUPLE_MANIFEST
+
+
+def read_ntuple_manifest(config: str, fitname: str = "tW") -> Optional[Dict[str, Any]]:
+    """Read the manifest written by the last local n step.
+
+    Parameters
+    ----------
+    config : str
+        Path of the config file in the workspace.
+    fitname : str
+        Name of the fit.
+
+    Returns
+    -------
+    dict, optional
+        The manifest (see :py:func:`ntuple_manifest`), None if there
+        is no (readable) manifest.
+    """
+    try:
+        with open(_manifest_file(config, fitname)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_ntuple_manifest(config: str, fitname: str = "tW") -> None:
+    """Record the block hashes the workspace histograms were made with.
+
+    Parameters
+    ----------
+    config : str
+        Path of the config file in the workspace.
+    fitname : str
+        Name of the fit.
+
+    """
+    path = _manifest_file(config, fitname)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(ntuple_manifest(config), f)
+
+
+def incremental_ntuple_plan(
+    config: str, previous: Optional[Dict[str, Any]], fitname: str = "tW"
+) -> Optional[Dict[str, Tuple[List[str], List[str]]]]:
+    """Plan the n step work needed to bring existing histograms up to date.
+
+    Block hashes (see :py:func:`ntuple_manifest`) are compared with the
+    ones the existing histograms were made with. New or changed
+    regions are redone entirely; for the other regions only new or
+    changed systematics are produced (``SaveSuffix`` files) and merged
+    into the existing histogram file with ``hupdate.exe``. Histograms
+    of removed systematics are left in place, TRExFitter ignores them.
+
+    Parameters
+    ----------
+    config : str
+        Path of the config file.
+    previous : dict, optional
+        Manifest of the existing histograms (see
+        :py:func:`read_ntuple_manifest`).
+    fitname : str
+        Name of the fit.
+
+    Returns
+    -------
+    dict(str, tuple(list(str), list(str))), optional
+        n step arguments and files to merge for each region that needs
+        work; None if everything has to be redone (no previous
+        manifest, or a block shared by all regions changed).
+    """
+    if previous is None:
+        return None
+    current = ntuple_manifest(config)
+    if current["common"] != previous.get("common"):
+        return None
+
+    def changed(kind):
+        before = previous.get(kind, {})
+        return {t for t, d in current[kind].items() if before.get(t) != d}
+
+    changed_regions = changed("Region")
+    changed_systematics = sorted(changed("Systematic"))
+    parsed = parse(config)
+    plan = {}
+    for r in regions_from(parsed):
+        if r in changed_regions:
+            plan[r] = ([f"n {config} Regions={r}"], [])
+            continue
+        args, files = _systematic_plan(config, r, changed_systematics, fitname)
+        if args:
+            plan[r] = (args, files)
+    return plan
+
+
+def run_task_graph(
+    tasks: Iterable[Task],
+    processes: Optional[int] = None,
+    cwd: Optional[str] = None,
+    executor: Optional[StepExecutor] = None,
+    fail_fast: bool = False,
+    retry: int = 0,
+    backoff: float = 5.0,
+) -> Dict[str, TaskResult]:
+    """Execute a task graph with one bounded worker pool.
+
+    Every task whose parents have finished successfully is dispatched
+    immediately, so independent tasks from different steps (e.g.
+    ``dp``, ranking and grouped impact after ``wf``) run concurrently.
+
+    Failed tasks are retried (with exponential backoff) up to `retry`
+    times; a task's own ``retry`` field supersedes the default, like
+    the ``retry`` argument of :py:meth:`rexpy.pycondor.Job.add_arg`.
+    If a task still fails, fail-fast mode cancels everything that has
+    not started yet and raises :py:class:`TaskFailedError`; otherwise
+    the descendants of the failed task are skipped and the rest of the
+    graph keeps going.
+
+    Parameters
+    ----------
+    tasks : iterable(Task)
+        Tasks to execute; parents not in `tasks` are ignored.
+    processes : int, optional
+        Max number of tasks to run in parallel (default is CPU count,
+        ignored if `executor` is given).
+    cwd : str, optional
+        Directory to execute the commands from.
+    executor : StepExecutor, optional
+        Shared executor to use; a temporary one is created if None.
+    fail_fast : bool
+        Stop at the first failed task.
+    retry : int
+        Default number of retries for a failed task.
+    backoff : float
+        Seconds to wait before the first retry (doubled every retry).
+
+    Returns
+    -------
+    dict(str, TaskResult)
+        Result of each executed task (skipped tasks are not included).
+
+    Raises
+    ------
+    TaskFailedError
+        If a task fails in fail-fast mode.
+    """
+    if executor is None:
+        with StepExecutor(processes) as ex:
+            return run_task_graph(
+                tasks,
+                cwd=cwd,
+                executor=ex,
+                fail_fast=fail_fast,
+                retry=retry,
+                backoff=backoff,
+            )
+
+    tasks = {t.name: t for t in tasks}
+    waiting_on = {n: set(p for p in t.parents if p in tasks) for n, t in tasks.items()}
+    children = {n: [] for n in tasks}
+    for name, parents in waiting_on.items():
+        for p in parents:
+            children[p].append(name)
+    ready = [n for n, parents in waiting_on.items() if not parents]
+    results = {}
+    skipped = set()
+    running = {}
+    failure = None
+    while ready or running:
+        for name in ready:
+            task = tasks[name]
+            n_retry = retry if task.retry is None else task.retry
+            log.debug(f"Dispatching {name}: {task.command}")
+            future = executor.submit(_run_task, name, task.command, cwd, n_retry, backoff)
+            running[future] = name
+        ready = []
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            name = running.pop(future)
+            if future.cancelled():
+                continue
+            result = future.result()
+            results[name] = result
+            if result.returncode != 0:
+                log.error(f"{name} failed with exit code {result.returncode}: {result.command}")
+                if fail_fast:
+                    failure = failure or result
+                    for other in running:
+                        other.cancel()
+                    continue
+                stack = list(children[name])
+                while stack:
+                    child = stack.pop()
+                    if child not in skipped:
+                        skipped.add(child)
+                        stack.extend(children[child])
+                continue
+            for child in children[name]:
+                waiting_on[child].discard(name)
+                if not waiting_on[child] and child not in skipped:
+                    ready.append(child)
+        if failure is not None:
+            ready = []
+    if skipped:
+        log.warning(f"Skipped {len(skipped)} tasks depending on failed tasks")
+    if failure is not None:
+        raise TaskFailedError(
+            f"{failure.name} failed with exit code {failure.returncode}", results
+        )
+    return results
+
+
+def summarize_results(results: Dict[str, TaskResult]) -> None:
+    """Log a summary of task results.
+
+    Parameters
+    ----------
+    results : dict(str, TaskResult)
+        Results from :py:func:`run_task_graph`.
+
+    """
+    if not results:
+        return
+    failed = [r for r in results.values() if r.returncode != 0]
+    retried = [r for r in results.values() if r.attempts > 1]
+    slowest = max(results.values(), key=lambda r: r.wall_time)
+    biggest = max(results.values(), key=lambda r: r.max_rss)
+    log.info(f"{len(results)} tasks finished, {len(failed)} failed, {len(retried)} retried")
+    log.info(f"Slowest task: {slowest.name} ({slowest.wall_time:.1f}s)")
+    log.info(f"Peak RSS: {biggest.name} ({biggest.max_rss / 1024:.1f} MB)")
+    for r in failed:
+        log.error(f"{r.name} failed after {r.attempts} attempt(s): {r.command}")
+
+
+def run_steps_local(
+    config: str,
+    steps: Iterable[str],
+    processes: Optional[int] = None,
+    executor: Optional[StepExecutor] = None,
+    granular_ntup: bool = False,
+    incremental_ntup: bool = False,
+    cache: Optional[StepCache] = None,
+    **kwargs,
+) -> Dict[str, TaskResult]:
+    """Run a set of TRExFitter steps locally as a dependency graph.
+
+    Parameters
+    ----------
+    config : str
+        Path of the config file.
+    steps : iterable(str)
+        Step names (keys of :py:data:`STEP_GRAPH`) to run.
+    processes : int, optional
+        Max number of processes to run in parallel (default is CPU
+        count, ignored if `executor` is given).
+    executor : StepExecutor, optional
+        Shared executor to use; a temporary one is created if None.
+    granular_ntup : bool
+        Split the n step by region and systematic and merge each
+        region with ``hupdate.exe`` (see
+        :py:func:`granular_ntuple_tasks`).
+    incremental_ntup : bool
+        Only redo the parts of the n step affected by Region and
+        Systematic blocks that changed since the workspace histograms
+        were made (see :py:func:`incremental_ntuple_plan`).
+    cache : rexpy.stepcache.StepCache, optional
+        Restore the outputs of steps whose inputs are unchanged since a
+        previous run instead of running them, and store the outputs of
+        the steps that do run.
+    kwargs : dict
+        Passed to :py:func:`run_task_graph` (`fail_fast`, `retry`,
+        `backoff`).
+
+    Returns
+    -------
+    dict(str, TaskResult)
+        Result of each executed task (restored steps are not included).
+
+    Raises
+    ------
+    RuntimeError
+        If histograms have to be merged but ``hupdate.exe`` is not in
+        the ``PATH``.
+    """
+    steps = list(steps)
+    log.info(f"Running steps {steps}")
+    cwd = Path(config).resolve().parent
+    run_n = "n" in steps
+    if cache is not None:
+        fitdir = cwd / "tW"
+        keys = cache.keys(
+            config, {s: local_step_arguments(config, s) for s in steps}, executable=TREX_EXE
+        )
+        for step in cached_steps(cache, keys, fitdir, steps):
+            steps.remove(step)
+    ntuple_tasks = []
+    expanded = {}
+    if "n" in steps:
+        plan = None
+        if incremental_ntup:
+            plan = incremental_ntuple_plan(config, read_ntuple_manifest(config))
+            if plan is None:
+                log.info("Histograms are not reusable, running the full n step")
+            else:
+                log.info(f"Incremental n step for regions {sorted(plan)}")
+        if plan is None and granular_ntup:
+            plan = _granular_ntuple_plan(config)
+        if plan is not None:
+            if HUPDATE_EXE is None and any(files for _, files in plan.values()):
+                raise RuntimeError("hupdate.exe not found; required to merge histograms")
+            ntuple_tasks, expanded["n"] = _ntuple_plan_tasks(config, plan, "tW")
+            steps.remove("n")
+    step_arguments = {s: local_step_arguments(config, s) for s in steps}
+    tasks = ntuple_tasks + step_tasks(step_arguments, expanded)
+    log.info(f"Running {len(tasks)} tasks")
+
+    step_of = {t.name: "n" for t in ntuple_tasks}
+    step_of.update((t.name, t.name.rsplit("_", 1)[0]) for t in tasks if t.name not in step_of)
+
+    def finish(results):
+        failed = {
+            step_of[t.name]
+            for t in tasks
+            if t.name not in results or results[t.name].returncode != 0
+        }
+        if run_n and "n" not in failed:
+            write_ntuple_manifest(config)
+        update_runtimes(runtimes_from_results(results), config)
+        if cache is None:
+            return
+        for step in (s for s in list(step_arguments) + list(expanded) if s not in failed):
+            n_files = cache.store(keys[step], fitdir, step)
+            log.info(f"Cached {n_files} output files of {step} step ({keys[step][:12]})")
+
+    try:
+        results = run_task_graph(
+            tasks, processes=processes, cwd=str(cwd), executor=executor, **kwargs
+        )
+    except TaskFailedError as err:
+        finish(err.results)
+        raise
+    finish(results)
+    return results
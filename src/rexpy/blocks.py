@@ -20,11 +20,6 @@ from textwrap import dedent
 import logging
 
 # rexpy
-from rexpy.shower import (
-    norm_uncertainties_tW,
-    norm_uncertainties_ttbar,
-    norm_uncertainties_ttbar_splits,
-)
 from rexpy.systematic_tables import (
     SYS_WEIGHTS,
     PDF_WEIGHTS,
@@ -255,10 +250,12 @@ def norm_factor_blocks():
     )
 
 
-def _tW_shower_norms(ntup_dir, sel_1j1b=None, sel_2j1b=None, sel_2j2b=None):
-    overall, m1j1b, m2j1b, m2j2b = norm_uncertainties_tW(
-        ntup_dir, sel_1j1b, sel_2j1b, sel_2j2b
-    )
+def _tW_shower_norms(ntup_dir, sel_1j1b=None, sel_2j1b=None, sel_2j2b=None, norms=None):
+    if norms is None:
+        from rexpy.shower import norm_uncertainties_tW
+
+        norms = norm_uncertainties_tW(ntup_dir, sel_1j1b, sel_2j1b, sel_2j2b)
+    overall, m1j1b, m2j1b, m2j2b = norms
     return """\
 Systematic: "tW_PS_norm"
   Category: "Signal_Model"
@@ -306,15 +303,19 @@ Systematic: "tW_PS_migration"
 
 
 def _ttbar_shower_norms(
-    ntup_dir, sel_1j1b=None, sel_2j1b=None, sel_2j2b=None, herwig_dsid="410558",
+    ntup_dir, sel_1j1b=None, sel_2j1b=None, sel_2j2b=None, herwig_dsid="410558", norms=None,
 ):
-    overall, m1j1b, m2j1b, m2j2b = norm_uncertainties_ttbar(
-        ntup_dir,
-        sel_1j1b,
-        sel_2j1b,
-        sel_2j2b,
-        herwig_dsid,
-    )
+    if norms is None:
+        from rexpy.shower import norm_uncertainties_ttbar
+
+        norms = norm_uncertainties_ttbar(
+            ntup_dir,
+            sel_1j1b,
+            sel_2j1b,
+            sel_2j2b,
+            herwig_dsid,
+        )
+    overall, m1j1b, m2j1b, m2j2b = norms
     return """\
 Systematic: "ttbar_PS_norm"
   Category: "Background_Model"
@@ -364,6 +365,9 @@ Systematic: "ttbar_PS_migration"
 def _ttbar_shower_norms_splits(
     ntup_dir, sel_1j1b=None, sel_2j1b=None, sel_2j2b=None, herwig_dsid="410558",
 ):
+    # rexpy.shower is heavy, import only when yields are needed
+    from rexpy.shower import norm_uncertainties_ttbar_splits
+
     overall, m1j1b, m2j1b, m2j2b = norm_uncertainties_ttbar_splits(
         ntup_dir,
         sel_1j1b,
@@ -429,9 +433,13 @@ def _herwig_version_to_dsid(herwig_version):
 def sys_modeling_blocks(
     ntup_dir, sel_1j1b=None, sel_2j1b=None, sel_2j2b=None, herwig_version="704",
 ):
+    from rexpy.shower import shower_norm_uncertainties
+
     herwig_dsid = _herwig_version_to_dsid(herwig_version)
-    tW_norms = _tW_shower_norms(ntup_dir, sel_1j1b, sel_2j1b, sel_2j2b)
-    ttbar_norms = _ttbar_shower_norms(ntup_dir, sel_1j1b, sel_2j1b, sel_2j2b, herwig_dsid)
+    # one batch of event loops for both samples
+    norms = shower_norm_uncertainties(ntup_dir, sel_1j1b, sel_2j1b, sel_2j2b, herwig_dsid)
+    tW_norms = _tW_shower_norms(ntup_dir, norms=norms["tW"])
+    ttbar_norms = _ttbar_shower_norms(ntup_dir, norms=norms["ttbar"])
     shower_norm_blocks = "{}\n\n{}".format(tW_norms, ttbar_norms)
     return """\
 Systematic: "tW_DRDS"
@@ -1,8 +1,18 @@
 """A module for parsing TRExFitter configs and results"""
 
 # stdlib
+import hashlib
+import json
+import logging
+import os
+import pickle
+import re
+from collections import OrderedDict
+from fnmatch import fnmatchcase
 from pathlib import PosixPath
 
+log = logging.getLogger(__name__)
+
 
 def all_blocks(config, delimiter="\n\n"):
     """Get all blocks in a config based on a delimiter.
@@ -29,6 +39,589 @@ def all_blocks(config, delimiter="\n\n"):
     return config_str.split(delimiter)
 
 
+_BLANK_LINE_RE = re.compile(r"\n[ \t]*\n")
+
+
+def iter_blocks(chunks):
+    """Lazily split a stream of config text into single blocks.
+
+    Each chunk may contain any number of blocks separated by blank
+    lines (e.g. the output of the :py:mod:`rexpy.blocks` functions);
+    leading and trailing blank lines are discarded.
+
+    Parameters
+    ----------
+    chunks : iterable(str)
+        Pieces of configuration text.
+
+    Yields
+    ------
+    str
+        Configuration blocks.
+    """
+    for chunk in chunks:
+        for block in _BLANK_LINE_RE.split(chunk):
+            block = block.strip("\n")
+            if block.strip():
+                yield block
+
+
+def write_blocks(blocks, config, delimiter="\n\n"):
+    """Write a stream of blocks to a config file in a single pass.
+
+    Parameters
+    ----------
+    blocks : iterable(str)
+        Configuration blocks.
+    config : str or os.PathLike
+        Path of the config file to write.
+    delimiter : str
+        Delimiter to place between blocks.
+
+    Returns
+    -------
+    int
+        Number of blocks written.
+    """
+    n = 0
+    with open(config, "w") as f:
+        for block in blocks:
+            if n > 0:
+                f.write(delimiter)
+            f.write(block)
+            n += 1
+        f.write("\n")
+    return n
+
+
+class Block:
+    """A single top level TRExFitter configuration block.
+
+    Parameters
+    ----------
+    block_type : str
+        Type of the block (e.g. "Region", "Systematic").
+    title : str
+        Title of the block (quotes removed).
+    entries : list(tuple(str, str))
+        Sub block (key, value) pairs in the order they appear; values
+        are stripped but otherwise untouched (quotes are kept).
+    start : int
+        Offset of the block's header line in the config text.
+    end : int
+        Offset one past the block's last non-blank line.
+    source : str
+        Entire config text the offsets refer to.
+    spans : list(tuple(int, int)), optional
+        Offsets of each entry's value in the config text (parallel to
+        `entries`).
+
+    """
+
+    __slots__ = ("block_type", "title", "entries", "start", "end", "source", "spans")
+
+    def __init__(self, block_type, title, entries, start, end, source, spans=None):
+        self.block_type = block_type
+        self.title = title
+        self.entries = entries
+        self.start = start
+        self.end = end
+        self.source = source
+        self.spans = [] if spans is None else spans
+
+    def __repr__(self):
+        return 'Block({}: "{}", n_entries={})'.format(
+            self.block_type, self.title, len(self.entries)
+        )
+
+    @property
+    def text(self):
+        """str: The raw text span of the block."""
+        return self.source[self.start : self.end]
+
+    def values(self, key):
+        """Get all values associated with a sub block key.
+
+        Parameters
+        ----------
+        key : str
+            Sub block key (e.g. "Regions").
+
+        Returns
+        -------
+        list(str)
+            Values for the key (empty if the key is not in the block).
+        """
+        return [v for k, v in self.entries if k == key]
+
+    @property
+    def digest(self):
+        """str: Stable hash of the block's type, title and entries.
+
+        Comments, blank lines and indentation do not contribute, so
+        only changes to the block's settings change the hash.
+        """
+        payload = json.dumps([self.block_type, self.title, self.entries])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key, default=None):
+        """Get the first value associated with a sub block key.
+
+        Parameters
+        ----------
+        key : str
+            Sub block key (e.g. "Regions").
+        default : any
+            Value to return if the key is not in the block.
+
+        Returns
+        -------
+        str
+            Value for the key.
+        """
+        for k, v in self.entries:
+            if k == key:
+                return v
+        return default
+
+
+class Config:
+    """A TRExFitter configuration parsed and indexed in a single pass.
+
+    Top level blocks are indexed by type and title, and the unique
+    values of every sub block key are collected while parsing, so all
+    of the queries provided by this module are lookups after the
+    object is constructed. Each block keeps the span of raw text it
+    was parsed from.
+
+    Parameters
+    ----------
+    text : str
+        Contents of the configuration.
+    path : str or os.PathLike, optional
+        Path the configuration was read from.
+
+    Attributes
+    ----------
+    blocks : list(Block)
+        All top level blocks in the order they appear.
+
+    Examples
+    --------
+    Parse once, query many times:
+
+    >>> cfg = Config.from_file("/path/to/fit.conf")
+    >>> regions = regions_from(cfg)
+    >>> systematics = systematics_from(cfg)
+
+    """
+
+    def __init__(self, text, path=None):
+        self.text = text
+        self.path = path
+        self.blocks = []
+        self._index = {}
+        self._sub_values = {}
+        self._parse()
+
+    @classmethod
+    def from_file(cls, config):
+        """Read and parse a configuration file.
+
+        Parameters
+        ----------
+        config : str or os.PathLike
+            Path of the config file.
+
+        Returns
+        -------
+        Config
+            Parsed configuration.
+        """
+        return cls(PosixPath(config).read_text(), path=config)
+
+    def __repr__(self):
+        return "Config(path={}, n_blocks={})".format(self.path, len(self.blocks))
+
+    def __iter__(self):
+        return iter(self.blocks)
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def _parse(self):
+        text = self.text
+        current = None
+        last_end = 0
+        pos = 0
+        for line in text.splitlines(keepends=True):
+            line_start = pos
+            pos += len(line)
+            stripped = line.strip()
+            if not stripped or stripped.startswith(("%", "#")):
+                continue
+            line_end = line_start + len(line.rstrip("\r\n"))
+            key, sep, value = stripped.partition(": ")
+            if not line[0].isspace():
+                if current is not None:
+                    current.end = last_end
+                if not sep:
+                    current = None
+                    continue
+                title = value.replace('"', "").strip()
+                current = Block(key, title, [], line_start, line_end, text)
+                self.blocks.append(current)
+                self._index.setdefault(key, {}).setdefault(title, []).append(current)
+            elif sep and current is not None:
+                value = value.strip()
+                value_end = line_start + len(line.rstrip())
+                current.entries.append((key, value))
+                current.spans.append((value_end - len(value), value_end))
+                self._sub_values.setdefault(key, set()).add(
+                    value.replace('"', "").strip()
+                )
+            last_end = line_end
+        if current is not None:
+            current.end = last_end
+
+    def titles(self, block_type):
+        """Get the set of titles associated with a block type.
+
+        Parameters
+        ----------
+        block_type : str
+            Block type the titles are associated with.
+
+        Returns
+        -------
+        set(str)
+            Titles of the requested blocks.
+        """
+        return set(self._index.get(block_type, {}))
+
+    def blocks_of(self, block_type, title=None):
+        """Get the blocks of a given type (and optionally title).
+
+        Parameters
+        ----------
+        block_type : str
+            Type of the blocks.
+        title : str, optional
+            Only blocks with this title.
+
+        Returns
+        -------
+        list(Block)
+            Matching blocks in the order they appear.
+        """
+        by_title = self._index.get(block_type, {})
+        if title is not None:
+            return list(by_title.get(title, []))
+        return [b for b in self.blocks if b.block_type == block_type]
+
+    def block_digests(self, block_type):
+        """Get a stable hash for each block of a given type.
+
+        Parameters
+        ----------
+        block_type : str
+            Type of the blocks (e.g. "Region", "Systematic").
+
+        Returns
+        -------
+        dict(str, str)
+            Hash of each title (see :py:attr:`Block.digest`); titles
+            repeated across blocks get a hash of all of them.
+        """
+        digests = {}
+        for title, blocks in self._index.get(block_type, {}).items():
+            if len(blocks) == 1:
+                digests[title] = blocks[0].digest
+            else:
+                joined = "".join(b.digest for b in blocks)
+                digests[title] = hashlib.sha256(joined.encode()).hexdigest()
+        return digests
+
+    def digest(self, exclude=()):
+        """Get a stable hash of the whole configuration.
+
+        Parameters
+        ----------
+        exclude : iterable(str)
+            Block types to leave out.
+
+        Returns
+        -------
+        str
+            Hash of every (not excluded) block, in order.
+        """
+        exclude = set(exclude)
+        h = hashlib.sha256()
+        for block in self.blocks:
+            if block.block_type not in exclude:
+                h.update(block.digest.encode())
+        return h.hexdigest()
+
+    def with_values(self, edits):
+        """Get the config text with some sub block values replaced.
+
+        Only the replaced values change; comments, formatting and every
+        other line are kept byte for byte.
+
+        Parameters
+        ----------
+        edits : dict(tuple(Block, int), str)
+            New value for each (block, entry index) pair.
+
+        Returns
+        -------
+        str
+            The edited config text.
+        """
+        spans = sorted((block.spans[i], value) for (block, i), value in edits.items())
+        pieces = []
+        pos = 0
+        for (start, end), value in spans:
+            pieces.append(self.text[pos:start])
+            pieces.append(value)
+            pos = end
+        pieces.append(self.text[pos:])
+        return "".join(pieces)
+
+    def sub_values(self, key):
+        """Get the set of values associated with a sub block key.
+
+        Parameters
+        ----------
+        key : str
+            Sub block key (e.g. "SubCategory").
+
+        Returns
+        -------
+        set(str)
+            Unique values of the given key (quotes removed).
+        """
+        return set(self._sub_values.get(key, set()))
+
+
+class ConfigCache:
+    """Memoized parsing of configuration files.
+
+    Parsed configs are kept in a least recently used cache keyed by
+    the SHA-256 digest of the file contents. A second index maps the
+    resolved path of each file to its ``(mtime, size, digest)``, so an
+    unchanged file is looked up with a single :py:func:`os.stat`
+    call. If the stat information changed the file is read and hashed;
+    identical contents (e.g. a config copied into a workspace) reuse
+    the existing parse.
+
+    With persistence enabled the parsed configs and the stat index are
+    also written to disk, so a new process asking about an unchanged
+    file skips parsing (and reading) completely. The index keeps the
+    `disk_maxsize` most recently parsed paths and pickles no longer
+    referenced by it are deleted, so the directory does not grow
+    without bound.
+
+    Parsed configs are shared between callers and must be treated as
+    read only.
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of parsed configs to hold in memory.
+    disk_maxsize : int
+        Maximum number of paths in the stat index (and so of parsed
+        configs kept on disk).
+    directory : str or os.PathLike, optional
+        Directory for on-disk persistence (disabled if None).
+
+    """
+
+    VERSION = 2
+
+    def __init__(self, maxsize=32, disk_maxsize=256, directory=None):
+        self.maxsize = maxsize
+        self.disk_maxsize = disk_maxsize
+        self.directory = None
+        self._configs = OrderedDict()
+        self._stats = OrderedDict()
+        if directory is not None:
+            self.persist_to(directory)
+
+    def __len__(self):
+        return len(self._configs)
+
+    def persist_to(self, directory):
+        """Enable on-disk persistence.
+
+        Parameters
+        ----------
+        directory : str or os.PathLike
+            Directory to store the cache (created if necessary).
+
+        Returns
+        -------
+        ConfigCache
+            Returns self.
+        """
+        self.directory = PosixPath(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        index = self._index_file
+        if index.exists():
+            try:
+                stored = json.loads(index.read_text())
+            except ValueError:
+                log.warning("Ignoring corrupt config cache index %s" % index)
+            else:
+                for path, stat in stored.items():
+                    self._stats.setdefault(path, tuple(stat))
+        return self
+
+    def clear(self):
+        """Clear the in-memory cache (the on-disk cache is untouched)."""
+        self._configs.clear()
+        self._stats.clear()
+
+    @property
+    def _index_file(self):
+        return self.directory / "index.v{}.json".format(self.VERSION)
+
+    def _pickle_file(self, digest):
+        return self.directory / "{}.v{}.pickle".format(digest, self.VERSION)
+
+    def _remember(self, digest, config):
+        self._configs[digest] = config
+        self._configs.move_to_end(digest)
+        while len(self._configs) > self.maxsize:
+            self._configs.popitem(last=False)
+
+    def _lookup(self, digest):
+        if digest in self._configs:
+            self._configs.move_to_end(digest)
+            return self._configs[digest]
+        if self.directory is not None:
+            pfile = self._pickle_file(digest)
+            if pfile.exists():
+                try:
+                    with pfile.open("rb") as f:
+                        config = pickle.load(f)
+                except (pickle.UnpicklingError, EOFError, AttributeError):
+                    log.warning("Ignoring corrupt config cache entry %s" % pfile)
+                else:
+                    self._remember(digest, config)
+                    return config
+        return None
+
+    def _store(self, digest, config):
+        self._remember(digest, config)
+        if self.directory is None:
+            return
+        tmp = self._pickle_file(digest).with_suffix(".tmp{}".format(os.getpid()))
+        with tmp.open("wb") as f:
+            pickle.dump(config, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._pickle_file(digest))
+
+    def _save_index(self):
+        if self.directory is None:
+            return
+        tmp = self._index_file.with_suffix(".tmp{}".format(os.getpid()))
+        tmp.write_text(json.dumps(self._stats))
+        os.replace(tmp, self._index_file)
+        # drop pickles (including older versions) the index no longer uses
+        live = {self._pickle_file(stat[2]).name for stat in self._stats.values()}
+        for pfile in self.directory.glob("*.pickle"):
+            if pfile.name not in live:
+                try:
+                    pfile.unlink()
+                except OSError:
+                    pass
+
+    def get(self, config):
+        """Get the parsed version of a configuration file.
+
+        Parameters
+        ----------
+        config : str or os.PathLike
+            Path of the config file.
+
+        Returns
+        -------
+        Config
+            Parsed configuration.
+        """
+        path = str(PosixPath(config).resolve())
+        st = os.stat(path)
+        known = self._stats.get(path)
+        if known is not None and tuple(known[:2]) == (st.st_mtime_ns, st.st_size):
+            parsed = self._lookup(known[2])
+            if parsed is not None:
+                self._stats.move_to_end(path)
+                return parsed
+
+        raw = PosixPath(path).read_bytes()
+        digest = hashlib.sha256(raw).hexdigest()
+        parsed = self._lookup(digest)
+        if parsed is None:
+            parsed = Config(raw.decode(), path=config)
+            self._store(digest, parsed)
+        self._stats[path] = (st.st_mtime_ns, st.st_size, digest)
+        self._stats.move_to_end(path)
+        while len(self._stats) > self.disk_maxsize:
+            self._stats.popitem(last=False)
+        self._save_index()
+        return parsed
+
+
+CONFIG_CACHE = ConfigCache()
+
+
+def _as_config(config):
+    if isinstance(config, Config):
+        return config
+    return CONFIG_CACHE.get(config)
+
+
+def parse(config):
+    """Parse a configuration file into a :py:class:`Config`.
+
+    Parsing goes through the process level :py:data:`CONFIG_CACHE`, so
+    asking about the same unchanged file again is a dictionary lookup.
+
+    Parameters
+    ----------
+    config : str or os.PathLike or Config
+        Path of the config file (an existing :py:class:`Config` is
+        returned as is).
+
+    Returns
+    -------
+    Config
+        Parsed configuration (shared, treat as read only).
+    """
+    return _as_config(config)
+
+
+def enable_disk_cache(directory=None):
+    """Persist parsed configs to disk for use by later processes.
+
+    Parameters
+    ----------
+    directory : str or os.PathLike, optional
+        Cache directory; defaults to the ``confparse`` directory under
+        :py:func:`rexpy.helpers.cache_directory`.
+
+    Returns
+    -------
+    ConfigCache
+        The process level cache.
+    """
+    if directory is None:
+        from rexpy.helpers import cache_directory
+
+        directory = cache_directory("confparse")
+    return CONFIG_CACHE.persist_to(directory)
+
+
 def top_block_titles(config, block_type):
     """Extract the set of titles associated with a block type.
 
@@ -37,8 +630,8 @@ def top_block_titles(config, block_type):
 
     Parameters
     ----------
-    config : str
-        Path of the config file.
+    config : str or os.PathLike or Config
+        Path of the config file or an already parsed config.
     block_type : str
         Block type the titles are associated with.
 
@@ -69,16 +662,7 @@ def top_block_titles(config, block_type):
       ["reg2j2b", "reg2j1b"]
 
     """
-    with open(config, "r") as f:
-        return set(
-            map(
-                lambda line: line.split(": ")[1].replace('"', "").strip(),
-                filter(
-                    lambda line: str(line).startswith("%s: " % block_type),
-                    f.readlines(),
-                ),
-            )
-        )
+    return _as_config(config).titles(block_type)
 
 
 def sub_block_values(config, key):
@@ -86,8 +670,8 @@ def sub_block_values(config, key):
 
     Parameters
     ----------
-    config : str
-        Path of the config file.
+    config : str or os.PathLike or Config
+        Path of the config file or an already parsed config.
     key : str
         Sub block key (e.g. "SubCategory")
 
@@ -96,16 +680,7 @@ def sub_block_values(config, key):
     set(str)
         Unique values of the given key
     """
-    with open(config, "r") as f:
-        return set(
-            map(
-                lambda line: line.split(": ")[1].replace('"', "").strip(),
-                filter(
-                    lambda line: str(line).startswith("  %s: " % key),
-                    f.readlines(),
-                ),
-            )
-        )
+    return _as_config(config).sub_values(key)
 
 
 def systematics_from(config, specific_sys=None):
@@ -118,8 +693,8 @@ def systematics_from(config, specific_sys=None):
 
     Parameters
     ----------
-    config : str
-        Path of the config file.
+    config : str or os.PathLike or Config
+        Path of the config file or an already parsed config.
     specific_sys : iterable(str), optional
         Specific systematics to use; if None (the default), uses all
         discovered systematics.
@@ -129,7 +704,7 @@ def systematics_from(config, specific_sys=None):
     list(str)
         The relevant systematics.
     """
-    systs = top_block_titles(config, "Systematic")
+    systs = _as_config(config).titles("Systematic")
     if specific_sys is None or len(specific_sys) == 0:
         return systs
     else:
@@ -141,8 +716,8 @@ def regions_from(config, exclude=None):
 
     Parameters
     ----------
-    config : str
-        Path of the config file.
+    config : str or os.PathLike or Config
+        Path of the config file or an already parsed config.
     exclude : list(str)
         Regions to skip (if present in config).
 
@@ -151,13 +726,206 @@ def regions_from(config, exclude=None):
     list(str)
         The list of regions in the config file.
     """
-    regs = top_block_titles(config, "Region")
+    regs = _as_config(config).titles("Region")
     if exclude is not None:
         return list(filter(lambda r: r not in exclude, regs))
     else:
         return regs
 
 
+class RemovalDiff:
+    """Record of the blocks removed by :py:func:`remove_blocks`.
+
+    Attributes
+    ----------
+    regions : list(str)
+        Titles of the removed Region blocks.
+    systematics : list(str)
+        Titles of the removed Systematic blocks.
+    blocks : list(str)
+        Text of every removed block.
+    pruned : list(str)
+        Headers of kept blocks whose region lists were pruned.
+
+    """
+
+    def __init__(self):
+        self.regions = []
+        self.systematics = []
+        self.blocks = []
+        self.pruned = []
+
+    def __repr__(self):
+        return "RemovalDiff(n_regions={}, n_systematics={}, n_pruned={})".format(
+            len(self.regions), len(self.systematics), len(self.pruned)
+        )
+
+    def __bool__(self):
+        return bool(self.blocks or self.pruned)
+
+    def lines(self):
+        """Summarize the removal as diff style lines.
+
+        Returns
+        -------
+        list(str)
+            One ``- header`` line per removed block and one ``~ header``
+            line per block with a pruned region list.
+        """
+        removed = ["- {}".format(b.split("\n", 1)[0]) for b in self.blocks]
+        return removed + ["~ {}".format(h) for h in self.pruned]
+
+
+class _TitleMatcher:
+    """Set based title matching with optional glob patterns."""
+
+    def __init__(self, names):
+        names = [] if names is None else ([names] if isinstance(names, str) else names)
+        self.exact = set(n for n in names if not any(c in n for c in "*?["))
+        self.patterns = [n for n in names if n not in self.exact]
+
+    def __bool__(self):
+        return bool(self.exact or self.patterns)
+
+    def __call__(self, title):
+        if title in self.exact:
+            return True
+        return any(fnmatchcase(title, p) for p in self.patterns)
+
+
+def _block_title(block):
+    header = block.split("\n", 1)[0]
+    return header.split(": ", 1)[1].replace('"', "").strip() if ": " in header else ""
+
+
+def _prune_region_lists(block, drop_reg):
+    """Remove matching regions from the region lists of a block.
+
+    Returns the new block text, whether anything changed, and whether
+    a list was emptied completely (in which case its line is removed).
+    """
+    lines = []
+    changed, emptied = False, False
+    for line in block.split("\n"):
+        key, sep, value = line.strip().partition(":")
+        if sep and line[:1].isspace() and key in ("Regions", "SummaryPlotRegions"):
+            entries = [e.strip() for e in value.split(",")]
+            kept = [e for e in entries if not drop_reg(e.replace('"', ""))]
+            if len(kept) != len(entries):
+                changed = True
+                if not kept:
+                    emptied = True
+                    continue
+                indent = line[: len(line) - len(line.lstrip())]
+                line = "{}{}: {}".format(indent, key, ",".join(kept))
+        lines.append(line)
+    return "\n".join(lines), changed, emptied
+
+
+def iter_remove_blocks(blocks, systematics=None, regions=None, diff=None):
+    """Lazily remove systematics and regions from a stream of blocks.
+
+    All requested removals happen in a single linear pass; titles are
+    tested against a set (names containing glob characters, e.g.
+    ``"*1j1b*"``, are matched with :py:func:`fnmatch.fnmatchcase`).
+
+    Besides the requested ``Systematic`` and ``Region`` blocks, a
+    ``Systematic`` block is also removed when every region in its
+    ``Regions:`` list is removed. Partially affected ``Regions:``
+    lists (and the ``SummaryPlotRegions:`` list of the ``Job`` block)
+    are pruned instead.
+
+    Parameters
+    ----------
+    blocks : iterable(str)
+        TRExFitter blocks.
+    systematics : list(str), optional
+        Names of the systematics to remove.
+    regions : list(str), optional
+        Names of the regions to remove.
+    diff : RemovalDiff, optional
+        Record of what was removed, filled as the stream is consumed.
+
+    Yields
+    ------
+    str
+        The remaining blocks.
+    """
+    drop_sys = _TitleMatcher(systematics)
+    drop_reg = _TitleMatcher(regions)
+    for block in blocks:
+        removed = False
+        if block.startswith("Region:"):
+            title = _block_title(block)
+            removed = bool(drop_reg) and drop_reg(title)
+            if removed and diff is not None:
+                diff.regions.append(title)
+        elif block.startswith("Systematic:"):
+            title = _block_title(block)
+            removed = bool(drop_sys) and drop_sys(title)
+            if not removed and drop_reg:
+                pruned, changed, emptied = _prune_region_lists(block, drop_reg)
+                if emptied:
+                    removed = True
+                elif changed:
+                    block = pruned
+                    if diff is not None:
+                        diff.pruned.append(block.split("\n", 1)[0])
+            if removed and diff is not None:
+                diff.systematics.append(title)
+        elif block.startswith("Job:") and drop_reg:
+            block, changed, _ = _prune_region_lists(block, drop_reg)
+            if changed and diff is not None:
+                diff.pruned.append(block.split("\n", 1)[0])
+        if removed:
+            if diff is not None:
+                diff.blocks.append(block)
+            continue
+        yield block
+
+
+def remove_blocks(blocks, systematics=None, regions=None):
+    """Remove systematics and regions from a set of blocks.
+
+    See :py:func:`iter_remove_blocks` for the matching rules.
+
+    Parameters
+    ----------
+    blocks : iterable(str)
+        TRExFitter blocks.
+    systematics : list(str), optional
+        Names of the systematics to remove.
+    regions : list(str), optional
+        Names of the regions to remove.
+
+    Returns
+    -------
+    list(str)
+        The remaining blocks.
+    RemovalDiff
+        Record of what was removed.
+
+    Examples
+    --------
+    >>> blocks = [
+    ...     'Region: "reg1j1b"\\n  Type: SIGNAL',
+    ...     'Region: "reg2j2b"\\n  Type: SIGNAL',
+    ...     'Systematic: "Lumi"\\n  Type: OVERALL',
+    ...     'Systematic: "JVT"\\n  Regions: reg1j1b,reg2j2b',
+    ...     'Systematic: "Norm_Diboson_2j2b"\\n  Regions: reg2j2b',
+    ... ]
+    >>> kept, diff = remove_blocks(blocks, systematics=["Lumi", "JVT"], regions=["reg2j2b"])
+    >>> diff.systematics
+    ['Lumi', 'JVT', 'Norm_Diboson_2j2b']
+    >>> diff.regions
+    ['reg2j2b']
+
+    """
+    diff = RemovalDiff()
+    kept = list(iter_remove_blocks(blocks, systematics, regions, diff))
+    return kept, diff
+
+
 def drop_systematics(blocks, systematics):
     """Drop a systematic from a set of blocks.
 
@@ -173,20 +941,15 @@ def drop_systematics(blocks, systematics):
     list(str)
         Blocks without desired systematic.
     """
-    result = blocks[:]
-    to_drop = []
-    for s in systematics:
-        itr = filter(lambda x: x.startswith(f'Systematic: "{s}"'), blocks)
-        for i in itr:
-            to_drop.append(i)
-    for drop in to_drop:
-        result.remove(drop)
-    return result
+    return remove_blocks(blocks, systematics=systematics)[0]
 
 
 def drop_region(blocks, region):
     """Drop a region from a set of blocks.
 
+    Every region with a title containing `region` is dropped (e.g.
+    ``"1j1b"`` drops ``reg1j1b`` and its validation plot regions).
+
     Parameters
     ----------
     blocks : list(str)
@@ -199,19 +962,7 @@ def drop_region(blocks, region):
     list(str)
         Blocks without dropped region.
     """
-    new_blocks = []
-    for block in blocks:
-        if block.startswith("Region:"):
-            if region in block:
-                continue
-        if block.startswith("Systematic:"):
-            if region in block:
-                continue
-        new_blocks.append(block)
-    new_blocks[0] = new_blocks[0].replace(
-        "SummaryPlotRegions: reg1j1b,reg2j1b,reg2j2b\n  ", ""
-    )
-    return new_blocks
+    return remove_blocks(blocks, regions=["*{}*".format(region)])[0]
 
 
 def unblind(config):
@@ -42,6 +42,32 @@ def selection_with_period(raw, only_1516=False, only_17=False, only_18=False):
         return raw
 
 
+def cache_directory(*subdirs):
+    """Get (and create) a rexpy cache directory.
+
+    The base directory is ``$REXPY_CACHE_DIR`` if it is defined,
+    otherwise ``$XDG_CACHE_HOME/rexpy`` (falling back to
+    ``~/.cache/rexpy``).
+
+    Parameters
+    ----------
+    subdirs : str
+        Subdirectories to append to the base cache directory.
+
+    Returns
+    -------
+    pathlib.PosixPath
+        The cache directory.
+    """
+    base = os.getenv("REXPY_CACHE_DIR")
+    if base is None:
+        xdg = os.getenv("XDG_CACHE_HOME", str(PosixPath.home() / ".cache"))
+        base = PosixPath(xdg) / "rexpy"
+    path = PosixPath(base).joinpath(*subdirs)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
 def copy_histograms(from_path, to_workspace):
     """Copy histograms generated by a previous `n` step.
 
@@ -3,43 +3,21 @@ from __future__ import division, print_function
 import os
 import sys
 import time
-from collections import namedtuple
 import click
-from datetime import datetime
 
 from .job import Job
+from .monitor import (Status, DagmanOutTail, empty_status,
+                      line_to_datetime, dag_exists, watch)
 
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 
-_states = ['Done', 'Pre', 'Queued', 'Post', 'Ready', 'UnReady', 'Failed']
-Status = namedtuple('Status', _states)
-
-
-def line_to_datetime(line):
-    '''Function to extract a datetime from a dagman out file line
-
-    Parameters
-    ----------
-    line : str
-        Any line from a .dagman.out file.
-
-    Returns
-    -------
-    dt : datetime.datetime
-        Datetime stamp from line in out file.
-    '''
-    date_str = line.split(' ')[0]
-    time_str = line.split(' ')[1]
-    month, day, year = map(int, date_str.split('/'))
-    hour, minute, second = map(int, time_str.split(':'))
-    dt = datetime(year, month, day, hour, minute, second)
-
-    return dt
-
 
 def status_generator(dag_out_file):
     '''Generator to yield dagman status
 
+    Each iteration only reads the part of the file appended since the
+    previous one (see :class:`DagmanOutTail`).
+
     Parameters
     ----------
     dag_out_file : str
@@ -52,33 +30,10 @@ def status_generator(dag_out_file):
         done, queued, ready, failed, etc. If no line is found indicating the
         current dagman status, an empty Status object is returned.
     datetime_current : datetime.datetime
-        Current datetime. If
+        Datetime of the last line in the file (the current datetime if
+        no line has been written yet).
     '''
-    status_str = 'Done     Pre   Queued    Post   Ready   Un-Ready   Failed'
-    with open(dag_out_file, 'r') as file_object:
-        while True:
-            lines = file_object.readlines()
-            node_counts = []
-            datetime_current = None
-            # Reverse order of lines to get most recent status of the dagman
-            lines = lines[::-1]
-            for idx, line in enumerate(lines):
-                if idx == 0:
-                    datetime_current = line_to_datetime(line)
-                if status_str in line:
-                    num_line = lines[idx-2]
-                    node_counts = [i for i in num_line.split(' ') if i != ''
-                                   and ':' not in i and '/' not in i]
-                    node_counts = map(int, node_counts)
-                    break
-
-            if node_counts:
-                status = Status(*node_counts)
-            else:
-                status = Status(*[0]*len(_states))
-                datetime_current = datetime.now()
-
-            yield status, datetime_current
+    return DagmanOutTail(dag_out_file).follow(interval=0)
 
 
 def progress_bar_str(status, datetime_start, datetime_current, length=30,
@@ -182,7 +137,7 @@ def monitor(time_, length, prog_char, file):
 
     with open(dag_out_file, 'r') as f:
         datetime_start = line_to_datetime(f.readline())
-    current_status = Status(*[0]*len(_states))
+    current_status = empty_status()
     try:
         for status, datetime_current in status_generator(dag_out_file):
             # If no line with dagman status is found, wait and try again
@@ -207,6 +162,60 @@ def monitor(time_, length, prog_char, file):
         sys.exit()
 
 
+@cli.command(
+    context_settings=CONTEXT_SETTINGS,
+    short_help='Monitor many Dagmans',
+)
+@click.option(
+    '-t',
+    '--time',
+    'time_',
+    default=30,
+    type=float,
+    show_default=True,
+    help='Time (in seconds) in between log checks',
+)
+@click.option(
+    '--jsonl',
+    default=None,
+    help='Append a JSON line per check to this file (- for stdout)',
+)
+@click.option(
+    '--status-file',
+    default=None,
+    type=click.Path(),
+    help='File replaced with the latest status (JSON) on every check',
+)
+@click.option(
+    '--quiet',
+    is_flag=True,
+    help='Do not print the progress table',
+)
+@click.argument(
+    'files',
+    nargs=-1,
+    required=True,
+    type=click.Path(),
+)
+def dashboard(time_, jsonl, status_file, quiet, files):
+    '''Prints progress, throughput and ETA of many Dagmans
+
+    FILES are dag files (or their .dagman.out files); the ones that have
+    not started running yet are shown with no nodes.
+    '''
+    missing = [f for f in files if not dag_exists(f)]
+    if missing:
+        raise click.BadParameter(
+            'neither the dag file nor its .dagman.out file exists for '
+            '{}'.format(', '.join(missing)), param_hint='FILES')
+    try:
+        watch(files, interval=time_, jsonl=jsonl, status_file=status_file,
+              table=not quiet)
+    except KeyboardInterrupt:
+        print('\nExiting pycondor dashboard...')
+        sys.exit()
+
+
 @cli.command(
     context_settings=CONTEXT_SETTINGS,
     short_help='Submit a Job',
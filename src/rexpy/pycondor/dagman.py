@@ -58,34 +58,74 @@ def _iter_job_args(job):
             yield node_name, job_arg
 
 
-def _get_parent_child_string(node):
+#: Largest number of parent/child edges (parent nodes times child nodes)
+#: a dependency may expand to before a NOOP join node is inserted.
+JOIN_THRESHOLD = 1000
+
+
+def _get_node_names(node):
+    """Names of the DAG nodes a Job (one per arg) or Dagman expands to
+    """
+    if isinstance(node, Job) and len(node) > 0 and not node.itemdata:
+        return [node_name for node_name, job_arg in _iter_job_args(node)]
+    else:
+        return [node.submit_name]
+
+
+def _get_parent_child_string(node, parent_names=None, child_names=None):
     """Constructs the parent/child line for node to be added to a Dagman
+
+    The node names on either side can be given explicitly (e.g. to
+    depend on a join node instead of the parents themselves).
     """
 
     if not isinstance(node, BaseNode):
         raise ValueError('Expecting a Job or Dagman object, '
                          'got {}'.format(type(node)))
 
-    parent_string = 'Parent'
-    for parent_node in node.parents:
-        if isinstance(parent_node, Job) and len(parent_node) > 0:
-            for node_name, job_arg in _iter_job_args(parent_node):
-                parent_string += ' {}'.format(node_name)
-        else:
-            parent_string += ' {}'.format(parent_node.submit_name)
+    if parent_names is None:
+        parent_names = [name for parent_node in node.parents
+                        for name in _get_node_names(parent_node)]
+    if child_names is None:
+        child_names = _get_node_names(node)
 
-    child_string = 'Child'
-    if isinstance(node, Job) and len(node) > 0:
-        for node_name, job_arg in _iter_job_args(node):
-            child_string += ' {}'.format(node_name)
-    else:
-        child_string += ' {}'.format(node.submit_name)
-
-    parent_child_string = parent_string + ' ' + child_string
+    parent_child_string = 'Parent {} Child {}'.format(' '.join(parent_names),
+                                                      ' '.join(child_names))
 
     return parent_child_string
 
 
+def _get_join_strings(node, join_submit_file, join_threshold):
+    """Constructs the lines to depend on node's parents through a join node
+
+    DAGMan expands a ``Parent ... Child ...`` line into an edge for
+    every (parent, child) pair, so a Job with N args depending on one
+    with M args costs N*M edges. Routing the dependency through a NOOP
+    node (which is never submitted) needs only N+M.
+
+    Returns
+    -------
+    join_strings : list
+        The JOB line for the join node followed by the two parent/child
+        lines, or an empty list if the dependency has at most
+        join_threshold edges.
+    """
+    if join_threshold is None:
+        return []
+    parent_names = [name for parent_node in node.parents
+                    for name in _get_node_names(parent_node)]
+    child_names = _get_node_names(node)
+    n_parents, n_children = len(parent_names), len(child_names)
+    if (n_parents < 2 or n_children < 2 or
+            n_parents * n_children <= join_threshold):
+        return []
+
+    join_name = '{}_join'.format(node.submit_name)
+    return ['JOB {} {} NOOP'.format(join_name, join_submit_file),
+            _get_parent_child_string(node, parent_names, [join_name]),
+            _get_parent_child_string(node, [join_name], child_names)]
+
+
 class Dagman(BaseNode):
     """
     Dagman object consisting of a series of Jobs and sub-Dagmans to manage.
@@ -225,7 +265,8 @@ class Dagman(BaseNode):
                              'to a Dagman'.format(job.name))
 
         job_arg_lines = []
-        if len(job.args) == 0:
+        # Item-data Jobs queue all of their arguments from one node
+        if len(job.args) == 0 or job.itemdata:
             job_line = 'JOB {} {}'.format(job.submit_name, job.submit_file)
             job_arg_lines.append(job_line)
         else:
@@ -257,7 +298,8 @@ class Dagman(BaseNode):
 
         return job_arg_lines
 
-    def build(self, makedirs=True, fancyname=True):
+    def build(self, makedirs=True, fancyname=True,
+              join_threshold=JOIN_THRESHOLD):
         """Build and saves the submit file for Dagman
 
         Parameters
@@ -272,6 +314,12 @@ class Dagman(BaseNode):
             file becomes ``dagname_YYYYMMD_id``. This is useful when running
             several Dags/Jobs of the same name (default is ``True``).
 
+        join_threshold : int or None, optional
+            Dependencies that would expand to more parent/child edges than
+            this go through a NOOP join node instead, so that a Job with N
+            args depending on a Job with M args costs N+M edges rather than
+            N*M (default is ``JOIN_THRESHOLD``). ``None`` never joins.
+
         Returns
         -------
         self : object
@@ -295,7 +343,7 @@ class Dagman(BaseNode):
             if isinstance(node, Job):
                 node._build_from_dag(makedirs, fancyname)
             elif isinstance(node, Dagman):
-                node.build(makedirs, fancyname)
+                node.build(makedirs, fancyname, join_threshold)
             else:
                 raise TypeError('Nodes must be either a Job or Dagman object')
 
@@ -304,6 +352,9 @@ class Dagman(BaseNode):
             self.submit_file))
         lines = []
         parent_child_lines = []
+        join_submit_file = os.path.join(self.submit,
+                                        '{}_join.submit'.format(name))
+        n_joins = 0
         for node_index, node in enumerate(self.nodes, start=1):
             self.logger.info('Working on {} [{} of {}]'.format(node.name,
                              node_index, len(self.nodes)))
@@ -319,8 +370,21 @@ class Dagman(BaseNode):
                 raise TypeError('Nodes must be either a Job or Dagman object')
             # Add parent/child information, if necessary
             if node.hasparents():
-                parent_child_string = _get_parent_child_string(node)
-                parent_child_lines.append(parent_child_string)
+                join_strings = _get_join_strings(node, join_submit_file,
+                                                 join_threshold)
+                if join_strings:
+                    lines.append(join_strings[0])
+                    parent_child_lines.extend(join_strings[1:])
+                    n_joins += 1
+                else:
+                    parent_child_string = _get_parent_child_string(node)
+                    parent_child_lines.append(parent_child_string)
+
+        # NOOP nodes are never submitted, but DAGMan wants a submit file
+        if n_joins:
+            self.logger.info('Added {} join nodes'.format(n_joins))
+            with open(join_submit_file, 'w') as f:
+                f.write('universe = local\nexecutable = /bin/true\nqueue\n')
 
         # Add any extra lines to submit file, if specified
         if self.extra_lines:
@@ -383,7 +447,8 @@ class Dagman(BaseNode):
         return self
 
     @requires_command('condor_submit_dag')
-    def build_submit(self, makedirs=True, fancyname=True, submit_options=None):
+    def build_submit(self, makedirs=True, fancyname=True, submit_options=None,
+                     join_threshold=JOIN_THRESHOLD):
         """Calls build and submit sequentially
 
         Parameters
@@ -404,12 +469,15 @@ class Dagman(BaseNode):
             <http://research.cs.wisc.edu/htcondor/manual/current/condor_submit_dag.html>`_
             for possible options).
 
+        join_threshold : int or None, optional
+            See :meth:`build` (default is ``JOIN_THRESHOLD``).
+
         Returns
         -------
         self : object
             Returns self.
         """
-        self.build(makedirs, fancyname)
+        self.build(makedirs, fancyname, join_threshold)
         self.submit_dag(submit_options=submit_options)
 
         return self
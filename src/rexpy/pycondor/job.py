@@ -96,6 +96,15 @@ class Job(BaseNode):
         Note: this feature is only available to Jobs that are submitted via a
         Dagman (default is None; no retries).
 
+    itemdata : bool, optional
+        Write the arguments to an item-data file next to the submit file
+        and queue them all with a single ``queue ARGS from <file>``
+        statement, so the Job is one cluster (and a single node when in a
+        Dagman) instead of one node per argument. Arguments with retries
+        use ``max_retries`` (the largest of them) and, for arguments
+        without names, the output and error files get the process number
+        (default is False).
+
     verbose : int, optional
         Level of logging verbosity option are 0-warning, 1-info,
         2-debugging (default is 0).
@@ -128,7 +137,7 @@ class Job(BaseNode):
                  request_cpus=None, getenv=None, universe=None,
                  initialdir=None, notification=None, requirements=None,
                  queue=None, extra_lines=None, dag=None, arguments=None,
-                 retry=None, verbose=0):
+                 retry=None, itemdata=False, verbose=0):
 
         super(Job, self).__init__(name, submit, extra_lines, dag, verbose)
 
@@ -149,6 +158,7 @@ class Job(BaseNode):
         if retry is not None and not isinstance(retry, int):
             raise TypeError('retry must be an int')
         self.retry = retry
+        self.itemdata = itemdata
 
         self.args = []
         if arguments is not None:
@@ -248,7 +258,8 @@ class Job(BaseNode):
 
         # Retrying failed nodes is only available to Jobs in a Dagman
         self._has_arg_retries = any([job_arg.retry for job_arg in self.args])
-        if self._has_arg_retries and (not indag):
+        use_items = self.itemdata and len(self.args) > 0
+        if self._has_arg_retries and not (indag or use_items):
             message = 'Retrying failed Jobs is only available when ' + \
                       'submitting from a Dagman.'
             self.logger.error(message)
@@ -290,6 +301,9 @@ class Job(BaseNode):
             if self._has_arg_names:
                 file_path = os.path.join(dir_path,
                                          '$(job_name).{}'.format(attr))
+            elif use_items and attr != 'log':
+                file_path = os.path.join(dir_path,
+                                         '{}.$(Process).{}'.format(name, attr))
             else:
                 file_path = os.path.join(dir_path,
                                          '{}.{}'.format(name, attr))
@@ -304,9 +318,31 @@ class Job(BaseNode):
         # Add arguments and queue line
         if self.queue is not None and not isinstance(self.queue, int):
             raise ValueError('queue must be of type int')
+        # All arguments go in one cluster, queued from the item-data file
+        if use_items:
+            items_file = os.path.join(self.submit, '{}.items'.format(name))
+            item_lines = []
+            for arg, arg_name, _ in self.args:
+                if not self._has_arg_names:
+                    item_lines.append(arg)
+                elif arg_name is not None:
+                    item_lines.append('{}_{} {}'.format(name, arg_name, arg))
+                else:
+                    item_lines.append('{} {}'.format(name, arg))
+            with open(items_file, 'w') as f:
+                f.write('\n'.join(item_lines) + '\n')
+
+            lines.append('arguments = $(ARGS)')
+            if self._has_arg_retries:
+                max_retries = max(job_arg.retry or 0 for job_arg in self.args)
+                lines.append('max_retries = {}'.format(max_retries))
+            variables = 'job_name,ARGS' if self._has_arg_names else 'ARGS'
+            count = '{} '.format(self.queue) if self.queue else ''
+            lines.append('queue {}{} from {}'.format(count, variables,
+                                                     items_file))
         # If building this submit file for a job that's being managed by DAGMan
         # just add simple arguments and queue lines
-        if indag:
+        elif indag:
             if len(self.args) > 0:
                 lines.append('arguments = $(ARGS)')
             if self._has_arg_names:
@@ -372,7 +408,7 @@ class Job(BaseNode):
             'Building submission file for Job {}...'.format(self.name))
         self._make_submit_script(makedirs, fancyname, indag=False)
         self._built = True
-        if len(self.args) >= 10:
+        if len(self.args) >= 10 and not self.itemdata:
             self.logger.warning('You are submitting a Job with {} arguments. '
                                 'Consider using a Dagman in the future to '
                                 'help monitor jobs.'.format(len(self.args)))
@@ -0,0 +1,568 @@
+from __future__ import division, print_function
+import json
+import logging
+import os
+import re
+import sys
+import time
+from collections import deque, namedtuple
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+_states = ['Done', 'Pre', 'Queued', 'Post', 'Ready', 'UnReady', 'Failed']
+Status = namedtuple('Status', _states)
+
+STATUS_HEADER = 'Done     Pre   Queued    Post   Ready   Un-Ready   Failed'
+
+# last line DAGMan writes, whether it finished, failed or was removed
+_EXIT_RE = re.compile(r'EXITING WITH STATUS (-?\d+)')
+# a (rescue) run appending to the same file
+_STARTING_UP = '(CONDOR_DAGMAN) STARTING UP'
+
+
+def empty_status():
+    '''Status with every count set to zero
+    '''
+    return Status(*[0]*len(_states))
+
+
+def line_to_datetime(line):
+    '''Function to extract a datetime from a dagman out file line
+
+    Parameters
+    ----------
+    line : str
+        Any line from a .dagman.out file.
+
+    Returns
+    -------
+    dt : datetime.datetime
+        Datetime stamp from line in out file.
+    '''
+    date_str = line.split(' ')[0]
+    time_str = line.split(' ')[1]
+    month, day, year = map(int, date_str.split('/'))
+    hour, minute, second = map(int, time_str.split(':'))
+    dt = datetime(year, month, day, hour, minute, second)
+
+    return dt
+
+
+def _try_datetime(line):
+    try:
+        return line_to_datetime(line)
+    except (ValueError, IndexError):
+        return None
+
+
+def _parse_counts(line):
+    counts = [i for i in line.split(' ') if i != ''
+              and ':' not in i and '/' not in i]
+    try:
+        counts = [int(i) for i in counts]
+    except ValueError:
+        return None
+    # newer DAGMan versions append more columns (e.g. Futile)
+    if len(counts) < len(_states):
+        return None
+    return Status(*counts[:len(_states)])
+
+
+class DagmanOutTail(object):
+    '''Follow a .dagman.out file and keep track of the latest status
+
+    The file is never read twice: the first update seeks backward from
+    the end of the file in blocks until the most recent status table is
+    found, and every later update only reads the bytes appended since
+    the previous one (an incomplete last line is kept until it is
+    finished). The cost of an update is therefore proportional to the
+    new output, not to the size of the file.
+
+    Parameters
+    ----------
+    dag_out_file : str
+        Path to dagman out file to follow.
+    block_size : int, optional
+        Size of the blocks read backward on the first update (default
+        is 65536 bytes).
+
+    Attributes
+    ----------
+    status : Status
+        Most recent node counts (all zero until a status table is seen).
+    exit_status : int or None
+        Exit status of DAGMan once it logged ``EXITING WITH STATUS``
+        (None while it is running).
+    datetime_current : datetime.datetime
+        Timestamp of the last complete line read (None before any).
+    offset : int
+        Byte offset up to which the file has been consumed.
+
+    Examples
+    --------
+    >>> tail = DagmanOutTail('rexpy.dag.dagman.out')
+    >>> for status, datetime_current in tail.follow(interval=30):
+    ...     print(status.Done, status.Failed)
+    '''
+
+    def __init__(self, dag_out_file, block_size=65536):
+        self.dag_out_file = dag_out_file
+        self.block_size = block_size
+        self.status = empty_status()
+        self.exit_status = None
+        self.datetime_current = None
+        self.offset = None
+        self._inode = None
+        self._datetime_start = None
+        self._partial = b''
+        self._countdown = None
+
+    def __repr__(self):
+        return 'DagmanOutTail({}, offset={})'.format(self.dag_out_file,
+                                                     self.offset)
+
+    @property
+    def datetime_start(self):
+        '''datetime.datetime: Timestamp of the first line of the file
+        '''
+        if self._datetime_start is None:
+            with open(self.dag_out_file, 'rb') as f:
+                first = f.readline().decode('utf-8', 'replace')
+            self._datetime_start = _try_datetime(first)
+        return self._datetime_start
+
+    @property
+    def finished(self):
+        '''bool: Whether DAGMan exited or every node is done or failed
+
+        Checking the exit line matters when nodes never get there: the
+        descendants of failed nodes stay Un-Ready (without a Futile
+        column) and a DAG removed with condor_rm just stops.
+        '''
+        if self.exit_status is not None:
+            return True
+        n_total = sum(self.status)
+        return n_total != 0 and \
+            self.status.Done + self.status.Failed == n_total
+
+    def _consume(self, lines):
+        '''Update the state from complete lines (oldest first)'''
+        updated = False
+        for line in lines:
+            line = line.decode('utf-8', 'replace')
+            if not line.strip():
+                continue
+            dt = _try_datetime(line)
+            if dt is not None:
+                self.datetime_current = dt
+            exiting = _EXIT_RE.search(line)
+            if exiting is not None:
+                self.exit_status = int(exiting.group(1))
+                updated = True
+            elif _STARTING_UP in line.upper():
+                self.exit_status = None
+            if STATUS_HEADER in line:
+                # counts are two lines below the header (after the ===)
+                self._countdown = 2
+            elif self._countdown is not None:
+                self._countdown -= 1
+                if self._countdown == 0:
+                    self._countdown = None
+                    status = _parse_counts(line)
+                    if status is not None:
+                        self.status = status
+                        updated = True
+        return updated
+
+    def _read_backward(self, f, size):
+        '''Find the most recent status table reading blocks from EOF'''
+        header = STATUS_HEADER.encode()
+        data = b''
+        pos = size
+        while pos > 0:
+            step = min(self.block_size, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+            idx = data.rfind(header)
+            if idx == -1:
+                continue
+            # keep from the start of the header line
+            start = data.rfind(b'\n', 0, idx) + 1
+            if start == 0 and pos > 0:
+                continue
+            return data[start:]
+        return data
+
+    def update(self):
+        '''Read whatever was appended to the file since the last update
+
+        Returns
+        -------
+        updated : bool
+            Whether a new status table was found.
+        '''
+        try:
+            stat = os.stat(self.dag_out_file)
+        except OSError:
+            return False
+        size = stat.st_size
+        if size == self.offset and stat.st_ino == self._inode:
+            return False
+        with open(self.dag_out_file, 'rb') as f:
+            if self.offset is None or size < self.offset or \
+                    stat.st_ino != self._inode:
+                # first read (or the file was truncated / replaced)
+                self._inode = stat.st_ino
+                self.status = empty_status()
+                self.exit_status = None
+                self.datetime_current = None
+                self._partial = b''
+                self._countdown = None
+                self._datetime_start = None
+                data = self._read_backward(f, size)
+            else:
+                f.seek(self.offset)
+                data = f.read(size - self.offset)
+        self.offset = size
+        data = self._partial + data
+        lines = data.split(b'\n')
+        self._partial = lines.pop()
+        return self._consume(lines)
+
+    def __iter__(self):
+        return self.follow(interval=0)
+
+    def follow(self, interval=30):
+        '''Generator to yield the status after each update
+
+        Parameters
+        ----------
+        interval : float, optional
+            Time (in seconds) to wait between updates (default is 30).
+
+        Returns
+        -------
+        status : Status
+            Most recent node counts.
+        datetime_current : datetime.datetime
+            Timestamp of the last line read (the current time if the
+            file has no timestamped lines yet).
+        '''
+        first = True
+        while True:
+            if not first and interval:
+                time.sleep(interval)
+            first = False
+            self.update()
+            yield self.status, self.datetime_current or datetime.now()
+
+
+def _dag_out_file(path):
+    if path.endswith('.dagman.out'):
+        return path
+    return path + '.dagman.out'
+
+
+def dag_exists(path):
+    '''Function to check that a dag file or its .dagman.out file exists
+
+    Parameters
+    ----------
+    path : str
+        Path to the dag file (or its .dagman.out file).
+
+    Returns
+    -------
+    exists : bool
+        Whether the dag file or its .dagman.out file exists.
+    '''
+    dag_out_file = _dag_out_file(path)
+    dag_file = dag_out_file[:-len('.dagman.out')]
+    return os.path.exists(dag_out_file) or os.path.exists(dag_file)
+
+
+class DagProgress(object):
+    '''Progress and throughput of one DAG
+
+    Throughput is measured from the done node counts seen over the
+    last `window` seconds of polling; until nodes finish within that
+    window it falls back to the average since the DAG started (the
+    first line of the .dagman.out file).
+
+    Parameters
+    ----------
+    dag : str
+        Path to the dag file (or its .dagman.out file).
+    window : float, optional
+        Time span (in seconds) used for the throughput (default is 600).
+    '''
+
+    def __init__(self, dag, window=600):
+        self.dag_out_file = _dag_out_file(dag)
+        self.name = os.path.basename(self.dag_out_file)[:-len('.dagman.out')]
+        self.tail = DagmanOutTail(self.dag_out_file)
+        self.window = window
+        self._samples = deque()
+
+    def __repr__(self):
+        return 'DagProgress({})'.format(self.name)
+
+    def update(self, now=None):
+        '''Read new output and record a throughput sample
+        '''
+        now = time.time() if now is None else now
+        self.tail.update()
+        self._samples.append((now, self.tail.status.Done))
+        while len(self._samples) > 2 and \
+                now - self._samples[1][0] > self.window:
+            self._samples.popleft()
+
+    @property
+    def rate(self):
+        '''float: Throughput in nodes per minute (None if unknown)
+        '''
+        if len(self._samples) >= 2:
+            (t0, done0), (t1, done1) = self._samples[0], self._samples[-1]
+            if t1 > t0 and done1 > done0:
+                return 60 * (done1 - done0) / (t1 - t0)
+        current = self.tail.datetime_current
+        if current is None or self.tail.status.Done == 0:
+            return None
+        start = self.tail.datetime_start
+        if start is None:
+            return None
+        minutes = (current - start).total_seconds() / 60
+        return self.tail.status.Done / minutes if minutes > 0 else None
+
+    @property
+    def remaining(self):
+        '''int: Nodes neither done nor failed (0 once DAGMan exited)
+        '''
+        if self.tail.finished:
+            return 0
+        status = self.tail.status
+        return sum(status) - status.Done - status.Failed
+
+    def record(self):
+        '''Machine readable progress
+
+        Returns
+        -------
+        record : dict
+            Node counts, total, throughput (nodes/min), ETA (seconds),
+            whether the DAG is finished and the DAGMan exit status
+            (None while running).
+        '''
+        status = self.tail.status
+        rate = self.rate
+        eta = None
+        if self.tail.finished:
+            eta = 0
+        elif rate and self.remaining:
+            eta = 60 * self.remaining / rate
+        record = {'dag': self.name, 'file': self.dag_out_file}
+        record.update(status._asdict())
+        record.update({
+            'total': sum(status),
+            'rate': rate,
+            'eta': eta,
+            'finished': self.tail.finished,
+            'exit_status': self.tail.exit_status,
+        })
+        return record
+
+
+class MultiDagMonitor(object):
+    '''Follow many DAGs at once
+
+    Every poll stats each .dagman.out file and only reads the ones that
+    grew (see :class:`DagmanOutTail`), so following tens of DAGs costs
+    little more than following one. Each poll produces a snapshot with
+    per-DAG and aggregate progress, which can be written as JSON lines
+    and/or to a status file for other tools.
+
+    Paths where neither the dag file nor its .dagman.out file exists
+    are skipped with a warning (see :attr:`missing`), so they cannot
+    keep the monitor from finishing.
+
+    Parameters
+    ----------
+    dags : list
+        Paths to dag files (or their .dagman.out files).
+    window : float, optional
+        Time span (in seconds) used for throughputs (default is 600).
+
+    Attributes
+    ----------
+    dags : list
+        A :class:`DagProgress` per existing DAG.
+    missing : list
+        Paths that were skipped.
+
+    Examples
+    --------
+    >>> mon = MultiDagMonitor(['a.dag', 'b.dag'])
+    >>> with open('progress.jsonl', 'a') as f:
+    ...     for snapshot in mon.run(interval=30, jsonl=f):
+    ...         print(snapshot['total']['eta'])
+    '''
+
+    def __init__(self, dags, window=600):
+        self.missing = [dag for dag in dags if not dag_exists(dag)]
+        for dag in self.missing:
+            log.warning('No dag file or .dagman.out file found for {}, '
+                        'skipping it'.format(dag))
+        self.dags = [DagProgress(dag, window=window) for dag in dags
+                     if dag not in self.missing]
+
+    def __repr__(self):
+        return 'MultiDagMonitor(n_dags={})'.format(len(self.dags))
+
+    @property
+    def finished(self):
+        '''bool: Whether every DAG (not counting missing ones) is finished
+        '''
+        return all(dag.tail.finished for dag in self.dags)
+
+    def poll(self):
+        '''Update every DAG
+
+        Returns
+        -------
+        snapshot : dict
+            ``time`` (unix time), ``dags`` (a record per DAG, see
+            :meth:`DagProgress.record`) and ``total`` (the aggregate
+            counts, throughput and ETA).
+        '''
+        now = time.time()
+        for dag in self.dags:
+            dag.update(now)
+        records = [dag.record() for dag in self.dags]
+        total = {name: sum(r[name] for r in records)
+                 for name in _states + ['total']}
+        rates = [r['rate'] for r in records if r['rate']]
+        remaining = sum(dag.remaining for dag in self.dags)
+        rate = sum(rates) if rates else None
+        eta = 60 * remaining / rate if rate and remaining else None
+        if self.finished:
+            eta = 0
+        total.update({
+            'rate': rate,
+            'eta': eta,
+            'finished': self.finished,
+            'n_dags': len(records),
+        })
+        return {'time': now, 'dags': records, 'total': total}
+
+    def run(self, interval=30, jsonl=None, status_file=None,
+            until_finished=True):
+        '''Generator to poll the DAGs every `interval` seconds
+
+        Parameters
+        ----------
+        interval : float, optional
+            Time (in seconds) in between polls (default is 30).
+        jsonl : file-like, optional
+            Stream to write each snapshot to as one JSON line.
+        status_file : str, optional
+            File atomically replaced with the latest snapshot (JSON).
+        until_finished : bool, optional
+            Stop once every DAG is finished (default is True).
+
+        Returns
+        -------
+        snapshot : dict
+            Snapshot from :meth:`poll`.
+        '''
+        while True:
+            snapshot = self.poll()
+            if jsonl is not None:
+                jsonl.write(json.dumps(snapshot) + '\n')
+                jsonl.flush()
+            if status_file is not None:
+                tmp = '{}.tmp{}'.format(status_file, os.getpid())
+                with open(tmp, 'w') as f:
+                    json.dump(snapshot, f, indent=1)
+                os.replace(tmp, status_file)
+            yield snapshot
+            if until_finished and snapshot['total']['finished']:
+                return
+            time.sleep(interval)
+
+
+def _format_eta(seconds):
+    if seconds is None:
+        return '?'
+    minutes = int(seconds // 60)
+    return '{}h{:02d}m'.format(minutes // 60, minutes % 60)
+
+
+def dashboard_str(snapshot):
+    '''Function to convert a snapshot into a table string
+
+    Parameters
+    ----------
+    snapshot : dict
+        Snapshot from :meth:`MultiDagMonitor.poll`.
+
+    Returns
+    -------
+    table : str
+        One line per DAG and one for the aggregate.
+    '''
+    rows = snapshot['dags'] + [dict(snapshot['total'], dag='TOTAL')]
+    width = max(len(r['dag']) for r in rows)
+    lines = ['{:<{w}}  {:>7} {:>7} {:>7} {:>7}  {:>9}  {:>7}'.format(
+        'DAG', 'done', 'queued', 'failed', 'total', 'nodes/min', 'ETA',
+        w=width)]
+    for r in rows:
+        rate = '{:.1f}'.format(r['rate']) if r['rate'] else '?'
+        lines.append('{:<{w}}  {:>7} {:>7} {:>7} {:>7}  {:>9}  {:>7}'.format(
+            r['dag'], r['Done'], r['Queued'], r['Failed'], r['total'], rate,
+            _format_eta(r['eta']), w=width))
+    return '\n'.join(lines)
+
+
+def watch(dags, interval=30, jsonl=None, status_file=None, table=True):
+    '''Follow many DAGs until they finish
+
+    Parameters
+    ----------
+    dags : list
+        Paths to dag files (or their .dagman.out files).
+    interval : float, optional
+        Time (in seconds) in between polls (default is 30).
+    jsonl : str, optional
+        File to append JSON lines snapshots to (``'-'`` for stdout).
+    status_file : str, optional
+        File atomically replaced with the latest snapshot.
+    table : bool, optional
+        Print a progress table to stderr after each poll (default is
+        True).
+
+    Returns
+    -------
+    snapshot : dict
+        The final snapshot (None if none of the DAGs exist).
+    '''
+    monitor = MultiDagMonitor(dags)
+    if not monitor.dags:
+        log.warning('None of the DAGs exist, nothing to monitor')
+        return None
+    stream = None
+    if jsonl == '-':
+        stream = sys.stdout
+    elif jsonl is not None:
+        stream = open(jsonl, 'a')
+    snapshot = None
+    try:
+        for snapshot in monitor.run(interval, stream, status_file):
+            if table:
+                sys.stderr.write(dashboard_str(snapshot) + '\n\n')
+                sys.stderr.flush()
+    finally:
+        if stream is not None and stream is not sys.stdout:
+            stream.close()
+    return snapshot
@@ -8,9 +8,6 @@ import shutil
 import shlex
 import platform
 from functools import wraps
-# Note that spawn isn't in namespace if import distutils is used
-# Must use from distutils import spawn
-from distutils import spawn
 
 
 # Specify logging settings
@@ -115,6 +112,9 @@ def assert_command_exists(cmd):
     if (version_major, version_minor) >= (3, 3):
         cmd_path = shutil.which(cmd)
     else:
+        # Note that spawn isn't in namespace if import distutils is used
+        # Must use from distutils import spawn (slow, python < 3.3 only)
+        from distutils import spawn
         cmd_path = spawn.find_executable(cmd)
 
     if cmd_path is None:
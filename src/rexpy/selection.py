@@ -0,0 +1,301 @@
+"""Module for evaluating TRExFitter selection strings with NumPy.
+
+TRExFitter selections and weights are C++ expressions, e.g.::
+
+    reg1j1b == 1 && OS == 1 && bdtres03 > 0.35
+    weight_nominal * (isMC16a == 1)
+
+:py:func:`compile_selection` parses such an expression once (with a
+small recursive descent parser following C++ operator precedence) and
+returns a callable that evaluates it on a mapping of branch name to
+NumPy array, so selections can be applied without ROOT.
+
+Supported: numbers, ``true``/``false``, branch names, parentheses,
+``! - +`` (unary), ``* / %``, ``+ -``, ``< <= > >=``, ``== !=``,
+``&&``, ``||`` and the functions in :py:data:`FUNCTIONS`. Division
+is always floating point. As in C++, booleans (e.g. comparison
+results) are promoted to integers by arithmetic operators, so
+``(x > 0) + (y > 0) == 2`` counts instead of or-ing.
+
+"""
+
+# stdlib
+import re
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class SelectionError(ValueError):
+    """Raised when a selection string cannot be parsed."""
+
+
+_TOKEN_RE = re.compile(
+    r"""
+    \s*(?:
+      (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)[fFlLuU]?
+    | (?P<name>[A-Za-z_][A-Za-z0-9_]*(?:::[A-Za-z_][A-Za-z0-9_]*)*)
+    | (?P<op>\|\||&&|==|!=|<=|>=|[-+*/%<>!(),])
+    )""",
+    re.VERBOSE,
+)
+
+#: Functions available in expressions (C++ name -> NumPy callable name).
+FUNCTIONS = {
+    "abs": "abs",
+    "fabs": "abs",
+    "std::abs": "abs",
+    "TMath::Abs": "abs",
+    "sqrt": "sqrt",
+    "TMath::Sqrt": "sqrt",
+    "exp": "exp",
+    "TMath::Exp": "exp",
+    "log": "log",
+    "TMath::Log": "log",
+    "cos": "cos",
+    "sin": "sin",
+    "TMath::Cos": "cos",
+    "TMath::Sin": "sin",
+    "pow": "power",
+    "TMath::Power": "power",
+    "min": "minimum",
+    "std::min": "minimum",
+    "TMath::Min": "minimum",
+    "max": "maximum",
+    "std::max": "maximum",
+    "TMath::Max": "maximum",
+}
+
+_BINARY = {
+    "||": "logical_or",
+    "&&": "logical_and",
+    "==": "equal",
+    "!=": "not_equal",
+    "<": "less",
+    "<=": "less_equal",
+    ">": "greater",
+    ">=": "greater_equal",
+    "+": "add",
+    "-": "subtract",
+    "*": "multiply",
+    "/": "true_divide",
+    "%": "fmod",
+}
+
+#: Operators that promote bool operands to int (C++ integral promotion).
+_ARITHMETIC = ("+", "-", "*", "/", "%")
+
+#: Binary operators from lowest to highest precedence.
+_PRECEDENCE = (
+    ("||",),
+    ("&&",),
+    ("==", "!="),
+    ("<", "<=", ">", ">="),
+    ("+", "-"),
+    ("*", "/", "%"),
+)
+
+
+def _tokenize(expr):
+    tokens = []
+    pos = 0
+    expr = expr.rstrip()
+    while pos < len(expr):
+        m = _TOKEN_RE.match(expr, pos)
+        if m is None or m.end() == pos:
+            pos += len(expr[pos:]) - len(expr[pos:].lstrip())
+            raise SelectionError(f"Unexpected character at {pos} in '{expr}'")
+        kind = m.lastgroup
+        tokens.append((kind, m.group(kind)))
+        pos = m.end()
+    return tokens
+
+
+class _Parser:
+    def __init__(self, expr):
+        self.expr = expr
+        self.tokens = _tokenize(expr)
+        self.pos = 0
+        self.branches = set()
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, value=None):
+        kind, tok = self.peek()
+        if kind is None or (value is not None and tok != value):
+            expected = value or "a token"
+            raise SelectionError(f"Expected {expected} at token {self.pos} in '{self.expr}'")
+        self.pos += 1
+        return kind, tok
+
+    def parse(self):
+        node = self.binary(0)
+        if self.pos != len(self.tokens):
+            raise SelectionError(f"Unexpected '{self.peek()[1]}' in '{self.expr}'")
+        return node
+
+    def binary(self, level):
+        if level == len(_PRECEDENCE):
+            return self.unary()
+        node = self.binary(level + 1)
+        while self.peek()[0] == "op" and self.peek()[1] in _PRECEDENCE[level]:
+            op = self.take()[1]
+            node = ("binary", op, node, self.binary(level + 1))
+        return node
+
+    def unary(self):
+        kind, tok = self.peek()
+        if kind == "op" and tok in ("!", "-", "+"):
+            self.take()
+            return ("unary", tok, self.unary())
+        return self.primary()
+
+    def primary(self):
+        kind, tok = self.take()
+        if kind == "number":
+            return ("const", float(tok))
+        if kind == "name":
+            if tok in ("true", "false"):
+                return ("const", 1.0 if tok == "true" else 0.0)
+            if self.peek() == ("op", "("):
+                if tok not in FUNCTIONS:
+                    raise SelectionError(f"Unknown function '{tok}' in '{self.expr}'")
+                self.take("(")
+                args = [self.binary(0)]
+                while self.peek() == ("op", ","):
+                    self.take(",")
+                    args.append(self.binary(0))
+                self.take(")")
+                return ("call", FUNCTIONS[tok], args)
+            self.branches.add(tok)
+            return ("branch", tok)
+        if tok == "(":
+            node = self.binary(0)
+            self.take(")")
+            return node
+        raise SelectionError(f"Unexpected '{tok}' in '{self.expr}'")
+
+
+def _promote(value):
+    value = np.asarray(value)
+    return value.astype(int) if value.dtype == bool else value
+
+
+def _evaluate(node, arrays):
+    kind = node[0]
+    if kind == "const":
+        return node[1]
+    if kind == "branch":
+        return arrays[node[1]]
+    if kind == "unary":
+        value = _evaluate(node[2], arrays)
+        if node[1] == "!":
+            return np.logical_not(value)
+        value = _promote(value)
+        return np.negative(value) if node[1] == "-" else value
+    if kind == "binary":
+        lhs = _evaluate(node[2], arrays)
+        rhs = _evaluate(node[3], arrays)
+        if node[1] in _ARITHMETIC:
+            lhs, rhs = _promote(lhs), _promote(rhs)
+        return getattr(np, _BINARY[node[1]])(lhs, rhs)
+    args = [_evaluate(a, arrays) for a in node[2]]
+    return getattr(np, node[1])(*args)
+
+
+class CompiledSelection:
+    """A parsed selection or weight expression.
+
+    Parameters
+    ----------
+    expr : str
+        The expression.
+
+    Attributes
+    ----------
+    expr : str
+        The expression.
+    branches : set(str)
+        Branches the expression reads.
+
+    Examples
+    --------
+    >>> sel = compile_selection("reg1j1b == 1 && bdtres03 > 0.35")
+    >>> sorted(sel.branches)
+    ['bdtres03', 'reg1j1b']
+    >>> import numpy as np
+    >>> sel({"reg1j1b": np.array([1, 1, 0]), "bdtres03": np.array([0.5, 0.1, 0.9])})
+    array([ True, False, False])
+
+    """
+
+    def __init__(self, expr):
+        parser = _Parser(str(expr))
+        self.expr = str(expr)
+        self._tree = parser.parse()
+        self.branches = parser.branches
+
+    def __repr__(self):
+        return f"CompiledSelection('{self.expr}')"
+
+    def __call__(self, arrays, size=None):
+        """Evaluate the expression.
+
+        Parameters
+        ----------
+        arrays : mapping(str, numpy.ndarray)
+            Branch arrays (at least :py:attr:`branches`).
+        size : int, optional
+            Broadcast the result to this length (needed for
+            expressions that do not read any branch, e.g. ``1``).
+
+        Returns
+        -------
+        numpy.ndarray
+            Value of the expression for each entry.
+        """
+        value = np.asarray(_evaluate(self._tree, arrays))
+        if size is not None and value.shape != (size,):
+            value = np.broadcast_to(value, (size,))
+        return value
+
+
+_COMPILED = {}
+
+
+def compile_selection(expr):
+    """Parse a selection or weight expression (memoized).
+
+    Parameters
+    ----------
+    expr : str
+        The expression.
+
+    Returns
+    -------
+    CompiledSelection
+        Callable evaluating the expression on NumPy arrays.
+
+    Raises
+    ------
+    SelectionError
+        If the expression cannot be parsed.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> arrays = {"x": np.array([1.0, -1.0, 2.0]), "y": np.array([1.0, 1.0, 3.0])}
+    >>> compile_selection("(x > 0) + (y > 0) == 2")(arrays)
+    array([ True, False,  True])
+    >>> compile_selection("-(x > 1)")(arrays)
+    array([ 0,  0, -1])
+    >>> compile_selection("(x > 0) - (y > 2)")(arrays)
+    array([1, 0, 0])
+    """
+    expr = str(expr)
+    if expr not in _COMPILED:
+        _COMPILED[expr] = CompiledSelection(expr)
+    return _COMPILED[expr]
@@ -1,21 +1,808 @@
+import hashlib
+import importlib.util
+import json
 import logging
-from typing import Optional
+import multiprocessing
+import operator
+import os
+import sqlite3
+import sys
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import reduce
+from pathlib import PosixPath
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from textwrap import dedent
 
 log = logging.getLogger(__name__)
 
-# fmt: off
 try:
-    import ROOT
-    ROOT.gROOT.SetBatch()
-    ROOT.PyConfig.IgnoreCommandLineOptions = True
-    RDataFrame = ROOT.ROOT.RDataFrame
-    import rexpy.simpconf as rps
-    if not rps.ON_SPAR:
-        ROOT.ROOT.EnableImplicitMT()
+    import numpy as np
 except ImportError:
-    log.debug("ROOT was not imported; some rexpy.shower module functions require it")
-# fmt: on
+    log.debug("numpy was not imported; selection scans in rexpy.shower require it")
+
+# set up by _root() when an event loop first needs it (importing ROOT takes seconds)
+ROOT = None
+
+#: Event loop implementations: ``"rdf"`` (ROOT RDataFrame) and
+#: ``"uproot"`` (uproot + NumPy, no ROOT needed).
+BACKENDS = ("rdf", "uproot")
+
+_BACKEND = None
+_WORKERS = None
+
+
+TW_PP8_FILES = (
+    "tW_DR_410648_AFII_MC16a_nominal,"
+    "tW_DR_410648_AFII_MC16d_nominal,"
+    "tW_DR_410648_AFII_MC16e_nominal,"
+    "tW_DR_410649_AFII_MC16a_nominal,"
+    "tW_DR_410649_AFII_MC16d_nominal,"
+    "tW_DR_410649_AFII_MC16e_nominal"
+)
+TW_PH7_FILES = (
+    "tW_DR_411038_AFII_MC16a_nominal,"
+    "tW_DR_411038_AFII_MC16d_nominal,"
+    "tW_DR_411038_AFII_MC16e_nominal,"
+    "tW_DR_411039_AFII_MC16a_nominal,"
+    "tW_DR_411039_AFII_MC16d_nominal,"
+    "tW_DR_411039_AFII_MC16e_nominal"
+)
+TTBAR_PP8_FILES = (
+    "ttbar_410472_AFII_MC16a_nominal,"
+    "ttbar_410472_AFII_MC16d_nominal,"
+    "ttbar_410472_AFII_MC16e_nominal"
+)
+
+
+def _ttbar_ph7_files(herwig_dsid: str) -> str:
+    return (
+        f"ttbar_{herwig_dsid}_AFII_MC16a_nominal,"
+        f"ttbar_{herwig_dsid}_AFII_MC16d_nominal,"
+        f"ttbar_{herwig_dsid}_AFII_MC16e_nominal"
+    )
+
+
+YieldRequest = namedtuple("YieldRequest", ["name", "files", "selection", "weight", "tree"])
+YieldRequest.__new__.__defaults__ = ("weight_nominal", "WtLoop_nominal")
+YieldRequest.__doc__ = """A weighted yield to compute.
+
+Requests reading the same files (and tree) are satisfied by the same
+event loop; the ``name`` identifies the yield in the resulting
+:py:class:`YieldTable`.
+"""
+
+
+class PartialSums(namedtuple("PartialSums", ["sumw", "sumw2"])):
+    """Sum of weights and of squared weights of a selection.
+
+    Partial sums over disjoint inputs (e.g. separate files) merge with
+    ``+``, so yields can be computed per file and reduced afterwards.
+    """
+
+    __slots__ = ()
+
+    def __add__(self, other):
+        return PartialSums(self.sumw + other.sumw, self.sumw2 + other.sumw2)
+
+
+YieldRow = namedtuple("YieldRow", ["name", "files", "selection", "weight", "sumw", "sumw2"])
+
+
+class YieldTable:
+    """Table of yields produced by :py:func:`compute_yields`.
+
+    Parameters
+    ----------
+    rows : iterable(YieldRow)
+        One row per request, in request order.
+
+    Examples
+    --------
+    >>> table = compute_yields(requests)
+    >>> table["tW", "pp8", "1j1b"]
+    12345.6
+
+    """
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self._by_name = {row.name: row for row in self.rows}
+
+    def __repr__(self):
+        return f"YieldTable(n_rows={len(self.rows)})"
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __contains__(self, name):
+        return name in self._by_name
+
+    def __getitem__(self, name):
+        return self._by_name[name].sumw
+
+    def error(self, name) -> float:
+        """Get the MC statistical uncertainty of a yield.
+
+        Parameters
+        ----------
+        name : hashable
+            Name of the request.
+
+        Returns
+        -------
+        float
+            Square root of the sum of squared weights.
+        """
+        return self._by_name[name].sumw2 ** 0.5
+
+    def row(self, name):
+        """Get the full row of a yield.
+
+        Parameters
+        ----------
+        name : hashable
+            Name of the request.
+
+        Returns
+        -------
+        YieldRow
+            The row.
+        """
+        return self._by_name[name]
+
+    def format(self) -> str:
+        """Format the table as aligned text (one row per line)."""
+        names = [str(row.name) for row in self.rows]
+        width = max((len(n) for n in names), default=0)
+        return "\n".join(
+            f"{n:<{width}}  {row.sumw:>16.4f} +/- {row.sumw2 ** 0.5:<12.4f}  {row.selection}"
+            for n, row in zip(names, self.rows)
+        )
+
+
+def _root():
+    """Import and configure ROOT on first use."""
+    global ROOT
+    if ROOT is None:
+        import ROOT as root
+
+        root.gROOT.SetBatch()
+        root.PyConfig.IgnoreCommandLineOptions = True
+        import rexpy.simpconf as rps
+
+        if not rps.ON_SPAR:
+            root.ROOT.EnableImplicitMT()
+        ROOT = root
+    return ROOT
+
+
+def _chain_key(request):
+    return (request.tree, tuple(request.files))
+
+
+class YieldCache:
+    """On-disk cache of computed yields.
+
+    Yields are stored in a sqlite database keyed by a hash of the tree
+    name, the input files (with their size and modification time), the
+    selection and the weight expression, so a cached yield is only
+    reused while the ntuples are untouched. The number of stored
+    yields is capped; the least recently used ones are evicted first.
+
+    Parameters
+    ----------
+    directory : str or os.PathLike, optional
+        Cache location (default is the ``yields`` subdirectory of
+        :py:func:`rexpy.helpers.cache_directory`).
+    max_entries : int
+        Maximum number of yields to keep.
+
+    """
+
+    VERSION = 2
+
+    def __init__(self, directory=None, max_entries=100000):
+        if directory is None:
+            from rexpy.helpers import cache_directory
+
+            directory = cache_directory("yields")
+        PosixPath(directory).mkdir(parents=True, exist_ok=True)
+        self.path = PosixPath(directory) / f"yields.v{self.VERSION}.sqlite"
+        self.max_entries = max_entries
+        self._db = sqlite3.connect(str(self.path), timeout=60)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS yields "
+            "(key TEXT PRIMARY KEY, sumw REAL NOT NULL, sumw2 REAL NOT NULL, "
+            "last_used REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def __repr__(self):
+        return f"YieldCache({self.path}, n_entries={len(self)})"
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM yields").fetchone()[0]
+
+    @staticmethod
+    def key(request: YieldRequest) -> Optional[str]:
+        """Get the cache key of a request.
+
+        Parameters
+        ----------
+        request : YieldRequest
+            The request.
+
+        Returns
+        -------
+        str, optional
+            The key; None if an input file cannot be stat'ed (e.g. a
+            remote file), in which case the yield is not cached.
+        """
+        files = []
+        for f in request.files:
+            try:
+                st = os.stat(f)
+            except OSError:
+                return None
+            files.append([f, st.st_size, st.st_mtime_ns])
+        payload = json.dumps([request.tree, files, str(request.selection), request.weight])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, PartialSums]:
+        """Look up many yields, marking the hits as recently used.
+
+        Parameters
+        ----------
+        keys : iterable(str)
+            Keys from :py:meth:`key`.
+
+        Returns
+        -------
+        dict(str, PartialSums)
+            Cached yields (missing keys are not included).
+        """
+        keys = list(set(keys))
+        found = {}
+        for i in range(0, len(keys), 500):
+            chunk = keys[i : i + 500]
+            marks = ",".join("?" * len(chunk))
+            query = f"SELECT key, sumw, sumw2 FROM yields WHERE key IN ({marks})"
+            for key, sumw, sumw2 in self._db.execute(query, chunk):
+                found[key] = PartialSums(sumw, sumw2)
+        if found:
+            now = time.time()
+            self._db.executemany(
+                "UPDATE yields SET last_used = ? WHERE key = ?", [(now, k) for k in found]
+            )
+            self._db.commit()
+        return found
+
+    def put_many(self, yields: Dict[str, PartialSums]) -> None:
+        """Store many yields, evicting the least recently used if needed.
+
+        Parameters
+        ----------
+        yields : dict(str, PartialSums)
+            Yields keyed by :py:meth:`key`.
+
+        """
+        now = time.time()
+        self._db.executemany(
+            "INSERT OR REPLACE INTO yields VALUES (?, ?, ?, ?)",
+            [(k, v.sumw, v.sumw2, now) for k, v in yields.items()],
+        )
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM yields WHERE key IN "
+                "(SELECT key FROM yields ORDER BY last_used ASC LIMIT ?)",
+                (excess,),
+            )
+        self._db.commit()
+
+    def clear(self) -> None:
+        """Remove every cached yield."""
+        self._db.execute("DELETE FROM yields")
+        self._db.commit()
+
+
+_YIELD_CACHE = None
+
+
+def enable_yield_cache(directory=None, max_entries=100000) -> YieldCache:
+    """Use an on-disk yield cache for every :py:func:`compute_yields` call.
+
+    Parameters
+    ----------
+    directory : str or os.PathLike, optional
+        Cache location (see :py:class:`YieldCache`).
+    max_entries : int
+        Maximum number of yields to keep.
+
+    Returns
+    -------
+    YieldCache
+        The process level cache.
+    """
+    global _YIELD_CACHE
+    _YIELD_CACHE = YieldCache(directory, max_entries=max_entries)
+    return _YIELD_CACHE
+
+
+def compute_yields(
+    requests: Iterable[YieldRequest],
+    cache: Optional[YieldCache] = None,
+    workers: Optional[int] = None,
+) -> YieldTable:
+    """Compute many weighted yields with one event loop per input chain.
+
+    Requests are grouped by their input files; each group gets one
+    ``RDataFrame`` with one ``Filter().Sum()`` per distinct
+    (selection, weight) pair. All event loops are then triggered
+    together with ``ROOT.RDF.RunGraphs`` (when available), so every
+    chain is read once and the chains are processed concurrently.
+    With the ``"uproot"`` backend (see :py:func:`set_backend`) each
+    chain is instead read in chunks with uproot and the expressions
+    are evaluated with NumPy (see :py:mod:`rexpy.selection`). With
+    more than one worker (see :py:func:`set_workers`) the files are
+    instead processed in parallel and the per file sums are merged.
+    Sums of squared weights are accumulated by the same actions, so
+    every yield comes with its MC statistical uncertainty (see
+    :py:meth:`YieldTable.error`). Yields found in the cache are not
+    recomputed; if all of them are found no ntuple is opened.
+
+    Parameters
+    ----------
+    requests : iterable(YieldRequest)
+        The yields to compute (names should be unique).
+    cache : YieldCache, optional
+        Cache to use (default is the one set up by
+        :py:func:`enable_yield_cache`, if any).
+    workers : int, optional
+        Number of worker processes (default from
+        :py:func:`get_workers`).
+
+    Returns
+    -------
+    YieldTable
+        The yields.
+    """
+    requests = list(requests)
+    if cache is None:
+        cache = _YIELD_CACHE
+
+    sumws = {}
+    keys = [None] * len(requests)
+    if cache is not None:
+        keys = [cache.key(req) for req in requests]
+        hits = cache.get_many(k for k in keys if k is not None)
+        sumws = {i: hits[k] for i, k in enumerate(keys) if k in hits}
+        log.info("%d of %d yields found in cache" % (len(sumws), len(requests)))
+
+    missing = [i for i in range(len(requests)) if i not in sumws]
+    if missing:
+        computed = _compute([requests[i] for i in missing], workers=workers)
+        sumws.update(zip(missing, computed))
+        if cache is not None:
+            cache.put_many({keys[i]: sumws[i] for i in missing if keys[i] is not None})
+
+    rows = []
+    for i, req in enumerate(requests):
+        tree, files = _chain_key(req)
+        sumw, sumw2 = sumws[i]
+        rows.append(YieldRow(req.name, files, str(req.selection), req.weight, sumw, sumw2))
+    return YieldTable(rows)
+
+
+def _run_event_loops(requests: List[YieldRequest], histogram=None) -> list:
+    """Book every request on its chain's RDataFrame and run them all.
+
+    Each request books sums of its weights and squared weights
+    (:py:class:`PartialSums`), or, if `histogram` is given as
+    ``(variable, nbins, xmin, xmax)``, a weighted histogram.
+    """
+    root = _root()
+    groups = OrderedDict()
+    for req in requests:
+        groups.setdefault(_chain_key(req), []).append(req)
+
+    frames = []
+    booked = OrderedDict()
+    for (tree, files), reqs in groups.items():
+        chain = root.TChain(tree)
+        log.info("Chain:")
+        for f in files:
+            chain.Add(f)
+            log.info(" - %s" % f)
+        df = root.ROOT.RDataFrame(chain)
+        frames.append((chain, df))
+        for req in reqs:
+            key = (tree, files, str(req.selection), req.weight)
+            if key in booked:
+                continue
+            filtered = df.Filter(str(req.selection))
+            if histogram is None:
+                w2 = "_rexpy_w2_{}".format(len(booked))
+                squared = filtered.Define(w2, "({0}) * ({0})".format(req.weight))
+                booked[key] = (filtered.Sum(req.weight), squared.Sum(w2))
+            else:
+                variable, nbins, xmin, xmax = histogram
+                model = ("h{}".format(len(booked)), "", nbins, xmin, xmax)
+                booked[key] = filtered.Histo1D(model, variable, req.weight)
+
+    what = "yields" if histogram is None else "histograms"
+    log.info(
+        "Computing %d %s with %d actions over %d chains"
+        % (len(requests), what, len(booked), len(groups))
+    )
+    results = list(booked.values())
+    if histogram is None:
+        results = [r for pair in results for r in pair]
+    if hasattr(root.RDF, "RunGraphs"):
+        root.RDF.RunGraphs(results)
+    if histogram is None:
+        values = {
+            key: PartialSums(sumw.GetValue(), sumw2.GetValue())
+            for key, (sumw, sumw2) in booked.items()
+        }
+    else:
+        values = {key: result.GetValue() for key, result in booked.items()}
+    return [
+        values[_chain_key(req) + (str(req.selection), req.weight)] for req in requests
+    ]
+
+
+def set_backend(name: Optional[str]) -> None:
+    """Select the event loop implementation.
+
+    Parameters
+    ----------
+    name : str, optional
+        One of :py:data:`BACKENDS`; None restores the default (the
+        ``REXPY_SHOWER_BACKEND`` environment variable if set,
+        otherwise ``"rdf"`` when ROOT is available and ``"uproot"``
+        when it is not).
+
+    """
+    global _BACKEND
+    if name is not None and name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}', use one of {BACKENDS}")
+    _BACKEND = name
+
+
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def get_backend() -> str:
+    """Get the name of the event loop implementation in use.
+
+    Returns
+    -------
+    str
+        One of :py:data:`BACKENDS`.
+
+    Raises
+    ------
+    RuntimeError
+        If the selected backend cannot be imported.
+    """
+    name = _BACKEND or os.getenv("REXPY_SHOWER_BACKEND")
+    if name is None:
+        name = "rdf" if _available("ROOT") else "uproot"
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}', use one of {BACKENDS}")
+    if name == "rdf" and not _available("ROOT"):
+        raise RuntimeError("The rdf backend requires ROOT (try REXPY_SHOWER_BACKEND=uproot)")
+    if name == "uproot" and not (_available("uproot") and "np" in globals()):
+        raise RuntimeError("The uproot backend requires uproot and numpy")
+    return name
+
+
+def set_workers(n: Optional[int]) -> None:
+    """Set the number of processes used to compute yields.
+
+    With more than one worker every input file is processed by its
+    own task in a process pool and the per file results are merged.
+    This is independent of ROOT's implicit multithreading (which is
+    disabled in the workers).
+
+    Parameters
+    ----------
+    n : int, optional
+        Number of worker processes; None restores the default (the
+        ``REXPY_SHOWER_WORKERS`` environment variable if set,
+        otherwise no pool).
+
+    """
+    global _WORKERS
+    _WORKERS = n
+
+
+def get_workers() -> int:
+    """Get the number of processes used to compute yields.
+
+    Returns
+    -------
+    int
+        Number of worker processes (1 means no pool).
+    """
+    n = _WORKERS
+    if n is None:
+        n = int(os.getenv("REXPY_SHOWER_WORKERS", "1"))
+    return max(n, 1)
+
+
+def _compute(
+    requests: List[YieldRequest], histogram=None, backend=None, workers=None
+) -> list:
+    """Run the requests with a backend.
+
+    Returns a :py:class:`PartialSums` per request, or, if `histogram`
+    is given as ``(variable, nbins, xmin, xmax)``, a
+    :py:class:`CumulativeYields` per request.
+    """
+    backend = backend or get_backend()
+    workers = workers or get_workers()
+    if workers > 1:
+        return _run_file_parallel(requests, histogram, backend, workers)
+    if backend == "uproot":
+        values = _run_uproot(requests, histogram)
+        if histogram is None:
+            return values
+        return [CumulativeYields(c, histogram[2], histogram[3], sumw2=w2) for c, w2 in values]
+    values = _run_event_loops(requests, histogram)
+    if histogram is None:
+        return values
+    return [CumulativeYields.from_th1(h) for h in values]
+
+
+_IMT_DISABLED = False
+
+
+def _file_task(backend: str, tree: str, filename: str, exprs: list, histogram=None) -> list:
+    """Worker: evaluate (selection, weight) pairs on a single file."""
+    global _IMT_DISABLED
+    if backend == "rdf" and not _IMT_DISABLED:
+        _root().ROOT.DisableImplicitMT()
+        _IMT_DISABLED = True
+    requests = [YieldRequest(i, (filename,), s, w, tree) for i, (s, w) in enumerate(exprs)]
+    return _compute(requests, histogram, backend=backend, workers=1)
+
+
+def _run_file_parallel(
+    requests: List[YieldRequest], histogram, backend: str, workers: int
+) -> list:
+    """Map every input file to a worker process and merge the partial results.
+
+    Each (tree, file) pair is read once for all of the requests using
+    it, and a request's result is the sum of its files' partial
+    results (merged in file order, so results are reproducible).
+    """
+    per_file = OrderedDict()
+    for req in requests:
+        for f in req.files:
+            exprs = per_file.setdefault((req.tree, f), OrderedDict())
+            exprs[(str(req.selection), req.weight)] = None
+
+    # fork is unsafe once ROOT has started its thread pool
+    pool_kwargs = {}
+    if sys.version_info >= (3, 7):
+        pool_kwargs["mp_context"] = multiprocessing.get_context("spawn")
+
+    log.info(
+        "Computing %d requests over %d files with %d workers"
+        % (len(requests), len(per_file), workers)
+    )
+    partials = {}
+    with ProcessPoolExecutor(max_workers=workers, **pool_kwargs) as pool:
+        futures = {
+            pool.submit(_file_task, backend, tree, f, list(exprs), histogram): (tree, f)
+            for (tree, f), exprs in per_file.items()
+        }
+        for future in as_completed(futures):
+            tree, f = futures[future]
+            for expr, value in zip(per_file[tree, f], future.result()):
+                partials[(tree, f) + expr] = value
+
+    return [
+        reduce(
+            operator.add,
+            (partials[req.tree, f, str(req.selection), req.weight] for f in req.files),
+        )
+        for req in requests
+    ]
+
+
+def _run_uproot(requests: List[YieldRequest], histogram=None, step_size="200 MB") -> list:
+    """Evaluate every request with chunked uproot reads and NumPy.
+
+    Each chain is read once (only the branches the expressions need);
+    every distinct (selection, weight) pair is evaluated on each chunk.
+    """
+    import uproot
+
+    from rexpy.selection import compile_selection
+
+    groups = OrderedDict()
+    for req in requests:
+        groups.setdefault(_chain_key(req), []).append(req)
+
+    values = {}
+    for (tree, files), reqs in groups.items():
+        exprs = OrderedDict()
+        for req in reqs:
+            key = (tree, files, str(req.selection), req.weight)
+            exprs[key] = (compile_selection(req.selection), compile_selection(req.weight))
+        branches = set()
+        for sel, weight in exprs.values():
+            branches |= sel.branches | weight.branches
+        if histogram is not None:
+            variable, nbins, xmin, xmax = histogram
+            var = compile_selection(variable)
+            branches |= var.branches
+            width = (xmax - xmin) / nbins
+            sums = {key: (np.zeros(nbins + 2), np.zeros(nbins + 2)) for key in exprs}
+        else:
+            sums = {key: PartialSums(0.0, 0.0) for key in exprs}
+
+        log.info("Chain (uproot):")
+        for f in files:
+            log.info(" - %s" % f)
+        sources = {f: tree for f in files}
+        for arrays in uproot.iterate(
+            sources, sorted(branches), library="np", step_size=step_size
+        ):
+            n = len(next(iter(arrays.values())))
+            for key, (sel, weight) in exprs.items():
+                mask = sel(arrays, n).astype(bool)
+                w = weight(arrays, n)[mask]
+                if histogram is None:
+                    w = w.astype(np.float64)
+                    sums[key] += PartialSums(float(np.sum(w)), float(np.dot(w, w)))
+                    continue
+                x = var(arrays, n)[mask].astype(np.float64)
+                good = ~np.isnan(x)
+                pos = np.clip((x[good] - xmin) / width, -1, nbins)
+                idx = np.floor(pos).astype(np.int64) + 1
+                w = w[good].astype(np.float64)
+                contents, sumw2 = sums[key]
+                contents += np.bincount(idx, weights=w, minlength=nbins + 2)
+                sumw2 += np.bincount(idx, weights=w * w, minlength=nbins + 2)
+        values.update(sums)
+
+    what = "yields" if histogram is None else "histograms"
+    log.info(
+        "Computed %d %s with uproot over %d chains" % (len(requests), what, len(groups))
+    )
+    return [values[_chain_key(req) + (str(req.selection), req.weight)] for req in requests]
+
+
+def cross_check_backends(requests: Iterable[YieldRequest], rtol: float = 1e-5) -> list:
+    """Compare yields from the RDataFrame and uproot backends.
+
+    Both backends are run directly (the yield cache is bypassed).
+
+    Parameters
+    ----------
+    requests : iterable(YieldRequest)
+        The yields to compare.
+    rtol : float
+        Relative difference above which a yield is reported as a
+        mismatch (branches are often single precision).
+
+    Returns
+    -------
+    list(tuple)
+        ``(name, rdf, uproot, relative difference)`` for each request
+        whose yields differ by more than `rtol`.
+    """
+    requests = list(requests)
+    rdf = _compute(requests, backend="rdf")
+    upr = _compute(requests, backend="uproot")
+    mismatches = []
+    for req, a, b in zip(requests, (p.sumw for p in rdf), (p.sumw for p in upr)):
+        rel = abs(a - b) / max(abs(a), abs(b)) if a != b else 0.0
+        if rel > rtol:
+            log.warning("Backends disagree for %s: %f vs %f" % (req.name, a, b))
+            mismatches.append((req.name, a, b, rel))
+    log.info("%d of %d yields agree" % (len(requests) - len(mismatches), len(requests)))
+    return mismatches
+
+
+def _file_list(ntup_dir: str, files: str) -> Tuple[str, ...]:
+    return tuple("{}/{}.root".format(ntup_dir, f) for f in files.split(","))
+
+
+def _shower_requests(
+    label: str, ntup_dir: str, pp8_files: str, ph7_files: str, selections: Dict[str, str]
+):
+    pp8 = _file_list(ntup_dir, pp8_files)
+    ph7 = _file_list(ntup_dir, ph7_files)
+    for region, sel in selections.items():
+        if sel is None:
+            continue
+        yield YieldRequest((label, "pp8", region), pp8, sel)
+        yield YieldRequest((label, "ph7", region), ph7, sel)
+
+
+def _stat_errors(pp8, ph7, pp8_var, ph7_var, rescale):
+    """MC statistical errors of the overall and per region uncertainties.
+
+    Linear propagation of the (independent) PowPy8 and PowH7 yield
+    variances, assuming the regions are disjoint. Works element-wise
+    on arrays of yields.
+    """
+    raw_pp8 = sum(pp8.values())
+    raw_ph7 = sum(ph7.values())
+    var_pp8 = sum(pp8_var.values())
+    var_ph7 = sum(ph7_var.values())
+    overall = (var_ph7 / raw_pp8 ** 2 + raw_ph7 ** 2 * var_pp8 / raw_pp8 ** 4) ** 0.5
+    per_region = {}
+    for r in pp8:
+        p, h, vp, vh = pp8[r], ph7[r], pp8_var[r], ph7_var[r]
+        if rescale:
+            # ratio = h * P / (H * p) where P and H include p and h
+            ratio = h * raw_pp8 / (raw_ph7 * p)
+            rel_var = (
+                (1 / h - 1 / raw_ph7) ** 2 * vh
+                + (var_ph7 - vh) / raw_ph7 ** 2
+                + (1 / raw_pp8 - 1 / p) ** 2 * vp
+                + (var_pp8 - vp) / raw_pp8 ** 2
+            )
+        else:
+            ratio = h / p
+            rel_var = vh / h ** 2 + vp / p ** 2
+        per_region[r] = abs(ratio) * rel_var ** 0.5
+    return overall, per_region
+
+
+def _norm_uncertainties_from(
+    table: YieldTable, label: str, regions: Iterable[str], with_errors: bool = False
+):
+    """Overall and (PowH7 rescaled) migration uncertainties from yields."""
+    regions = list(regions)
+    pp8 = {r: table[label, "pp8", r] for r in regions if (label, "pp8", r) in table}
+    ph7 = {r: table[label, "ph7", r] for r in regions if (label, "ph7", r) in table}
+
+    raw_pp8 = sum(pp8.values())
+    raw_ph7 = sum(ph7.values())
+    scale_fac_for_ph7 = raw_pp8 / raw_ph7
+    overall_norm_unc = abs(raw_ph7 - raw_pp8) / raw_pp8
+
+    migrations = []
+    for r in regions:
+        if r not in pp8:
+            migrations.append(0.0)
+            continue
+        migrations.append(abs(ph7[r] * scale_fac_for_ph7 - pp8[r]) / pp8[r])
+
+    overall_err, errs = _stat_errors(
+        pp8,
+        ph7,
+        {r: table.error((label, "pp8", r)) ** 2 for r in pp8},
+        {r: table.error((label, "ph7", r)) ** 2 for r in ph7},
+        rescale=True,
+    )
+    mig_errs = [errs.get(r, 0.0) for r in regions]
+
+    log.info("-------------------------")
+    log.info("Overall:         %f +/- %f" % (overall_norm_unc, overall_err))
+    for r, mig, err in zip(regions, migrations, mig_errs):
+        if r in pp8:
+            log.info("Migration %s:  %f +/- %f" % (r, mig, err))
+    log.info("-------------------------")
+
+    if with_errors:
+        return ((round(overall_norm_unc, 4), round(overall_err, 4)),) + tuple(
+            (round(m, 4), round(e, 4)) for m, e in zip(migrations, mig_errs)
+        )
+    return (round(overall_norm_unc, 4),) + tuple(round(m, 4) for m in migrations)
 
 
 def norm_uncertainties(
@@ -25,81 +812,89 @@ def norm_uncertainties(
     sel_1j1b: Optional[str] = None,
     sel_2j1b: Optional[str] = None,
     sel_2j2b: Optional[str] = None,
+    with_errors: bool = False,
 ):
+    """Calculate parton shower normalization and migration uncertainties.
+
+    Parameters
+    ----------
+    ntup_dir : str
+        Directory containing the ntuples.
+    pp8_files : str
+        Comma separated PowPy8 ntuple names (without ``.root``).
+    ph7_files : str
+        Comma separated PowH7 ntuple names (without ``.root``).
+    sel_1j1b : str, optional
+        1j1b selection (region skipped if None).
+    sel_2j1b : str, optional
+        2j1b selection (region skipped if None).
+    sel_2j2b : str, optional
+        2j2b selection (region skipped if None).
+    with_errors : bool
+        Return ``(value, MC stat error)`` pairs instead of values (the
+        errors come from the same event loops).
+
+    Returns
+    -------
+    tuple(float, float, float, float)
+        Overall, 1j1b, 2j1b and 2j2b migration uncertainties.
+    """
     log.info("Calculating shower norm uncertainties")
-    pp8_files = ["{}/{}.root".format(ntup_dir, f) for f in pp8_files.split(",")]
-    ph7_files = ["{}/{}.root".format(ntup_dir, f) for f in ph7_files.split(",")]
-    chain_pp8 = ROOT.TChain("WtLoop_nominal")
-    chain_ph7 = ROOT.TChain("WtLoop_nominal")
-    log.info("PowPy8 Files:")
-    for f in pp8_files:
-        chain_pp8.Add(f)
-        log.info(" - %s" % f)
-    log.info("PowH7 Files:")
-    for f in ph7_files:
-        chain_ph7.Add(f)
-        log.info(" - %s" % f)
-
-    df_pp8 = RDataFrame(chain_pp8)
-    df_ph7 = RDataFrame(chain_ph7)
-
-    log.info("1j1b selection: '%s'" % sel_1j1b)
-    log.info("2j1b selection: '%s'" % sel_2j1b)
-    log.info("2j2b selection: '%s'" % sel_2j2b)
-
-    r1j1b_pp8, r1j1b_ph7 = 0.0, 0.0
-    r2j1b_pp8, r2j1b_ph7 = 0.0, 0.0
-    r2j2b_pp8, r2j2b_ph7 = 0.0, 0.0
-    if sel_1j1b is not None:
-        r1j1b_pp8 = df_pp8.Filter(str(sel_1j1b)).Sum("weight_nominal")
-        r1j1b_ph7 = df_ph7.Filter(str(sel_1j1b)).Sum("weight_nominal")
-    if sel_2j1b is not None:
-        r2j1b_pp8 = df_pp8.Filter(str(sel_2j1b)).Sum("weight_nominal")
-        r2j1b_ph7 = df_ph7.Filter(str(sel_2j1b)).Sum("weight_nominal")
-    if sel_2j2b is not None:
-        r2j2b_pp8 = df_pp8.Filter(str(sel_2j2b)).Sum("weight_nominal")
-        r2j2b_ph7 = df_ph7.Filter(str(sel_2j2b)).Sum("weight_nominal")
-
-    if sel_1j1b is not None:
-        r1j1b_pp8 = r1j1b_pp8.GetValue()
-        r1j1b_ph7 = r1j1b_ph7.GetValue()
-    if sel_2j1b is not None:
-        r2j1b_pp8 = r2j1b_pp8.GetValue()
-        r2j1b_ph7 = r2j1b_ph7.GetValue()
-    if sel_2j2b is not None:
-        r2j2b_pp8 = r2j2b_pp8.GetValue()
-        r2j2b_ph7 = r2j2b_ph7.GetValue()
-
-    raw_pp8 = r1j1b_pp8 + r2j1b_pp8 + r2j2b_pp8
-    raw_ph7 = r1j1b_ph7 + r2j1b_ph7 + r2j2b_ph7
+    selections = OrderedDict([("1j1b", sel_1j1b), ("2j1b", sel_2j1b), ("2j2b", sel_2j2b)])
+    for r, sel in selections.items():
+        log.info("%s selection: '%s'" % (r, sel))
+    table = compute_yields(_shower_requests("", ntup_dir, pp8_files, ph7_files, selections))
+    return _norm_uncertainties_from(table, "", selections, with_errors)
 
-    scale_fac_for_ph7 = raw_pp8 / raw_ph7
-    overall_norm_unc = abs(raw_ph7 - raw_pp8) / raw_pp8
 
-    r1j1b_ph7 = r1j1b_ph7 * scale_fac_for_ph7
-    r2j1b_ph7 = r2j1b_ph7 * scale_fac_for_ph7
-    r2j2b_ph7 = r2j2b_ph7 * scale_fac_for_ph7
+def shower_norm_uncertainties(
+    ntup_dir: str,
+    sel_1j1b: Optional[str] = None,
+    sel_2j1b: Optional[str] = None,
+    sel_2j2b: Optional[str] = None,
+    herwig_dsid: str = "410558",
+    with_errors: bool = False,
+):
+    """Calculate tW and ttbar shower uncertainties in one batch.
 
-    mig_1j1b = (abs(r1j1b_ph7 - r1j1b_pp8) / r1j1b_pp8) if sel_1j1b is not None else 0.0
-    mig_2j1b = (abs(r2j1b_ph7 - r2j1b_pp8) / r2j1b_pp8) if sel_2j1b is not None else 0.0
-    mig_2j2b = (abs(r2j2b_ph7 - r2j2b_pp8) / r2j2b_pp8) if sel_2j2b is not None else 0.0
+    Equivalent to :py:func:`norm_uncertainties_tW` and
+    :py:func:`norm_uncertainties_ttbar`, but all yields come from a
+    single :py:func:`compute_yields` call.
 
-    log.info("-------------------------")
-    log.info("Overall:         %f" % overall_norm_unc)
-    if sel_1j1b is not None:
-        log.info("Migration 1j1b:  %f" % mig_1j1b)
-    if sel_2j1b is not None:
-        log.info("Migration 2j1b:  %f" % mig_2j1b)
-    if sel_2j2b is not None:
-        log.info("Migration 2j2b:  %f" % mig_2j2b)
-    log.info("-------------------------")
+    Parameters
+    ----------
+    ntup_dir : str
+        Directory containing the ntuples.
+    sel_1j1b : str, optional
+        1j1b selection (region skipped if None).
+    sel_2j1b : str, optional
+        2j1b selection (region skipped if None).
+    sel_2j2b : str, optional
+        2j2b selection (region skipped if None).
+    herwig_dsid : str
+        DSID of the ttbar PowH7 sample.
+    with_errors : bool
+        Return ``(value, MC stat error)`` pairs instead of values.
 
-    return (
-        round(overall_norm_unc, 4),
-        round(mig_1j1b, 4),
-        round(mig_2j1b, 4),
-        round(mig_2j2b, 4),
+    Returns
+    -------
+    dict(str, tuple(float, float, float, float))
+        Overall, 1j1b, 2j1b and 2j2b migration uncertainties for
+        ``"tW"`` and ``"ttbar"``.
+    """
+    log.info("Calculating tW and ttbar shower norm uncertainties")
+    selections = OrderedDict([("1j1b", sel_1j1b), ("2j1b", sel_2j1b), ("2j2b", sel_2j2b)])
+    requests = list(
+        _shower_requests("tW", ntup_dir, TW_PP8_FILES, TW_PH7_FILES, selections)
     )
+    requests += _shower_requests(
+        "ttbar", ntup_dir, TTBAR_PP8_FILES, _ttbar_ph7_files(herwig_dsid), selections
+    )
+    table = compute_yields(requests)
+    return {
+        label: _norm_uncertainties_from(table, label, selections, with_errors)
+        for label in ("tW", "ttbar")
+    }
 
 
 def norm_uncertainties_ttbar(
@@ -108,19 +903,12 @@ def norm_uncertainties_ttbar(
     sel_2j1b: Optional[str] = None,
     sel_2j2b: Optional[str] = None,
     herwig_dsid: str = "410558",
+    with_errors: bool = False,
 ):
-    pp8_files = (
-        "ttbar_410472_AFII_MC16a_nominal,"
-        "ttbar_410472_AFII_MC16d_nominal,"
-        "ttbar_410472_AFII_MC16e_nominal"
-    )
-    ph7_files = (
-        f"ttbar_{herwig_dsid}_AFII_MC16a_nominal,"
-        f"ttbar_{herwig_dsid}_AFII_MC16d_nominal,"
-        f"ttbar_{herwig_dsid}_AFII_MC16e_nominal"
-    )
+    pp8_files = TTBAR_PP8_FILES
+    ph7_files = _ttbar_ph7_files(herwig_dsid)
     return norm_uncertainties(
-        ntup_dir, pp8_files, ph7_files, sel_1j1b, sel_2j1b, sel_2j2b
+        ntup_dir, pp8_files, ph7_files, sel_1j1b, sel_2j1b, sel_2j2b, with_errors
     )
 
 
@@ -129,31 +917,17 @@ def norm_uncertainties_tW(
     sel_1j1b: Optional[str] = None,
     sel_2j1b: Optional[str] = None,
     sel_2j2b: Optional[str] = None,
+    with_errors: bool = False,
 ):
-    pp8_files = (
-        "tW_DR_410648_AFII_MC16a_nominal,"
-        "tW_DR_410648_AFII_MC16d_nominal,"
-        "tW_DR_410648_AFII_MC16e_nominal,"
-        "tW_DR_410649_AFII_MC16a_nominal,"
-        "tW_DR_410649_AFII_MC16d_nominal,"
-        "tW_DR_410649_AFII_MC16e_nominal"
-    )
-    ph7_files = (
-        "tW_DR_411038_AFII_MC16a_nominal,"
-        "tW_DR_411038_AFII_MC16d_nominal,"
-        "tW_DR_411038_AFII_MC16e_nominal,"
-        "tW_DR_411039_AFII_MC16a_nominal,"
-        "tW_DR_411039_AFII_MC16d_nominal,"
-        "tW_DR_411039_AFII_MC16e_nominal"
-    )
     return norm_uncertainties(
-        ntup_dir, pp8_files, ph7_files, sel_1j1b, sel_2j1b, sel_2j2b
+        ntup_dir, TW_PP8_FILES, TW_PH7_FILES, sel_1j1b, sel_2j1b, sel_2j2b, with_errors
     )
 
 
 def norm_uncertainties_ttbar_splits(
     ntup_dir: str = "/ddd/atlas/data/wtloop/WTA01_20200916",
     herwig_dsid: str = "410558",
+    with_errors: bool = False,
 ):
 
     sel_1j1b = "reg1j1b == 1 && OS == 1 && bdtres03 > 0.35"
@@ -164,16 +938,8 @@ def norm_uncertainties_ttbar_splits(
     sel_2j1bH = "{} && bdtres03 > 0.34".format(sel_2j1b)
     sel_2j2b =  "reg2j2b == 1 && OS == 1 && bdtres03 > 0.45 && bdtres03 < 0.775"
 
-    pp8_files = (
-        "ttbar_410472_AFII_MC16a_nominal,"
-        "ttbar_410472_AFII_MC16d_nominal,"
-        "ttbar_410472_AFII_MC16e_nominal"
-    )
-    ph7_files = (
-        f"ttbar_{herwig_dsid}_AFII_MC16a_nominal,"
-        f"ttbar_{herwig_dsid}_AFII_MC16d_nominal,"
-        f"ttbar_{herwig_dsid}_AFII_MC16e_nominal"
-    )
+    pp8_files = TTBAR_PP8_FILES
+    ph7_files = _ttbar_ph7_files(herwig_dsid)
     return norm_uncertainties_splits(
         ntup_dir,
         pp8_files,
@@ -183,6 +949,7 @@ def norm_uncertainties_ttbar_splits(
         sel_2j1bL,
         sel_2j1bH,
         sel_2j2b,
+        with_errors,
     )
 
 
@@ -195,77 +962,285 @@ def norm_uncertainties_splits(
     sel_2j1bL: Optional[str] = None,
     sel_2j1bH: Optional[str] = None,
     sel_2j2b: Optional[str] = None,
+    with_errors: bool = False,
 ):
     log.info("Calculating shower norm uncertainties")
-    pp8_files = ["{}/{}.root".format(ntup_dir, f) for f in pp8_files.split(",")]
-    ph7_files = ["{}/{}.root".format(ntup_dir, f) for f in ph7_files.split(",")]
-    chain_pp8 = ROOT.TChain("WtLoop_nominal")
-    chain_ph7 = ROOT.TChain("WtLoop_nominal")
-    log.info("PowPy8 Files:")
-    for f in pp8_files:
-        chain_pp8.Add(f)
-        log.info(" - %s" % f)
-    log.info("PowH7 Files:")
-    for f in ph7_files:
-        chain_ph7.Add(f)
-        log.info(" - %s" % f)
-
-    df_pp8 = RDataFrame(chain_pp8)
-    df_ph7 = RDataFrame(chain_ph7)
-
-    r1j1bH_pp8, r1j1bH_ph7 = 0.0, 0.0
-    r1j1bL_pp8, r1j1bL_ph7 = 0.0, 0.0
-    r2j1bH_pp8, r2j1bH_ph7 = 0.0, 0.0
-    r2j1bL_pp8, r2j1bL_ph7 = 0.0, 0.0
-    r2j1b_pp8, r2j1b_ph7 = 0.0, 0.0
-    r2j2b_pp8, r2j2b_ph7 = 0.0, 0.0
-
-    r1j1bL_pp8 = df_pp8.Filter(str(sel_1j1bL)).Sum("weight_nominal")
-    r1j1bL_ph7 = df_ph7.Filter(str(sel_1j1bL)).Sum("weight_nominal")
-    r1j1bH_pp8 = df_pp8.Filter(str(sel_1j1bH)).Sum("weight_nominal")
-    r1j1bH_ph7 = df_ph7.Filter(str(sel_1j1bH)).Sum("weight_nominal")
-    r2j1bL_pp8 = df_pp8.Filter(str(sel_2j1bL)).Sum("weight_nominal")
-    r2j1bL_ph7 = df_ph7.Filter(str(sel_2j1bL)).Sum("weight_nominal")
-    r2j1bH_pp8 = df_pp8.Filter(str(sel_2j1bH)).Sum("weight_nominal")
-    r2j1bH_ph7 = df_ph7.Filter(str(sel_2j1bH)).Sum("weight_nominal")
-    r2j2b_pp8 = df_pp8.Filter(str(sel_2j2b)).Sum("weight_nominal")
-    r2j2b_ph7 = df_ph7.Filter(str(sel_2j2b)).Sum("weight_nominal")
-
-    r1j1bH_pp8 = r1j1bH_pp8.GetValue()
-    r1j1bH_ph7 = r1j1bH_ph7.GetValue()
-    r1j1bL_pp8 = r1j1bL_pp8.GetValue()
-    r1j1bL_ph7 = r1j1bL_ph7.GetValue()
-    r2j1bH_pp8 = r2j1bH_pp8.GetValue()
-    r2j1bH_ph7 = r2j1bH_ph7.GetValue()
-    r2j1bL_pp8 = r2j1bL_pp8.GetValue()
-    r2j1bL_ph7 = r2j1bL_ph7.GetValue()
-    r2j2b_pp8 = r2j2b_pp8.GetValue()
-    r2j2b_ph7 = r2j2b_ph7.GetValue()
-
-    raw_pp8 = r1j1bL_pp8 + r2j1bL_pp8 + r1j1bH_pp8 + r2j1bH_pp8 + r2j2b_pp8
-    raw_ph7 = r1j1bL_ph7 + r2j1bL_ph7 + r1j1bH_ph7 + r2j1bH_ph7 + r2j2b_ph7
+    selections = OrderedDict(
+        [
+            ("1j1bL", sel_1j1bL),
+            ("1j1bH", sel_1j1bH),
+            ("2j1bL", sel_2j1bL),
+            ("2j1bH", sel_2j1bH),
+            ("2j2b", sel_2j2b),
+        ]
+    )
+    table = compute_yields(_shower_requests("", ntup_dir, pp8_files, ph7_files, selections))
+    pp8 = {r: table["", "pp8", r] for r in selections}
+    ph7 = {r: table["", "ph7", r] for r in selections}
 
+    raw_pp8 = sum(pp8.values())
+    raw_ph7 = sum(ph7.values())
     overall_norm_unc = abs(raw_ph7 - raw_pp8) / raw_pp8
-    norm_unc_1j1bL = abs(r1j1bL_ph7 - r1j1bL_pp8) / r1j1bL_pp8
-    norm_unc_1j1bH = abs(r1j1bH_ph7 - r1j1bH_pp8) / r1j1bH_pp8
-    norm_unc_2j1bL = abs(r2j1bL_ph7 - r2j1bL_pp8) / r2j1bL_pp8
-    norm_unc_2j1bH = abs(r2j1bH_ph7 - r2j1bH_pp8) / r2j1bH_pp8
-    norm_unc_2j2b = abs(r2j2b_ph7 - r2j2b_pp8) / r2j2b_pp8
+    norm_uncs = [abs(ph7[r] - pp8[r]) / pp8[r] for r in selections]
+    overall_err, errs = _stat_errors(
+        pp8,
+        ph7,
+        {r: table.error(("", "pp8", r)) ** 2 for r in selections},
+        {r: table.error(("", "ph7", r)) ** 2 for r in selections},
+        rescale=False,
+    )
 
     log.info("-------------------------")
-    log.info("Overall:         %f" % overall_norm_unc)
+    log.info("Overall:         %f +/- %f" % (overall_norm_unc, overall_err))
+    for r, unc in zip(selections, norm_uncs):
+        log.info("{:<17}{:f} +/- {:f}".format(r + ":", unc, errs[r]))
 
-    log.info("1j1bL:           %f" % norm_unc_1j1bL)
-    log.info("1j1bH:           %f" % norm_unc_1j1bH)
-    log.info("2j1bL:           %f" % norm_unc_2j1bL)
-    log.info("2j1bH:           %f" % norm_unc_2j1bH)
-    log.info("2j2b:            %f" % norm_unc_2j2b)
+    if with_errors:
+        return ((round(overall_norm_unc, 4), round(overall_err, 4)),) + tuple(
+            (round(u, 4), round(errs[r], 4)) for r, u in zip(selections, norm_uncs)
+        )
+    return (round(overall_norm_unc, 4),) + tuple(round(u, 4) for u in norm_uncs)
 
-    return (
-        round(overall_norm_unc, 4),
-        round(norm_unc_1j1bL, 4),
-        round(norm_unc_1j1bH, 4),
-        round(norm_unc_2j1bL, 4),
-        round(norm_unc_2j1bH, 4),
-        round(norm_unc_2j2b , 4),
+
+class CumulativeYields:
+    """Cumulative weighted distribution of a variable on a fine grid.
+
+    Yields of any ``lo < x < hi`` window are differences of a
+    precomputed cumulative sum, so a whole grid of thresholds is
+    evaluated with a few vectorized NumPy operations. Thresholds are
+    snapped to the nearest bin edge; thresholds outside of the range
+    include the under/overflow.
+
+    Parameters
+    ----------
+    contents : array_like
+        Bin contents including the underflow (first) and overflow
+        (last) bins.
+    xmin : float
+        Lower edge of the first bin.
+    xmax : float
+        Upper edge of the last bin.
+    sumw2 : array_like, optional
+        Sums of squared weights of each bin (default assumes unit
+        weights, i.e. equal to `contents`).
+
+    """
+
+    def __init__(self, contents, xmin, xmax, sumw2=None):
+        contents = np.asarray(contents, dtype=np.float64)
+        sumw2 = contents if sumw2 is None else np.asarray(sumw2, dtype=np.float64)
+        self.nbins = len(contents) - 2
+        self.xmin = xmin
+        self.xmax = xmax
+        self.width = (xmax - xmin) / self.nbins
+        self._cumsum = np.concatenate([[0.0], np.cumsum(contents)])
+        self._cumsum2 = np.concatenate([[0.0], np.cumsum(sumw2)])
+
+    def __repr__(self):
+        return f"CumulativeYields(nbins={self.nbins}, xmin={self.xmin}, xmax={self.xmax})"
+
+    def __add__(self, other):
+        if (self.nbins, self.xmin, self.xmax) != (other.nbins, other.xmin, other.xmax):
+            raise ValueError("Cannot add CumulativeYields with different binning")
+        return CumulativeYields(
+            self.contents + other.contents,
+            self.xmin,
+            self.xmax,
+            sumw2=self.sumw2 + other.sumw2,
+        )
+
+    @property
+    def contents(self):
+        """numpy.ndarray: Bin contents (including under/overflow)."""
+        return np.diff(self._cumsum)
+
+    @property
+    def sumw2(self):
+        """numpy.ndarray: Sums of squared weights (including under/overflow)."""
+        return np.diff(self._cumsum2)
+
+    @classmethod
+    def from_th1(cls, hist):
+        """Build from a ROOT ``TH1``.
+
+        Parameters
+        ----------
+        hist : ROOT.TH1
+            Histogram (with uniform binning).
+
+        Returns
+        -------
+        CumulativeYields
+            The cumulative distribution.
+        """
+        nbins = hist.GetNbinsX()
+        contents = [hist.GetBinContent(i) for i in range(nbins + 2)]
+        sumw2 = [hist.GetBinError(i) ** 2 for i in range(nbins + 2)]
+        axis = hist.GetXaxis()
+        return cls(contents, axis.GetXmin(), axis.GetXmax(), sumw2=sumw2)
+
+    def _index(self, x, default):
+        if x is None:
+            return default
+        x = np.asarray(x, dtype=np.float64)
+        edge = np.rint((x - self.xmin) / self.width).astype(np.int64)
+        edge = np.clip(edge, 0, self.nbins)
+        idx = np.where(x < self.xmin, 0, edge + 1)
+        return np.where(x > self.xmax, self.nbins + 2, idx)
+
+    def total(self):
+        """float: Yield of every event (including under/overflow)."""
+        return self._cumsum[-1]
+
+    def between(self, lo=None, hi=None):
+        """Get the yield of events with ``lo < x < hi``.
+
+        Parameters
+        ----------
+        lo : float or array_like, optional
+            Lower threshold(s); None for no lower threshold.
+        hi : float or array_like, optional
+            Upper threshold(s); None for no upper threshold.
+
+        Returns
+        -------
+        numpy.ndarray
+            Yields (`lo` and `hi` are broadcast against each other).
+        """
+        i = self._index(lo, 0)
+        j = self._index(hi, self.nbins + 2)
+        return self._cumsum[j] - self._cumsum[i]
+
+    def variance(self, lo=None, hi=None):
+        """Get the sum of squared weights of events with ``lo < x < hi``.
+
+        Parameters
+        ----------
+        lo : float or array_like, optional
+            Lower threshold(s); None for no lower threshold.
+        hi : float or array_like, optional
+            Upper threshold(s); None for no upper threshold.
+
+        Returns
+        -------
+        numpy.ndarray
+            Variances of :py:meth:`between` (MC statistics).
+        """
+        i = self._index(lo, 0)
+        j = self._index(hi, self.nbins + 2)
+        return self._cumsum2[j] - self._cumsum2[i]
+
+
+def selection_scan(
+    ntup_dir: str,
+    pp8_files: str,
+    ph7_files: str,
+    selections: Dict[str, str],
+    variable: str = "bdtres03",
+    nbins: int = 1000,
+    xmin: float = 0.0,
+    xmax: float = 1.0,
+) -> Dict[Tuple[str, str], CumulativeYields]:
+    """Fill fine binned distributions of a discriminant once per region.
+
+    All histograms are filled in a single batch of event loops (one per
+    chain, see :py:func:`compute_yields`); any set of thresholds on
+    `variable` can then be evaluated without reading the ntuples
+    again (see :py:func:`scan_norm_uncertainties`).
+
+    Parameters
+    ----------
+    ntup_dir : str
+        Directory containing the ntuples.
+    pp8_files : str
+        Comma separated PowPy8 ntuple names (without ``.root``).
+    ph7_files : str
+        Comma separated PowH7 ntuple names (without ``.root``).
+    selections : dict(str, str)
+        Base selection of each region (without discriminant cuts).
+    variable : str
+        Discriminant to histogram.
+    nbins : int
+        Number of bins (sets the threshold resolution).
+    xmin : float
+        Lower edge of the range.
+    xmax : float
+        Upper edge of the range.
+
+    Returns
+    -------
+    dict(tuple(str, str), CumulativeYields)
+        Distributions keyed by ``("pp8" or "ph7", region)``.
+    """
+    requests = list(_shower_requests("", ntup_dir, pp8_files, ph7_files, selections))
+    scans = _compute(requests, histogram=(variable, nbins, xmin, xmax))
+    return {req.name[1:]: scan for req, scan in zip(requests, scans)}
+
+
+def scan_norm_uncertainties(
+    scan: Dict[Tuple[str, str], CumulativeYields],
+    cuts: Dict[str, Tuple[str, Any, Any]],
+    rescale: bool = True,
+    with_errors: bool = False,
+):
+    """Shower norm uncertainties for a grid of discriminant thresholds.
+
+    Parameters
+    ----------
+    scan : dict(tuple(str, str), CumulativeYields)
+        Distributions from :py:func:`selection_scan`.
+    cuts : dict(str, tuple(str, float or array_like, float or array_like))
+        For each fit region: the base region in `scan` and the lower
+        and upper threshold(s) (None for no threshold). Arrays are
+        broadcast against each other, so e.g. ``lo[:, None]`` and
+        ``hi[None, :]`` give a 2D grid.
+    rescale : bool
+        Rescale PowH7 to the PowPy8 total before computing the per
+        region uncertainties, like :py:func:`norm_uncertainties`
+        (migration); otherwise compare directly, like
+        ``norm_uncertainties_splits``.
+    with_errors : bool
+        Also return the MC statistical errors.
+
+    Returns
+    -------
+    numpy.ndarray
+        Overall normalization uncertainty.
+    dict(str, numpy.ndarray)
+        Uncertainty of each region in `cuts`.
+    numpy.ndarray
+        MC statistical error of the overall uncertainty (only if
+        `with_errors`).
+    dict(str, numpy.ndarray)
+        MC statistical error of each region's uncertainty (only if
+        `with_errors`).
+
+    Examples
+    --------
+    Scan the 1j1b low/high split point:
+
+    >>> scan = selection_scan(ntup_dir, pp8, ph7, {"1j1b": sel_1j1b})
+    >>> split = np.linspace(0.4, 0.7, 31)
+    >>> overall, per_region = scan_norm_uncertainties(
+    ...     scan, {"1j1bL": ("1j1b", 0.35, split), "1j1bH": ("1j1b", split, None)},
+    ...     rescale=False,
+    ... )
+
+    """
+    pp8 = {n: scan["pp8", r].between(lo, hi) for n, (r, lo, hi) in cuts.items()}
+    ph7 = {n: scan["ph7", r].between(lo, hi) for n, (r, lo, hi) in cuts.items()}
+    raw_pp8 = sum(pp8.values())
+    raw_ph7 = sum(ph7.values())
+    overall = np.abs(raw_ph7 - raw_pp8) / raw_pp8
+    scale = raw_pp8 / raw_ph7 if rescale else 1.0
+    per_region = {n: np.abs(ph7[n] * scale - pp8[n]) / pp8[n] for n in cuts}
+    if not with_errors:
+        return overall, per_region
+    overall_err, errs = _stat_errors(
+        pp8,
+        ph7,
+        {n: scan["pp8", r].variance(lo, hi) for n, (r, lo, hi) in cuts.items()},
+        {n: scan["ph7", r].variance(lo, hi) for n, (r, lo, hi) in cuts.items()},
+        rescale=rescale,
     )
+    return overall, per_region, overall_err, errs
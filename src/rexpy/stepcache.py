@@ -0,0 +1,294 @@
+"""Module for caching TRExFitter step outputs."""
+
+# stdlib
+import hashlib
+import json
+import logging
+import os
+import shutil
+from pathlib import PosixPath
+from typing import Dict, Iterable, List, Optional
+
+# rexpy
+from rexpy.confparse import parse
+from rexpy.helpers import cache_directory
+
+
+log = logging.getLogger(__name__)
+
+#: Output files of each TRExFitter step, as globs relative to the
+#: fit directory (``{fitname}/`` in the workspace).
+STEP_OUTPUTS = {
+    "n": ("Histograms/*_histos*.root",),
+    "wf": ("RooStats/*", "Fits/{fitname}*", "NuisPar*", "CorrMatrix*"),
+    "dp": ("Plots/*", "Tables/*"),
+    "r": ("Fits/NPRanking*",),
+    "rplot": ("Ranking*",),
+    "i": ("Fits/GroupedImpact_*",),
+    "icombine": ("Fits/GroupedImpact.txt",),
+}
+
+#: Block types that only affect the fit (the n step ignores them).
+FIT_BLOCK_TYPES = ("Fit", "Limit", "Significance")
+
+
+def _sha256_file(path: PosixPath) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _digest(*parts) -> str:
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _stat_or_none(path: str):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def ntuple_metadata(config) -> List[list]:
+    """Get the metadata of the ntuples a config reads.
+
+    Candidate files are every ``NtuplePath(s)`` entry joined with every
+    ``NtupleFile(s)`` (including the ``Up``/``Down`` variants) entry,
+    mirroring how TRExFitter resolves them; each is described by its
+    size and modification time (None if it does not exist).
+
+    Parameters
+    ----------
+    config : str, os.PathLike or rexpy.confparse.Config
+        The config.
+
+    Returns
+    -------
+    list(list)
+        ``[path, [size, mtime_ns] or None]`` for each candidate file.
+    """
+    parsed = parse(config)
+    paths, files = set(), set()
+    for block in parsed:
+        for key, value in block.entries:
+            if key.startswith("NtuplePath"):
+                target = paths
+            elif key.startswith("NtupleFile"):
+                target = files
+            else:
+                continue
+            target.update(v.strip().strip('"') for v in value.split(","))
+    candidates = sorted(
+        os.path.join(p, f"{f}.root") for p in paths if p for f in files if f
+    )
+    return [[c, _stat_or_none(c)] for c in candidates]
+
+
+def _blocks_for(parsed, step: str) -> List[list]:
+    fit_only = step != "n"
+    return [
+        [b.block_type, b.title, b.entries]
+        for b in parsed
+        if (b.block_type in FIT_BLOCK_TYPES) == fit_only
+    ]
+
+
+class StepCache:
+    """Content addressed store of TRExFitter step outputs.
+
+    A step's key is a hash of the config blocks it depends on, the
+    input ntuple metadata (n step), its normalized trex-fitter
+    arguments, the trex-fitter executable and the keys of its parent
+    steps (per :py:data:`rexpy.batch.STEP_GRAPH`), so changing e.g.
+    the ``Fit`` block invalidates the fit and everything downstream
+    while histograms are reused. Output files are stored once per
+    content hash and a manifest per key maps them back into the fit
+    directory.
+
+    Parameters
+    ----------
+    directory : str or os.PathLike, optional
+        Cache location (default is the ``steps`` subdirectory of
+        :py:func:`rexpy.helpers.cache_directory`).
+
+    """
+
+    VERSION = 1
+
+    def __init__(self, directory=None):
+        if directory is None:
+            directory = cache_directory("steps")
+        self.directory = PosixPath(directory)
+        (self.directory / "objects").mkdir(parents=True, exist_ok=True)
+
+    def __repr__(self):
+        return f"StepCache({self.directory})"
+
+    def _manifest_file(self, key: str) -> PosixPath:
+        return self.directory / f"{key}.v{self.VERSION}.json"
+
+    def _object_file(self, digest: str) -> PosixPath:
+        return self.directory / "objects" / digest[:2] / digest
+
+    def keys(
+        self,
+        config: str,
+        step_arguments: Dict[str, List[str]],
+        fitname: str = "tW",
+        executable: Optional[str] = None,
+    ) -> Dict[str, str]:
+        """Compute the cache key of each step.
+
+        Parameters
+        ----------
+        config : str
+            Path of the config file.
+        step_arguments : dict(str, list(str))
+            trex-fitter arguments keyed by step name.
+        fitname : str
+            Name of the fit.
+        executable : str, optional
+            Path of the trex-fitter executable.
+
+        Returns
+        -------
+        dict(str, str)
+            Key of each step in `step_arguments`.
+        """
+        # imported here, rexpy.batch uses this module
+        from rexpy.batch import STEP_GRAPH
+
+        parsed = parse(config)
+        fitdir = PosixPath(config).resolve().parent / fitname
+        exe = [executable, _stat_or_none(executable) if executable else None]
+        keys = {}
+
+        def key_of(step):
+            if step in keys:
+                return keys[step]
+            parents = [key_of(p) for p in STEP_GRAPH[step]]
+            if step in step_arguments:
+                args = sorted(a.replace(str(config), "{config}") for a in step_arguments[step])
+                ntuples = ntuple_metadata(parsed) if step == "n" else None
+                parts = (step, args, _blocks_for(parsed, step), ntuples)
+            else:
+                # not being run: whatever is in the workspace is the input
+                files = self._output_files(fitdir, step, fitname)
+                parts = (step, [[str(f.relative_to(fitdir)), _sha256_file(f)] for f in files])
+            keys[step] = _digest(self.VERSION, exe, parts, parents)
+            return keys[step]
+
+        # only the requested steps and (through key_of) their ancestors
+        return {s: key_of(s) for s in step_arguments}
+
+    @staticmethod
+    def _output_files(fitdir: PosixPath, step: str, fitname: str) -> List[PosixPath]:
+        found = set()
+        for pattern in STEP_OUTPUTS[step]:
+            found.update(p for p in fitdir.glob(pattern.format(fitname=fitname)) if p.is_file())
+        return sorted(found)
+
+    def restore(self, key: str, fitdir) -> bool:
+        """Restore the outputs stored under a key.
+
+        Parameters
+        ----------
+        key : str
+            Step key from :py:meth:`keys`.
+        fitdir : str or os.PathLike
+            Fit directory to restore into.
+
+        Returns
+        -------
+        bool
+            True if the outputs were restored, False on a miss.
+        """
+        manifest = self._manifest_file(key)
+        if not manifest.exists():
+            return False
+        with open(manifest) as f:
+            files = json.load(f)["files"]
+        if not all(self._object_file(d).exists() for d in files.values()):
+            log.warning(f"Incomplete cache entry {key[:12]}, ignoring")
+            return False
+        fitdir = PosixPath(fitdir)
+        for rel, digest in files.items():
+            dest = fitdir / rel
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(self._object_file(digest), dest)
+        return True
+
+    def store(self, key: str, fitdir, step: str, fitname: str = "tW") -> int:
+        """Store the outputs of a finished step.
+
+        Parameters
+        ----------
+        key : str
+            Step key from :py:meth:`keys`.
+        fitdir : str or os.PathLike
+            Fit directory the step wrote to.
+        step : str
+            Step name (a key of :py:data:`STEP_OUTPUTS`).
+        fitname : str
+            Name of the fit.
+
+        Returns
+        -------
+        int
+            Number of files stored.
+        """
+        fitdir = PosixPath(fitdir)
+        files = {}
+        for path in self._output_files(fitdir, step, fitname):
+            digest = _sha256_file(path)
+            obj = self._object_file(digest)
+            if not obj.exists():
+                obj.parent.mkdir(exist_ok=True)
+                tmp = obj.with_suffix(f".tmp{os.getpid()}")
+                shutil.copyfile(path, tmp)
+                os.replace(tmp, obj)
+            files[str(path.relative_to(fitdir))] = digest
+        manifest = self._manifest_file(key)
+        tmp = manifest.with_suffix(f".tmp{os.getpid()}")
+        with open(tmp, "w") as f:
+            json.dump({"step": step, "files": files}, f)
+        os.replace(tmp, manifest)
+        return len(files)
+
+    def clear(self) -> None:
+        """Remove every stored step output."""
+        shutil.rmtree(self.directory)
+        (self.directory / "objects").mkdir(parents=True)
+
+
+def cached_steps(
+    cache: StepCache, keys: Dict[str, str], fitdir, steps: Iterable[str]
+) -> List[str]:
+    """Restore every step that hits the cache.
+
+    Parameters
+    ----------
+    cache : StepCache
+        The cache.
+    keys : dict(str, str)
+        Step keys from :py:meth:`StepCache.keys`.
+    fitdir : str or os.PathLike
+        Fit directory to restore into.
+    steps : iterable(str)
+        Steps to try.
+
+    Returns
+    -------
+    list(str)
+        Steps that were restored (and do not need to run).
+    """
+    restored = []
+    for step in steps:
+        if cache.restore(keys[step], fitdir):
+            log.info(f"Restored {step} step from cache ({keys[step][:12]})")
+            restored.append(step)
+    return restored
@@ -1,18 +1,27 @@
 # stdlib
+import csv
+import hashlib
+import json
 import logging
 import os
+import time
 from pathlib import PosixPath
 
-# third party
-import requests
-import yaml
-
 # rexpy
-from rexpy.confparse import regions_from
+from rexpy.confparse import parse
+from rexpy.helpers import cache_directory
 
 
 log = logging.getLogger(__name__)
 
+#: Default location of the validation plot metadata.
+META_URL = "https://cern.ch/ddavis/tdub_data/meta.yml"
+
+#: Seconds a cached copy of remote metadata is used without revalidation.
+META_TTL = 24 * 3600
+
+_META_MEMO = {}
+
 
 BLOCK_TEMPLATE = """\
 Region: "VRP_reg{region}_{var}"
@@ -119,7 +128,186 @@ def blocks_for_region(meta, region, selection, is_preselection=False):
     return blocks
 
 
-def blocks_for_all_regions(meta, sel_1j1b, sel_2j1b, sel_2j2b, is_preselection=False):
+class VariableCatalog:
+    """Columnar table of validation plot variable definitions.
+
+    Each column is a list with one element per (region, variable)
+    row, so large catalogs are filtered and rendered without
+    revisiting the metadata structure.
+
+    Parameters
+    ----------
+    columns : dict(str, list)
+        One list per name in :py:attr:`COLUMNS` (all the same length).
+
+    Examples
+    --------
+    >>> catalog = VariableCatalog.from_meta(load_meta())
+    >>> catalog = catalog.select(variables=["pT_lep1", "bdtres03"])
+    >>> blocks = render_vrp_blocks(catalog, {"1j1b": sel_1j1b, "2j1b": sel_2j1b})
+
+    """
+
+    COLUMNS = ("region", "var", "title", "nbins", "xmin", "xmax", "logscale")
+
+    def __init__(self, columns):
+        self.columns = {name: list(columns[name]) for name in self.COLUMNS}
+        lengths = {len(col) for col in self.columns.values()}
+        if len(lengths) > 1:
+            raise ValueError("Catalog columns must have the same length")
+
+    def __repr__(self):
+        return f"VariableCatalog(n_rows={len(self)})"
+
+    def __len__(self):
+        return len(self.columns["var"])
+
+    @classmethod
+    def from_meta(cls, meta, is_preselection=False, regions=None):
+        """Build from a metadata table (see :py:func:`load_meta`).
+
+        Parameters
+        ----------
+        meta : dict
+            Metadata table
+        is_preselection : bool
+            Use the preselection plotting definitions
+        regions : iterable(str), optional
+            Regions to include, in order (default is every region in
+            the table, e.g. ``"1j1b"`` for the ``r1j1b`` entry)
+
+        Returns
+        -------
+        VariableCatalog
+            The catalog.
+        """
+        titles = meta["titles"]
+        if regions is None:
+            regions = [r[1:] for r in meta["regions"]]
+        columns = {name: [] for name in cls.COLUMNS}
+        for region in regions:
+            for entry in meta["regions"]["r{}".format(region)]:
+                var = entry["var"]
+                unit = titles[var]["unit"]
+                unit = " [{}]".format(unit) if unit else ""
+                xmin, xmax = entry["xmin"], entry["xmax"]
+                if is_preselection:
+                    if entry["xmin_pre"] is not None:
+                        xmin = entry["xmin_pre"]
+                    if entry["xmax_pre"] is not None:
+                        xmax = entry["xmax_pre"]
+                columns["region"].append(region)
+                columns["var"].append(var)
+                columns["title"].append("{}{}".format(titles[var]["rex"], unit))
+                columns["nbins"].append(entry["nbins"])
+                columns["xmin"].append(xmin)
+                columns["xmax"].append(xmax)
+                columns["logscale"].append("TRUE" if entry["log"] else "FALSE")
+        return cls(columns)
+
+    @classmethod
+    def from_csv(cls, path):
+        """Build from a CSV file with a header row.
+
+        The header must contain ``region``, ``var``, ``title``,
+        ``nbins``, ``xmin``, ``xmax`` and ``log`` (``true``/``false``,
+        case insensitive).
+
+        Parameters
+        ----------
+        path : str or os.PathLike
+            CSV file.
+
+        Returns
+        -------
+        VariableCatalog
+            The catalog.
+        """
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+        return cls(
+            {
+                "region": [r["region"] for r in rows],
+                "var": [r["var"] for r in rows],
+                "title": [r["title"] for r in rows],
+                "nbins": [int(r["nbins"]) for r in rows],
+                "xmin": [float(r["xmin"]) for r in rows],
+                "xmax": [float(r["xmax"]) for r in rows],
+                "logscale": [
+                    "TRUE" if r["log"].strip().lower() == "true" else "FALSE" for r in rows
+                ],
+            }
+        )
+
+    def select(self, variables=None, regions=None):
+        """Get the rows for a subset of variables and/or regions.
+
+        Parameters
+        ----------
+        variables : iterable(str), optional
+            Variables to keep (default keeps all).
+        regions : iterable(str), optional
+            Regions to keep (default keeps all).
+
+        Returns
+        -------
+        VariableCatalog
+            The selected rows (in catalog order).
+        """
+        keep_vars = None if variables is None else set(variables)
+        keep_regions = None if regions is None else set(regions)
+        rows = [
+            i
+            for i, (r, v) in enumerate(zip(self.columns["region"], self.columns["var"]))
+            if (keep_vars is None or v in keep_vars)
+            and (keep_regions is None or r in keep_regions)
+        ]
+        return VariableCatalog({k: [c[i] for i in rows] for k, c in self.columns.items()})
+
+
+def render_vrp_blocks(catalog, selections, variables=None):
+    """Render the VRP blocks of a catalog in one pass.
+
+    Parameters
+    ----------
+    catalog : VariableCatalog
+        Variable definitions.
+    selections : dict(str, str)
+        Selection string of each region to render (catalog rows for
+        other regions are skipped).
+    variables : iterable(str), optional
+        Only render these variables.
+
+    Returns
+    -------
+    list(str)
+        VRP blocks (in catalog order).
+    """
+    catalog = catalog.select(variables=variables, regions=selections)
+    cols = [catalog.columns[name] for name in VariableCatalog.COLUMNS]
+    blocks = [
+        BLOCK_TEMPLATE.format(
+            region=region,
+            var=var,
+            title=title,
+            selection=selections[region],
+            nbins=nbins,
+            xmin=xmin,
+            xmax=xmax,
+            logscale=logscale,
+        )
+        for region, var, title, nbins, xmin, xmax, logscale in zip(*cols)
+    ]
+    log.info(
+        "Created %d validation plot blocks for %d variables in %d regions"
+        % (len(blocks), len(set(catalog.columns["var"])), len(set(catalog.columns["region"])))
+    )
+    return blocks
+
+
+def blocks_for_all_regions(
+    meta, sel_1j1b, sel_2j1b, sel_2j2b, is_preselection=False, variables=None
+):
     """Shortcut function to get string for all region blocks.
 
     Parameters
@@ -134,59 +322,283 @@ def blocks_for_all_regions(meta, sel_1j1b, sel_2j1b, sel_2j2b, is_preselection=F
         Selection for 2j2b region
     is_preselection : bool
         Use the preselection plotting definitions
+    variables : iterable(str), optional
+        Only create blocks for these variables
 
     Returns
     -------
     str
         Joining of all blocks as a string
     """
-    b1j1b = blocks_for_region(meta, "1j1b", sel_1j1b, is_preselection)
-    b2j1b = blocks_for_region(meta, "2j1b", sel_2j1b, is_preselection)
-    b2j2b = blocks_for_region(meta, "2j2b", sel_2j2b, is_preselection)
-    return "{}\n\n{}\n\n{}\n".format(
-        "\n\n".join(b1j1b), "\n\n".join(b2j1b), "\n\n".join(b2j2b)
-    )
+    selections = {"1j1b": sel_1j1b, "2j1b": sel_2j1b, "2j2b": sel_2j2b}
+    catalog = VariableCatalog.from_meta(meta, is_preselection, regions=selections)
+    catalog = catalog.select(variables=variables)
+    per_region = {region: [] for region in selections}
+    for region, blk in zip(catalog.columns["region"], render_vrp_blocks(catalog, selections)):
+        per_region[region].append(blk)
+    return "{}\n\n{}\n\n{}\n".format(*("\n\n".join(b) for b in per_region.values()))
+
+
+def _is_url(source):
+    return str(source).startswith(("http://", "https://"))
+
+
+def _cached_fetch(url, offline, ttl, directory):
+    """Get the content of `url` through an on-disk cache.
+
+    A copy younger than `ttl` is used as is; an older one is
+    revalidated with a conditional request (``ETag`` and
+    ``Last-Modified``). Without network (or in offline mode) the
+    cached copy is used whatever its age.
+    """
+    directory = cache_directory("valplot") if directory is None else PosixPath(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    stem = hashlib.sha256(url.encode()).hexdigest()[:16]
+    content_file = directory / f"{stem}.yml"
+    info_file = directory / f"{stem}.json"
+    info = {}
+    if content_file.exists() and info_file.exists():
+        with open(info_file) as f:
+            info = json.load(f)
+
+    if info and (offline or time.time() - info["fetched"] < ttl):
+        log.debug("Using cached metadata %s" % content_file)
+        return content_file.read_bytes()
+    if offline:
+        raise RuntimeError(
+            f"Offline and no cached copy of {url}; point to a local metadata file instead"
+        )
+
+    import requests
 
+    headers = {}
+    if info.get("etag"):
+        headers["If-None-Match"] = info["etag"]
+    if info.get("last_modified"):
+        headers["If-Modified-Since"] = info["last_modified"]
+    try:
+        response = requests.get(url, headers=headers, timeout=10)
+        response.raise_for_status()
+    except requests.RequestException as err:
+        if not info:
+            raise RuntimeError(f"Cannot fetch {url} and no cached copy exists: {err}")
+        log.warning("Cannot fetch %s (%s), using cached copy" % (url, err))
+        return content_file.read_bytes()
 
-def default_vrp_blocks(sel_1j1b, sel_2j1b, sel_2j2b, is_preselection=False):
-    meta_req = requests.get("https://cern.ch/ddavis/tdub_data/meta.yml")
-    meta = yaml.full_load(meta_req.content)
+    if response.status_code == 304:
+        log.info("Cached metadata is up to date")
+    else:
+        log.info("Fetched metadata from %s" % url)
+        tmp = content_file.with_suffix(f".tmp{os.getpid()}")
+        tmp.write_bytes(response.content)
+        os.replace(tmp, content_file)
+        info = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+    info["fetched"] = time.time()
+    tmp = info_file.with_suffix(f".tmp{os.getpid()}")
+    with open(tmp, "w") as f:
+        json.dump(info, f)
+    os.replace(tmp, info_file)
+    return content_file.read_bytes()
+
+
+def load_meta(source=None, offline=None, ttl=META_TTL, cache_dir=None):
+    """Load the validation plot metadata table.
+
+    Remote metadata is cached on disk (see `ttl`), and the parsed
+    table is memoized for the rest of the process, so repeated config
+    generation does not read or fetch it again.
+
+    Parameters
+    ----------
+    source : str or os.PathLike, optional
+        URL or local YAML file (default is ``$REXPY_VALPLOT_META`` if
+        defined, otherwise :py:data:`META_URL`).
+    offline : bool, optional
+        Never use the network; remote metadata must already be cached
+        (default is True if ``$REXPY_OFFLINE`` is defined and not
+        ``0``).
+    ttl : float
+        Seconds before a cached copy is revalidated.
+    cache_dir : str or os.PathLike, optional
+        Cache location (default is the ``valplot`` subdirectory of
+        :py:func:`rexpy.helpers.cache_directory`).
+
+    Returns
+    -------
+    dict
+        Metadata table.
+    """
+    import yaml
+
+    if source is None:
+        source = os.getenv("REXPY_VALPLOT_META", META_URL)
+    if offline is None:
+        offline = os.getenv("REXPY_OFFLINE", "0") not in ("", "0")
+    source = str(source)
+    if source in _META_MEMO:
+        return _META_MEMO[source]
+
+    if _is_url(source):
+        content = _cached_fetch(source, offline, ttl, cache_dir)
+    else:
+        content = PosixPath(source).read_bytes()
+    meta = yaml.full_load(content)
+    _META_MEMO[source] = meta
+    return meta
+
+
+def default_vrp_blocks(
+    sel_1j1b, sel_2j1b, sel_2j2b, is_preselection=False, meta=None, variables=None
+):
+    """Create VRP blocks for every region from the default metadata.
+
+    Parameters
+    ----------
+    sel_1j1b : str
+        Selection for 1j1b region
+    sel_2j1b : str
+        Selection for 2j1b region
+    sel_2j2b : str
+        Selection for 2j2b region
+    is_preselection : bool
+        Use the preselection plotting definitions
+    meta : dict, optional
+        Metadata table (default from :py:func:`load_meta`)
+    variables : iterable(str), optional
+        Only create blocks for these variables
+
+    Returns
+    -------
+    str
+        Joining of all blocks as a string
+    """
+    if meta is None:
+        meta = load_meta()
     return blocks_for_all_regions(
-        meta, sel_1j1b, sel_2j1b, sel_2j2b, is_preselection=is_preselection
+        meta, sel_1j1b, sel_2j1b, sel_2j2b, is_preselection=is_preselection, variables=variables
     )
 
 
+def _vrp_map(base_titles, vrp_titles):
+    """Map base regions to their validation regions.
+
+    A validation region ``VRP_{base}_{variable}`` belongs to the
+    longest matching base region title; each list is sorted
+    case-insensitively.
+    """
+    bases = sorted(set(base_titles), key=len, reverse=True)
+    vrps = {}
+    for title in vrp_titles:
+        for base in bases:
+            if title.startswith(f"VRP_{base}_"):
+                vrps.setdefault(base, []).append(title)
+                break
+    return {base: sorted(titles, key=str.lower) for base, titles in vrps.items()}
+
+
+def _extended_regions(value, vrp_map):
+    """Insert validation regions after their base region in a list.
+
+    Returns None if the list does not change.
+    """
+    entries = [e.strip() for e in value.split(",")]
+    present = {e.replace('"', "") for e in entries}
+    extended = []
+    for entry in entries:
+        extended.append(entry)
+        for vrp in vrp_map.get(entry.replace('"', ""), ()):
+            if vrp not in present:
+                extended.append(vrp)
+                present.add(vrp)
+    if len(extended) == len(entries):
+        return None
+    return ",".join(extended)
+
+
+def patch_systematic_regions(blocks):
+    """Lazily extend systematic region lists with validation regions.
+
+    Region titles are collected as their ``Region`` blocks pass
+    through the stream, and each region in the ``Regions:`` list of a
+    later ``Systematic`` block is followed by its validation regions
+    (``VRP_{region}_{variable}``). The region blocks must therefore
+    come before the systematic blocks in the stream (the standard
+    layout of a generated config).
+
+    Parameters
+    ----------
+    blocks : iterable(str)
+        TRExFitter blocks.
+
+    Yields
+    ------
+    str
+        Blocks with fixed systematic definitions.
+    """
+    bases, vrps = [], []
+    vrp_map = None
+    for blk in blocks:
+        if blk.startswith("Region:"):
+            title = blk.split("\n", 1)[0].split(": ")[1].replace('"', "").strip()
+            (vrps if title.startswith("VRP_") else bases).append(title)
+            vrp_map = None
+        elif blk.startswith("Systematic:") and "  Regions: " in blk:
+            if vrp_map is None:
+                vrp_map = _vrp_map(bases, vrps)
+                for base, titles in vrp_map.items():
+                    log.info("extending 'Regions: %s' with %d VRP regions" % (base, len(titles)))
+            lines = blk.split("\n")
+            for i, line in enumerate(lines):
+                key, sep, value = line.strip().partition(": ")
+                if sep and key == "Regions" and line[:1].isspace():
+                    new = _extended_regions(value, vrp_map)
+                    if new is not None:
+                        indent = line[: len(line) - len(line.lstrip())]
+                        lines[i] = f"{indent}Regions: {new}"
+            blk = "\n".join(lines)
+        yield blk
+
+
 def fix_systematics(config):
     """Fix systematic definitions to work with validation plots.
 
-    This will remove the config file and replace it with a new
-    modified config with proper systematic definitions.
+    The config is parsed once; every region in the ``Regions:`` list
+    of a ``Systematic`` block is followed by its validation regions
+    (``VRP_{region}_{variable}``, for any region name). Only those
+    values are replaced (by their offsets in the parsed text) and the
+    file is atomically replaced, only if something changed.
 
     Parameters
     ----------
-    config : str
+    config : str or os.PathLike
         Path of the config file.
+
+    Returns
+    -------
+    int
+        Number of ``Regions:`` lists extended.
     """
-    whole = PosixPath(config).read_text()
-    regions = regions_from(config)
-    valplots = list(filter(lambda r: "VRP_" in r, regions))
-    valplots_1j1b = sorted([v for v in valplots if "1j1b" in v], key=str.lower)
-    valplots_2j1b = sorted([v for v in valplots if "2j1b" in v], key=str.lower)
-    valplots_2j2b = sorted([v for v in valplots if "2j2b" in v], key=str.lower)
-    valplots_1j1b = ",".join(valplots_1j1b)
-    valplots_2j1b = ",".join(valplots_2j1b)
-    valplots_2j2b = ",".join(valplots_2j2b)
-    log.info("replacing 'Regions: reg1j1b' with:")
-    log.info("'  Regions : reg1j1b,%s'" % valplots_1j1b)
-    log.info("replacing 'Regions: reg2j1b' with:")
-    log.info("'  Regions : reg2j1b,%s'" % valplots_2j1b)
-    log.info("replacing 'Regions: reg2j2b' with:")
-    log.info("'  Regions : reg2j2b,%s'" % valplots_2j2b)
-    whole = (
-        whole.replace("  Regions: reg1j1b", "  Regions: reg1j1b,{}".format(valplots_1j1b))
-        .replace("  Regions: reg2j1b", "  Regions: reg2j1b,{}".format(valplots_2j1b))
-        .replace("  Regions: reg2j2b", "  Regions: reg2j2b,{}".format(valplots_2j2b))
+    parsed = parse(config)
+    titles = [b.title for b in parsed.blocks_of("Region")]
+    vrp_map = _vrp_map(
+        [t for t in titles if not t.startswith("VRP_")],
+        [t for t in titles if t.startswith("VRP_")],
     )
-    os.remove(config)
-    with open(config, "w") as f:
-        print(whole, file=f)
+    edits = {}
+    for block in parsed.blocks_of("Systematic"):
+        for i, (key, value) in enumerate(block.entries):
+            if key == "Regions":
+                new = _extended_regions(value, vrp_map)
+                if new is not None:
+                    edits[block, i] = new
+    if edits:
+        path = PosixPath(config)
+        tmp = path.with_name(f".{path.name}.tmp{os.getpid()}")
+        tmp.write_text(parsed.with_values(edits))
+        os.replace(tmp, path)
+    log.info("Extended %d systematic region lists with VRP regions" % len(edits))
+    return len(edits)
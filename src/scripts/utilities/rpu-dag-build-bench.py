@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+"""Benchmark building large DAGs with and without join nodes."""
+
+from __future__ import print_function
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from rexpy.pycondor import Dagman, Job
+from rexpy.pycondor.dagman import JOIN_THRESHOLD
+
+DESCRIPTION = (
+    "Build a synthetic DAG (a Job with --fan-in args, then a single fit Job, "
+    "then two Jobs with --fan-out args each depending on both) with and "
+    "without NOOP join nodes and report build time, DAG file size and the "
+    "number of parent/child edges DAGMan has to track."
+)
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("--fan-in", type=int, default=5000, help="args of the first job")
+    parser.add_argument("--fan-out", type=int, default=2500, help="args of the last jobs")
+    parser.add_argument("--threshold", type=int, default=JOIN_THRESHOLD, help="join threshold")
+    return parser.parse_args()
+
+
+def make_dag(submit, fan_in, fan_out):
+    dagman = Dagman("bench", submit=submit)
+    n = Job("n", "/bin/true", submit=submit, dag=dagman)
+    n.add_args(["n {}".format(i) for i in range(fan_in)])
+    wf = Job("wf", "/bin/true", submit=submit, dag=dagman)
+    wf.add_parent(n)
+    for name in ("r", "i"):
+        job = Job(name, "/bin/true", submit=submit, dag=dagman)
+        job.add_args(["{} {}".format(name, i) for i in range(fan_out)])
+        job.add_parents([n, wf])
+    return dagman
+
+
+def count_edges(dag_file):
+    edges = 0
+    with open(dag_file) as f:
+        for line in f:
+            if line.startswith("Parent "):
+                parents, children = line.split(" Child ")
+                edges += (len(parents.split()) - 1) * len(children.split())
+    return edges
+
+
+def main():
+    args = get_args()
+    n_nodes = args.fan_in + 1 + 2 * args.fan_out
+    print("{} nodes (fan-in {}, fan-out {})".format(n_nodes, args.fan_in, args.fan_out))
+    print("{:<18}{:>10}{:>12}{:>12}".format("", "build [s]", "size [kB]", "edges"))
+    for label, threshold in (("no join nodes", None), ("join nodes", args.threshold)):
+        with tempfile.TemporaryDirectory() as submit:
+            dagman = make_dag(submit, args.fan_in, args.fan_out)
+            start = time.perf_counter()
+            dagman.build(fancyname=False, join_threshold=threshold)
+            elapsed = time.perf_counter() - start
+            size = os.path.getsize(dagman.submit_file) / 1000
+            edges = count_edges(dagman.submit_file)
+        print("{:<18}{:>10.2f}{:>12.1f}{:>12}".format(label, elapsed, size, edges))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+"""Benchmark the startup time of the rexpy command line interface."""
+
+from __future__ import print_function
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+DESCRIPTION = (
+    "Time rexpy subcommands that should start quickly (in fresh interpreters) "
+    "and check that heavy modules are not imported by the CLI itself. "
+    "Exits with status 1 on a regression."
+)
+
+COMMANDS = (
+    "config rm-sys --help",
+    "config rm-region --help",
+    "run condor --help",
+)
+
+HEAVY_MODULES = ("ROOT", "uproot", "numpy", "requests", "yaml", "matplotlib", "rexpy.shower")
+
+CHECK_IMPORTS = (
+    "import sys, rexpy.__main__; "
+    "print(' '.join(m for m in {} if m in sys.modules))".format(HEAVY_MODULES)
+)
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("-n", "--runs", type=int, default=10, help="runs per command")
+    parser.add_argument("--max-ms", type=float, default=200.0, help="median time limit")
+    parser.add_argument("commands", nargs="*", default=COMMANDS, help="subcommands to time")
+    return parser.parse_args()
+
+
+def time_command(args, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(args, stdout=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), min(times)
+
+
+def main():
+    args = get_args()
+    failed = False
+
+    heavy = subprocess.run(
+        [sys.executable, "-c", CHECK_IMPORTS],
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    ).stdout.split()
+    if heavy:
+        print("heavy modules imported at startup: {}".format(", ".join(heavy)))
+        failed = True
+
+    baseline, _ = time_command([sys.executable, "-c", "pass"], args.runs)
+    print("{:<28}{:>10.1f} ms".format("(bare interpreter)", baseline))
+    for command in args.commands:
+        argv = [sys.executable, "-m", "rexpy"] + command.split()
+        median, fastest = time_command(argv, args.runs)
+        status = "ok" if median < args.max_ms else "SLOW"
+        print("{:<28}{:>10.1f} ms (min {:.1f} ms)  {}".format(command, median, fastest, status))
+        failed = failed or median >= args.max_ms
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()